@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'acme_project.settings')
 
 application = get_asgi_application()
+
+# Прогрев процесса до первого запроса (PANTHEON_WARMUP_ON_STARTUP)
+from pantheon.warmup import warm_up_on_startup  # noqa: E402
+
+warm_up_on_startup()
@@ -42,12 +42,16 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'pantheon.middleware.CompressionMiddleware',
+    'pantheon.middleware.PrecompressedStaticMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'pantheon.middleware.ReplicaPinningMiddleware',
+    'pantheon.middleware.SampledProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'acme_project.urls'
@@ -99,6 +103,104 @@ DATABASES = {
     }
 }
 
+# Реплики только для чтения. Пример для локальной проверки на двух файлах SQLite
+# (реплика — копия основной БД):
+#
+# DATABASES = {
+#     'default': {
+#         'ENGINE': 'django.db.backends.sqlite3',
+#         'NAME': BASE_DIR / 'primary.sqlite3',
+#     },
+#     'replica1': {
+#         'ENGINE': 'django.db.backends.sqlite3',
+#         'NAME': BASE_DIR / 'replica1.sqlite3',
+#         'TEST': {'MIRROR': 'default'},
+#     },
+# }
+# PANTHEON_READ_REPLICAS = ['replica1']
+
+DATABASE_ROUTERS = ['pantheon.routers.ReadReplicaRouter']
+
+PANTHEON_READ_REPLICAS = []
+
+# Сколько секунд после записи клиент читает с основной БД
+PANTHEON_REPLICA_STICKY_SECONDS = 10
+
+
+# Время жизни (сек.) кэша фрагментов главной страницы
+PANTHEON_HOME_FRAGMENT_TTL = {
+    'stats': 300,
+    'recent': 60,
+    'metrics': 300,
+}
+
+
+# Каталог для загруженных CSV, ожидающих фонового импорта
+PANTHEON_IMPORT_DIR = BASE_DIR / 'imports'
+
+# Сколько секунд задача импорта может не обновлять прогресс, прежде чем
+# claim_next_job сочтет ее воркер умершим и пометит задачу ошибкой
+PANTHEON_IMPORT_JOB_TIMEOUT = 30 * 60
+
+# Кэш справочников в процессе (pantheon.dimensions): максимум записей
+# на справочник и как часто (сек.) сверять версию с БД
+PANTHEON_DIMENSION_CACHE_SIZE = 50_000
+PANTHEON_DIMENSION_CACHE_CHECK_INTERVAL = 1.0
+
+# Профилирование: каталог для --profile команд; доля случайно
+# профилируемых запросов (0 — выключено) и заголовок, по которому
+# сотрудник может запросить профиль конкретного запроса. В БД хранится
+# PANTHEON_PROFILE_TOP_N функций на профиль и не больше
+# PANTHEON_PROFILE_KEEP профилей на представление.
+PANTHEON_PROFILE_DIR = BASE_DIR / 'profiles'
+PANTHEON_PROFILE_SAMPLE_RATE = 0.0
+PANTHEON_PROFILE_HEADER = 'X-Pantheon-Profile'
+PANTHEON_PROFILE_TOP_N = 30
+PANTHEON_PROFILE_KEEP = 50
+
+# API личностей по article_id: максимум id за запрос и время жизни (сек.)
+# записи в кэше
+PANTHEON_API_MAX_IDS = 5000
+PANTHEON_API_FIGURE_TTL = 3600
+
+# Снимок метрик личностей (история просмотров) после каждого импорта
+PANTHEON_METRIC_SNAPSHOTS = True
+
+# Импорт сопоставляет варианты написания городов и профессий с уже
+# существующими (pantheon.resolution) вместо создания дубликатов.
+# По умолчанию выключено: включается для импорта флагом --resolve,
+# найденные дубликаты можно посмотреть merge_duplicates --dry-run
+PANTHEON_RESOLVE_DIMENSIONS = False
+
+# Потоковый список личностей (?stream=1): размер страницы по умолчанию
+# и наибольший допустимый ?page_size
+PANTHEON_STREAM_PAGE_SIZE = 1000
+PANTHEON_STREAM_MAX_PAGE_SIZE = 10_000
+
+# Карта сайта: адресов в одной части (не больше 50 000 по протоколу) и
+# время жизни (сек.) готовых частей в кэше; ключ включает версию данных
+PANTHEON_SITEMAP_CHUNK_SIZE = 50_000
+PANTHEON_SITEMAP_TTL = 24 * 3600
+
+# Время жизни (сек.) итогов страницы статистики в кэше; ключ включает
+# версии личностей и справочников
+PANTHEON_STATISTICS_TTL = 24 * 3600
+
+# Лента изменений (api/changes/?since=N): записей журнала в пачке,
+# максимум за один ответ и сколько дней журнал хранится (prune_changes)
+PANTHEON_CHANGES_BATCH_SIZE = 1000
+PANTHEON_CHANGES_MAX_LIMIT = 100_000
+PANTHEON_CHANGES_RETENTION_DAYS = 30
+
+# Шаги прогрева при загрузке wsgi/asgi приложения (pantheon.warmup);
+# пустой кортеж — без прогрева. Общий кэш прогревает команда warmup
+# для хостов PANTHEON_WARMUP_HOSTS (по умолчанию из ALLOWED_HOSTS).
+PANTHEON_WARMUP_ON_STARTUP = ('urls', 'templates', 'dimensions', 'facets')
+PANTHEON_WARMUP_HOSTS = []
+
+# Эталонные планы запросов для check_query_plans (<СУБД>.json)
+PANTHEON_QUERY_PLAN_DIR = BASE_DIR / 'query_plans'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -136,6 +238,22 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+STATICFILES_DIRS = [BASE_DIR / 'static']
+
+# Сборка: python manage.py collectstatic — файлы с хешем в имени и их
+# .gz/.br копии (brotli — если установлен). Без DEBUG манифест
+# обязателен, поэтому collectstatic входит в выкладку.
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'pantheon.staticfiles.PrecompressedManifestStaticFilesStorage',
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -6,6 +6,8 @@ from django.template.defaultfilters import date, time, floatformat
 import jinja2
 
 def environment(**options):  
+    from pantheon import dimensions
+    
     env = jinja2.Environment(**options)
     
     env.filters.update({
@@ -22,6 +24,9 @@ def environment(**options):
         'max': max,
         'range': range, 
         'now': date,
+        # Подписи справочников из кэша (pantheon.dimensions)
+        'city_label': dimensions.city_label,
+        'occupation_name': dimensions.occupation_name,
     })  
     
     return env
@@ -1,24 +1,58 @@
 # pantheon/admin.py
-from django.contrib import admin
-from django.db.models import Count, Avg
-from .models import Country, City, Occupation, HistoricalFigure
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.contrib.admin.views.main import ChangeList
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count
+from django.utils.html import format_html, format_html_join
+from . import dimensions
+from .bulk import build_changes, bulk_delete_figures, bulk_update_figures, preview_count
+from .models import Country, City, Occupation, HistoricalFigure, RequestProfile
+from .signals import figure_state, notify_figures_changed
+
+
+class FigureBulkActionForm(ActionForm):
+    """Параметры массовых действий над историческими личностями"""
+    occupation = forms.ModelChoiceField(
+        queryset=Occupation.objects.all(),
+        required=False,
+        label="Профессия"
+    )
+    city = forms.IntegerField(required=False, label="ID города")
+    hpi_delta = forms.DecimalField(
+        required=False,
+        max_digits=10,
+        decimal_places=4,
+        label="Изменить индекс на"
+    )
+    confirm = forms.BooleanField(required=False, label="Подтвердить")
+
+
+class FigureChangeList(ChangeList):
+    """Список личностей: справочники страницы загружаются в кэш пачкой"""
+    
+    def get_results(self, request):
+        super().get_results(request)
+        dimensions.prefetch(self.result_list)
+
 
 @admin.register(Country)
 class CountryAdmin(admin.ModelAdmin):
-    list_display = ['name', 'continent', 'city_count', 'figure_count']
+    list_display = ['name', 'continent', 'city_count', 'figure_count', 'avg_popularity']
     list_filter = ['continent']
     search_fields = ['name']
+    readonly_fields = ['figure_count', 'popularity_sum', 'avg_popularity', 'max_popularity']
     list_per_page = 50
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(city_total=Count('cities'))
+    
     def city_count(self, obj):
-        return obj.cities.count()
+        return obj.city_total
     city_count.short_description = 'Города'
-    city_count.admin_order_field = 'cities__count'
-    
-    def figure_count(self, obj):
-        return HistoricalFigure.objects.filter(city__country=obj).count()
-    figure_count.short_description = 'Личности'
-    figure_count.admin_order_field = 'cities__historical_figures__count'
+    city_count.admin_order_field = 'city_total'
 
 
 @admin.register(City)
@@ -26,6 +60,7 @@ class CityAdmin(admin.ModelAdmin):
     list_display = ['name', 'get_country', 'get_continent', 'state', 'figure_count', 'coordinates']
     list_filter = ['country__continent', 'country']
     search_fields = ['name', 'country__name']
+    readonly_fields = ['figure_count', 'popularity_sum', 'avg_popularity', 'max_popularity']
     list_select_related = ['country']
     
     def get_country(self, obj):
@@ -38,10 +73,6 @@ class CityAdmin(admin.ModelAdmin):
     get_continent.short_description = 'Континент'
     get_continent.admin_order_field = 'country__continent'
     
-    def figure_count(self, obj):
-        return obj.historical_figures.count()
-    figure_count.short_description = 'Личности'
-    
     def coordinates(self, obj):
         if obj.latitude and obj.longitude:
             return f"{obj.latitude:.4f}, {obj.longitude:.4f}"
@@ -54,17 +85,8 @@ class OccupationAdmin(admin.ModelAdmin):
     list_display = ['name', 'industry', 'domain', 'figure_count', 'avg_popularity']
     list_filter = ['domain', 'industry']
     search_fields = ['name', 'industry']
+    readonly_fields = ['figure_count', 'popularity_sum', 'avg_popularity', 'max_popularity']
     list_per_page = 50
-    
-    def figure_count(self, obj):
-        return obj.historical_figures.count()
-    figure_count.short_description = 'Личности'
-    figure_count.admin_order_field = 'historical_figures__count'
-    
-    def avg_popularity(self, obj):
-        avg = obj.historical_figures.aggregate(avg=Avg('historical_popularity_index'))['avg']
-        return f"{avg:.2f}" if avg else "—"
-    avg_popularity.short_description = 'Ср. популярность'
 
 
 @admin.register(HistoricalFigure)
@@ -98,9 +120,13 @@ class HistoricalFigureAdmin(admin.ModelAdmin):
         'popularity_category'
     ]
     
-    list_select_related = ['city__country', 'occupation']
+    # Город, страна и профессия в списке — из кэша справочников, без JOIN
+    list_select_related = False
     list_per_page = 100
     
+    action_form = FigureBulkActionForm
+    actions = ['bulk_reassign', 'bulk_adjust_popularity', 'bulk_delete']
+    
     fieldsets = (
         ('Основная информация', {
             'fields': (
@@ -132,17 +158,20 @@ class HistoricalFigureAdmin(admin.ModelAdmin):
         }),
     )
     
+    def get_changelist(self, request, **kwargs):
+        return FigureChangeList
+    
     def get_location(self, obj):
-        if obj.city:
-            return f"{obj.city.name}, {obj.city.country.name}"
+        if obj.city_id:
+            return dimensions.city_label(obj.city_id)
         elif obj.original_city_name:
             return f"{obj.original_city_name}, {obj.original_country_name}"
         return "—"
     get_location.short_description = 'Место рождения'
     
     def get_occupation_info(self, obj):
-        if obj.occupation:
-            return f"{obj.occupation.name}"
+        if obj.occupation_id:
+            return dimensions.occupation_name(obj.occupation_id)
         elif obj.original_occupation_name:
             return f"{obj.original_occupation_name}"
         return "—"
@@ -178,3 +207,114 @@ class HistoricalFigureAdmin(admin.ModelAdmin):
             category
         )
     popularity_badge.short_description = 'Категория'
+    
+    # Запись и журнал изменений (pantheon.changes) — одной транзакцией
+    def save_model(self, request, obj, form, change):
+        before = [figure_state(self.model.objects.get(pk=obj.pk))] if change else []
+        if 'historical_popularity_index' in form.changed_data:
+            obj.hpi_adjustment = None
+        with transaction.atomic():
+            super().save_model(request, obj, form, change)
+            notify_figures_changed(before=before, after=[figure_state(obj)])
+    
+    def delete_model(self, request, obj):
+        before = [figure_state(obj)]
+        with transaction.atomic():
+            super().delete_model(request, obj)
+            notify_figures_changed(before=before)
+    
+    def delete_queryset(self, request, queryset):
+        before = [figure_state(figure) for figure in queryset]
+        with transaction.atomic():
+            super().delete_queryset(request, queryset)
+            notify_figures_changed(before=before)
+    
+    # Массовые действия: один UPDATE/DELETE на весь выбранный набор.
+    # Без отметки «Подтвердить» показывается только число затрагиваемых записей.
+    
+    def _confirmed(self, request, queryset, verb):
+        if request.POST.get('confirm'):
+            return True
+        self.message_user(
+            request,
+            f'Будет {verb} записей: {preview_count(queryset):,}. '
+            f'Отметьте «Подтвердить» и повторите действие.',
+            messages.WARNING
+        )
+        return False
+    
+    def _run_update(self, request, queryset, **params):
+        try:
+            changes = build_changes(**params)
+        except (City.DoesNotExist, Occupation.DoesNotExist):
+            self.message_user(request, 'Указанный город или профессия не найдены', messages.ERROR)
+            return
+        if not changes:
+            self.message_user(request, 'Не заданы параметры изменения', messages.ERROR)
+            return
+        if self._confirmed(request, queryset, 'изменено'):
+            updated = bulk_update_figures(queryset, **changes)
+            self.message_user(request, f'Изменено записей: {updated:,}', messages.SUCCESS)
+    
+    def _action_param(self, request, name):
+        """Значение поля формы действия (ActionForm целиком не валидируется)"""
+        return self.action_form.base_fields[name].clean(request.POST.get(name) or None)
+    
+    @admin.action(description='Назначить профессию/город выбранным')
+    def bulk_reassign(self, request, queryset):
+        try:
+            occupation = self._action_param(request, 'occupation')
+            city = self._action_param(request, 'city')
+        except ValidationError as error:
+            self.message_user(request, '; '.join(error.messages), messages.ERROR)
+            return
+        self._run_update(request, queryset, occupation=occupation, city=city)
+    
+    @admin.action(description='Изменить индекс популярности выбранных')
+    def bulk_adjust_popularity(self, request, queryset):
+        try:
+            hpi_delta = self._action_param(request, 'hpi_delta')
+        except ValidationError as error:
+            self.message_user(request, '; '.join(error.messages), messages.ERROR)
+            return
+        self._run_update(request, queryset, hpi_delta=hpi_delta)
+    
+    @admin.action(description='Быстро удалить выбранных (один DELETE)')
+    def bulk_delete(self, request, queryset):
+        if self._confirmed(request, queryset, 'удалено'):
+            deleted = bulk_delete_figures(queryset)
+            self.message_user(request, f'Удалено записей: {deleted:,}', messages.SUCCESS)
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ['view_name', 'method', 'path', 'status_code', 'duration_ms', 'requested', 'created_at']
+    list_filter = ['view_name', 'requested']
+    search_fields = ['view_name', 'path']
+    readonly_fields = [
+        'view_name', 'path', 'method', 'status_code', 'duration_ms', 'requested',
+        'created_at', 'functions_table'
+    ]
+    exclude = ['functions']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def functions_table(self, obj):
+        rows = format_html_join(
+            '',
+            '<tr><td>{}</td><td>{}</td><td>{:.4f}</td><td>{:.4f}</td></tr>',
+            (
+                (item['function'], item['calls'], item['total'], item['cumulative'])
+                for item in obj.functions
+            )
+        )
+        return format_html(
+            '<table><thead><tr><th>Функция</th><th>Вызовов</th>'
+            '<th>Собственное, с</th><th>Всего, с</th></tr></thead><tbody>{}</tbody></table>',
+            rows
+        )
+    functions_table.short_description = 'Самые затратные функции'
@@ -0,0 +1,89 @@
+# pantheon/aggregates.py
+from django.db.models import (
+    Avg, Count, DecimalField, ExpressionWrapper, Max, OuterRef, Subquery, Sum, Value,
+)
+from django.db.models.functions import Coalesce, NullIf
+from django.dispatch import receiver
+
+from .models import City, Country, HistoricalFigure, Occupation
+from .signals import figures_changed
+
+
+def _subquery_updates(model, grouped, expressions):
+    """Значения для UPDATE ... SET: коррелированный подзапрос на каждое поле"""
+    return {
+        field: Coalesce(
+            Subquery(grouped.annotate(value=expression).values('value')),
+            Value(0),
+            output_field=model._meta.get_field(field),
+        )
+        for field, expression in expressions.items()
+    }
+
+
+def _aggregate_updates(model, source, key):
+    """Агрегаты по source, сгруппированному по внешнему ключу key на model"""
+    grouped = source.filter(**{key: OuterRef('pk')}).order_by().values(key)
+    expressions = {
+        'figure_count': Count('pk'),
+        'popularity_sum': Sum('historical_popularity_index'),
+        'avg_popularity': Avg('historical_popularity_index'),
+        'max_popularity': Max('historical_popularity_index'),
+    }
+    return _subquery_updates(model, grouped, expressions)
+
+
+def _country_updates():
+    """Агрегаты страны собираются из уже пересчитанных агрегатов её городов"""
+    grouped = City.objects.filter(country=OuterRef('pk')).order_by().values('country')
+    expressions = {
+        'figure_count': Sum('figure_count'),
+        'popularity_sum': Sum('popularity_sum'),
+        'avg_popularity': ExpressionWrapper(
+            Sum('popularity_sum') / NullIf(Sum('figure_count'), 0),
+            output_field=DecimalField(max_digits=10, decimal_places=4),
+        ),
+        'max_popularity': Max('max_popularity'),
+    }
+    return _subquery_updates(Country, grouped, expressions)
+
+
+def refresh_aggregates(city_ids=None, occupation_ids=None):
+    """
+    Пересчитывает денормализованные агрегаты городов, стран и профессий.
+
+    None означает «все записи», пустой список — «ничего». Каждая таблица
+    обновляется одним UPDATE с коррелированными подзапросами.
+    """
+    figures = HistoricalFigure.objects.all()
+
+    cities = City.objects.all() if city_ids is None else City.objects.filter(pk__in=city_ids)
+    if city_ids is None or city_ids:
+        cities.update(**_aggregate_updates(City, figures, 'city'))
+
+        if city_ids is None:
+            countries = Country.objects.all()
+        else:
+            countries = Country.objects.filter(
+                pk__in=City.objects.filter(pk__in=city_ids).values('country_id')
+            )
+        countries.update(**_country_updates())
+
+    if occupation_ids is None or occupation_ids:
+        occupations = (
+            Occupation.objects.all() if occupation_ids is None
+            else Occupation.objects.filter(pk__in=occupation_ids)
+        )
+        occupations.update(**_aggregate_updates(Occupation, figures, 'occupation'))
+
+
+@receiver(figures_changed)
+def update_aggregates(sender, before, after, full, **kwargs):
+    if full:
+        refresh_aggregates()
+        return
+
+    states = [*before, *after]
+    city_ids = {state['city_id'] for state in states if state['city_id']}
+    occupation_ids = {state['occupation_id'] for state in states if state['occupation_id']}
+    refresh_aggregates(city_ids=list(city_ids), occupation_ids=list(occupation_ids))
@@ -0,0 +1,154 @@
+# pantheon/api.py
+"""
+Пакетное получение личностей по article_id для внешних сервисов.
+
+Записи кэшируются по одной (ключ — версия данных и article_id), так что
+часто запрашиваемые личности не читаются из БД; промахи загружаются одним
+запросом WHERE article_id IN (...) по уникальному индексу. Город, страна
+и профессия подставляются из кэша справочников (pantheon.dimensions) при
+ответе, поэтому переименование справочника не требует сброса кэша.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import reverse
+
+from . import dimensions
+from .models import City, Country, DataVersion, HistoricalFigure, Occupation, popularity_category_for
+
+CACHE_PREFIX = 'pantheon:figure'
+
+# Колонки записи, которые хранятся в кэше
+STORED_FIELDS = (
+    'id', 'article_id', 'full_name', 'birth_year', 'city_id', 'occupation_id',
+    'page_views', 'average_views', 'historical_popularity_index', 'article_languages',
+    'global_rank', 'continent_rank', 'domain_rank',
+)
+
+
+def _number(value):
+    return float(value) if value is not None else None
+
+
+def _city(record):
+    return dimensions.city(record['city_id']) or {}
+
+
+def _country(record):
+    return dimensions.country(_city(record).get('country_id')) or {}
+
+
+def _occupation(record):
+    return dimensions.occupation(record['occupation_id']) or {}
+
+
+# Поле ответа -> значение по записи из кэша
+FIELDS = {
+    'id': lambda record: record['id'],
+    'full_name': lambda record: record['full_name'],
+    'birth_year': lambda record: record['birth_year'],
+    'city': lambda record: _city(record).get('name'),
+    'country': lambda record: _country(record).get('name'),
+    'continent': lambda record: _country(record).get('continent'),
+    'occupation': lambda record: _occupation(record).get('name'),
+    'industry': lambda record: _occupation(record).get('industry'),
+    'domain': lambda record: _occupation(record).get('domain'),
+    'page_views': lambda record: record['page_views'],
+    'average_views': lambda record: _number(record['average_views']),
+    'historical_popularity_index': lambda record: _number(record['historical_popularity_index']),
+    'popularity_category': lambda record: popularity_category_for(record['historical_popularity_index']),
+    'article_languages': lambda record: record['article_languages'],
+    'global_rank': lambda record: record['global_rank'],
+    'continent_rank': lambda record: record['continent_rank'],
+    'domain_rank': lambda record: record['domain_rank'],
+    'url': lambda record: reverse('figure_detail', args=[record['id']]),
+}
+DEFAULT_FIELDS = ('id', 'full_name', 'birth_year', 'city', 'country', 'occupation', 'historical_popularity_index')
+
+
+class ApiError(ValueError):
+    """Некорректный запрос к API"""
+
+
+def parse_ids(values):
+    """Список уникальных article_id в порядке запроса"""
+    ids = []
+    for value in values:
+        for part in str(value).split(','):
+            part = part.strip()
+            if not part:
+                continue
+            try:
+                ids.append(int(part))
+            except ValueError:
+                raise ApiError(f'Некорректный article_id: {part}')
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        raise ApiError('Не переданы article_id')
+    if len(ids) > settings.PANTHEON_API_MAX_IDS:
+        raise ApiError(f'Не больше {settings.PANTHEON_API_MAX_IDS} article_id за запрос')
+    return ids
+
+
+def parse_fields(values):
+    """Запрошенные поля ответа (article_id выводится всегда)"""
+    fields = [part.strip() for value in values for part in str(value).split(',') if part.strip()]
+    if not fields:
+        return DEFAULT_FIELDS
+    unknown = [field for field in fields if field not in FIELDS and field != 'article_id']
+    if unknown:
+        raise ApiError(f'Неизвестные поля: {", ".join(unknown)}')
+    return [field for field in dict.fromkeys(fields) if field != 'article_id']
+
+
+def _cache_key(version, article_id):
+    return f'{CACHE_PREFIX}:{version}:{article_id}'
+
+
+def fetch_records(article_ids):
+    """
+    {article_id: запись} для найденных личностей.
+
+    Версия данных входит в ключ кэша: любое изменение личностей (в том
+    числе пересчет мест) делает старые записи недоступными.
+    """
+    version = DataVersion.current()
+    keys = {_cache_key(version, article_id): article_id for article_id in article_ids}
+    records = {keys[key]: record for key, record in cache.get_many(list(keys)).items()}
+
+    missing = [article_id for article_id in article_ids if article_id not in records]
+    if missing:
+        loaded = {
+            row['article_id']: row
+            for row in HistoricalFigure.objects.filter(article_id__in=missing)
+            .order_by()
+            .values(*STORED_FIELDS)
+        }
+        cache.set_many(
+            {_cache_key(version, article_id): row for article_id, row in loaded.items()},
+            settings.PANTHEON_API_FIGURE_TTL,
+        )
+        records.update(loaded)
+    return records
+
+
+def format_records(records, fields=DEFAULT_FIELDS):
+    """Записи (STORED_FIELDS) в словари ответа с полями fields"""
+    # Справочники всего ответа — по запросу на таблицу
+    if {'city', 'country', 'continent'} & set(fields):
+        cities = dimensions.get_many(City, [record['city_id'] for record in records])
+        dimensions.get_many(Country, [row['country_id'] for row in cities.values()])
+    if {'occupation', 'industry', 'domain'} & set(fields):
+        dimensions.get_many(Occupation, [record['occupation_id'] for record in records])
+
+    return [
+        {'article_id': record['article_id'], **{field: FIELDS[field](record) for field in fields}}
+        for record in records
+    ]
+
+
+def get_figures(article_ids, fields=DEFAULT_FIELDS):
+    """(список словарей в порядке article_ids, ненайденные article_id)"""
+    records = fetch_records(article_ids)
+    found = [records[article_id] for article_id in article_ids if article_id in records]
+    missing = [article_id for article_id in article_ids if article_id not in records]
+    return format_records(found, fields), missing
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class PantheonConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'pantheon'
+
+    def ready(self):
+        # Подключение обработчиков сигнала figures_changed и сброса
+        # кэша справочников. Временная шкала берет лучшую личность
+        # интервала по местам, поэтому подключается после ranks
+        from . import aggregates, cube, dimensions, hpi, ranks, timeline  # noqa: F401
@@ -0,0 +1,103 @@
+# pantheon/bulk.py
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F
+
+from .changes import record_changes
+from .models import City, HistoricalFigure, Occupation
+from .signals import notify_figures_changed
+
+# Фильтры массовых операций: имя параметра -> условие ORM
+FILTERS = {
+    'ids': 'pk__in',
+    'occupation': 'occupation_id',
+    'city': 'city_id',
+    'country': 'city__country_id',
+    'continent': 'city__country__continent',
+    'domain': 'occupation__domain',
+    'industry': 'occupation__industry',
+    'birth_year_from': 'birth_year__gte',
+    'birth_year_to': 'birth_year__lte',
+    'hpi_from': 'historical_popularity_index__gte',
+    'hpi_to': 'historical_popularity_index__lte',
+    'name_contains': 'full_name__icontains',
+}
+
+
+def filter_figures(queryset=None, **filters):
+    """Набор личностей для массовой операции по именованным фильтрам FILTERS"""
+    unknown = set(filters) - set(FILTERS)
+    if unknown:
+        raise ValidationError(f"Неизвестные фильтры: {', '.join(sorted(unknown))}")
+
+    if queryset is None:
+        queryset = HistoricalFigure.objects.all()
+    conditions = {FILTERS[name]: value for name, value in filters.items() if value not in (None, '')}
+    return queryset.filter(**conditions)
+
+
+def build_changes(occupation=None, city=None, hpi_delta=None, hpi_value=None,
+                  page_views=None, article_languages=None):
+    """Выражения для UPDATE ... SET. Пустой словарь — нечего менять"""
+    if hpi_delta is not None and hpi_value is not None:
+        raise ValidationError("Укажите либо изменение индекса, либо новое значение, но не оба")
+
+    changes = {}
+    if occupation is not None:
+        changes['occupation'] = (
+            occupation if isinstance(occupation, Occupation) else Occupation.objects.get(pk=occupation)
+        )
+    if city is not None:
+        changes['city'] = city if isinstance(city, City) else City.objects.get(pk=city)
+    if hpi_delta is not None:
+        changes['historical_popularity_index'] = F('historical_popularity_index') + hpi_delta
+    if hpi_value is not None:
+        changes['historical_popularity_index'] = hpi_value
+    if 'historical_popularity_index' in changes:
+        # Индекс задан вручную: поправка HPI калибруется заново
+        changes['hpi_adjustment'] = None
+    if page_views is not None:
+        changes['page_views'] = page_views
+    if article_languages is not None:
+        changes['article_languages'] = article_languages
+    return changes
+
+
+def preview_count(queryset):
+    """Сколько записей затронет операция"""
+    return queryset.order_by().count()
+
+
+def bulk_update_figures(queryset, **changes):
+    """
+    Изменяет все записи набора одним UPDATE и возвращает их количество.
+
+    changes — результат build_changes(). Производные данные (агрегаты и т.п.)
+    пересчитываются один раз для всего набора.
+    """
+    if not changes:
+        return 0
+    with transaction.atomic():
+        # Набор до изменения: условие может зависеть от изменяемых полей
+        affected = list(queryset.order_by().values_list('pk', 'article_id'))
+        updated = queryset.order_by().update(**changes)
+        if updated:
+            record_changes(updated=affected)
+            notify_figures_changed(full=True)
+    return updated
+
+
+def bulk_delete_figures(queryset):
+    """
+    Удаляет все записи набора одним DELETE и возвращает их количество.
+
+    Модели, ссылающиеся на HistoricalFigure, объявлены с on_delete=DO_NOTHING,
+    поэтому Django не выбирает записи по одной, а выполняет быстрое удаление.
+    """
+    with transaction.atomic():
+        affected = list(queryset.order_by().values_list('pk', 'article_id'))
+        deleted, _ = queryset.order_by().delete()
+        if deleted:
+            record_changes(deleted=affected)
+            notify_figures_changed(full=True)
+    return deleted
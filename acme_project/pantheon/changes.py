@@ -0,0 +1,205 @@
+# pantheon/changes.py
+"""
+Журнал изменений личностей для инкрементальной синхронизации внешних
+потребителей.
+
+Каждое добавление, изменение и удаление личности (формы, админка,
+массовые операции, импорт, пересчет индекса, замена таблиц) пишет
+строку FigureChange; ее id — номер изменения. Запись идет в транзакции,
+которая сначала обновляет строку DataVersion.CHANGES: строка остается
+заблокированной до фиксации, поэтому номера выдаются в порядке фиксации
+транзакций и читатель, дошедший до номера N, не увидит позже запись
+с меньшим номером.
+
+Лента (iter_feed) читает журнал после курсора пачками по возрастанию
+номера, в пределах пачки оставляет последнее изменение каждой личности
+и отдает для добавлений и изменений текущее состояние записи. Новый
+потребитель (без курсора) и потребитель, чей курсор старше сохраненного
+журнала (prune_changes), получают сброс: полный снимок всех личностей
+и курсор, с которого продолжать.
+"""
+import datetime
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from .api import DEFAULT_FIELDS, STORED_FIELDS, format_records
+from .models import DataVersion, FigureChange, HistoricalFigure
+
+WRITE_BATCH_SIZE = 1000
+
+# Операции в ленте
+UPSERT = 'upsert'
+DELETE = 'delete'
+RESET = 'reset'
+
+
+def _chunks(items, size):
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def record_changes(inserted=(), updated=(), deleted=()):
+    """
+    Записывает изменения в журнал; каждый аргумент — итерируемое пар
+    (id личности, article_id или None). Возвращает число записей.
+    """
+    rows = (
+        FigureChange(figure_id=pk, article_id=article_id, operation=operation)
+        for operation, pairs in (
+            (FigureChange.INSERT, inserted),
+            (FigureChange.UPDATE, updated),
+            (FigureChange.DELETE, deleted),
+        )
+        for pk, article_id in pairs
+    )
+    written = 0
+    with transaction.atomic():
+        for chunk in _chunks(rows, WRITE_BATCH_SIZE):
+            if not written:
+                # Блокировка строки CHANGES до фиксации: номера изменений
+                # выдаются в порядке фиксации транзакций
+                DataVersion.bump(DataVersion.CHANGES)
+            FigureChange.objects.bulk_create(chunk)
+            written += len(chunk)
+    return written
+
+
+def record_states(before=(), after=()):
+    """Изменения по состояниям записей (figure_state) до и после"""
+    before = {state['id']: state for state in before}
+    after = {state['id']: state for state in after}
+    return record_changes(
+        inserted=[(pk, state.get('article_id')) for pk, state in after.items() if pk not in before],
+        updated=[(pk, state.get('article_id')) for pk, state in after.items() if pk in before],
+        deleted=[(pk, state.get('article_id')) for pk, state in before.items() if pk not in after],
+    )
+
+
+def latest_sequence():
+    return FigureChange.objects.aggregate(latest=Max('pk'))['latest'] or 0
+
+
+def prune_changes(days=None):
+    """
+    Удаляет записи журнала старше days дней (по умолчанию
+    PANTHEON_CHANGES_RETENTION_DAYS); последняя запись сохраняется всегда,
+    чтобы отставшие потребители распознавались и получали сброс
+    """
+    days = settings.PANTHEON_CHANGES_RETENTION_DAYS if days is None else days
+    cutoff = timezone.now() - datetime.timedelta(days=days)
+    boundary = FigureChange.objects.filter(changed_at__gte=cutoff).order_by('pk').values_list(
+        'pk', flat=True
+    ).first()
+    if boundary is None:
+        boundary = latest_sequence()
+    deleted, _ = FigureChange.objects.filter(pk__lt=boundary).delete()
+    return deleted
+
+
+def needs_reset(since):
+    """Курсора нет или по журналу продолжить нельзя: нужен полный снимок"""
+    if since is None:
+        return True
+    oldest = FigureChange.objects.aggregate(oldest=Min('pk'))['oldest']
+    # Между курсором и самой старой записью могли быть удаленные записи
+    return oldest is not None and since < oldest - 1
+
+
+def _compact(batch):
+    """Последнее изменение каждой личности пачки, в порядке номеров"""
+    latest = {}
+    for change in batch:
+        latest.pop(change['figure_id'], None)
+        latest[change['figure_id']] = change
+    return list(latest.values())
+
+
+def _upserts(sequences, fields):
+    """Записи ленты для личностей {id: номер изменения}, которые еще существуют"""
+    records = list(
+        HistoricalFigure.objects.filter(pk__in=list(sequences)).order_by().values(*STORED_FIELDS)
+    )
+    records.sort(key=lambda record: sequences[record['id']])
+    return [
+        {'seq': sequences[record['id']], 'op': UPSERT, **figure}
+        for record, figure in zip(records, format_records(records, fields))
+    ]
+
+
+def _changes(batch, fields):
+    output = []
+    upserts = {}
+    for change in _compact(batch):
+        if change['operation'] == FigureChange.DELETE:
+            output.append({
+                'seq': change['id'], 'op': DELETE,
+                'id': change['figure_id'], 'article_id': change['article_id'],
+            })
+        else:
+            upserts[change['figure_id']] = change['id']
+    # Удаленные позже личности пропускаются: их удаление придет следующей записью
+    output += _upserts(upserts, fields)
+    output.sort(key=lambda record: record['seq'])
+    return output
+
+
+def _snapshot(head, fields, batch_size):
+    """Все личности по возрастанию id, пачками по первичному ключу"""
+    last_pk = 0
+    while True:
+        records = list(
+            HistoricalFigure.objects.filter(pk__gt=last_pk).order_by('pk').values(
+                *STORED_FIELDS
+            )[:batch_size]
+        )
+        if not records:
+            return
+        for figure in format_records(records, fields):
+            yield {'seq': head, 'op': UPSERT, **figure}
+        last_pk = records[-1]['id']
+
+
+def iter_feed(since=None, limit=None, fields=DEFAULT_FIELDS, batch_size=None):
+    """
+    Записи ленты после номера since (None — снимок): {'seq', 'op':
+    'upsert', 'article_id', поля fields} или {'seq', 'op': 'delete', 'id',
+    'article_id'}.
+    limit — сколько записей журнала прочитать за раз (None — до конца).
+
+    При сбросе сначала идет {'op': 'reset', 'seq'} — потребитель очищает
+    свою копию, затем снимок всех личностей (limit на него не действует).
+    Последний элемент — {'next': курсор, 'more': есть ли изменения после него}.
+    """
+    batch_size = batch_size or settings.PANTHEON_CHANGES_BATCH_SIZE
+    cursor = since
+    if needs_reset(since):
+        # Изменения после head повторяются после снимка; повтор безопасен,
+        # лента отдает текущее состояние записей
+        cursor = latest_sequence()
+        yield {'seq': cursor, 'op': RESET}
+        yield from _snapshot(cursor, fields, batch_size)
+    else:
+        read = 0
+        while limit is None or read < limit:
+            size = batch_size if limit is None else min(batch_size, limit - read)
+            batch = list(
+                FigureChange.objects.filter(pk__gt=cursor).order_by('pk').values(
+                    'id', 'figure_id', 'article_id', 'operation'
+                )[:size]
+            )
+            if not batch:
+                break
+            yield from _changes(batch, fields)
+            cursor = batch[-1]['id']
+            read += len(batch)
+            if len(batch) < size:
+                break
+    yield {'next': cursor, 'more': FigureChange.objects.filter(pk__gt=cursor).exists()}
@@ -0,0 +1,162 @@
+# pantheon/compression.py
+"""
+Сжатие ответов и статических файлов: gzip всегда, brotli — если
+установлен пакет brotli (pip install brotli).
+"""
+import gzip
+import re
+import secrets
+import struct
+import zlib
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен
+    brotli = None
+
+# Что имеет смысл сжимать (изображения и шрифты уже сжаты)
+COMPRESSIBLE_TYPES = (
+    'text/',
+    'application/json',
+    'application/x-ndjson',
+    'application/javascript',
+    'application/xml',
+    'image/svg+xml',
+)
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.json', '.map', '.svg', '.txt', '.html', '.xml')
+
+# Короткие ответы не сжимаются: заголовки gzip съедят выигрыш
+MIN_LENGTH = 200
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# Защита от BREACH: к сжатому динамическому ответу добавляется случайное
+# число байт (меньше MAX_RANDOM_BYTES), так что длина ответа не выдает
+# совпадений секрета (CSRF-токена) с текстом из запроса. Тот же прием,
+# что max_random_bytes в django.middleware.gzip.GZipMiddleware.
+MAX_RANDOM_BYTES = 100
+
+_ENCODING_RE = re.compile(r'\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([\d.]+))?\s*$')
+
+
+def available_encodings():
+    """Поддерживаемые кодировки в порядке предпочтения"""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def negotiate(accept_encoding, encodings=None):
+    """Лучшая кодировка из Accept-Encoding или None"""
+    accepted = {}
+    for item in (accept_encoding or '').split(','):
+        match = _ENCODING_RE.match(item)
+        if not match:
+            continue
+        try:
+            accepted[match.group(1).lower()] = float(match.group(2) or 1)
+        except ValueError:
+            continue
+    for encoding in encodings or available_encodings():
+        if accepted.get(encoding, accepted.get('*', 0)) > 0:
+            return encoding
+    return None
+
+
+def is_compressible(content_type):
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def _random_padding(max_random_bytes):
+    return secrets.randbelow(max_random_bytes) if max_random_bytes else None
+
+
+def _gzip_header(padding=None):
+    """Заголовок gzip (mtime=0); padding байт уходят в поле имени файла"""
+    if padding is None:
+        return b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff'
+    return b'\x1f\x8b\x08' + bytes([gzip.FNAME]) + b'\x00\x00\x00\x00\x00\xff' + b'a' * padding + b'\x00'
+
+
+def _brotli_padding(padding):
+    """
+    Метаблок brotli с padding байтами метаданных, которые распаковщик
+    пропускает (RFC 7932, 9.2: ISLAST=0, MNIBBLES=0, MSKIPBYTES=1).
+    Вставляется только на границе байта — сразу после flush().
+    """
+    if not padding:
+        return b''
+    header = 0b110 | 1 << 4 | (padding - 1) << 6
+    return header.to_bytes(2, 'little') + b'\x00' * padding
+
+
+def compress(data, encoding, best=False, max_random_bytes=0):
+    """
+    Сжимает bytes целиком; best — максимальное сжатие (для сборки статики),
+    max_random_bytes — случайная добавка к длине (для динамических ответов)
+    """
+    padding = _random_padding(max_random_bytes)
+    if encoding == 'br':
+        quality = 11 if best else BROTLI_QUALITY
+        if not padding:
+            return brotli.compress(data, quality=quality)
+        compressor = brotli.Compressor(quality=quality)
+        return compressor.process(data) + compressor.flush() + _brotli_padding(padding) + compressor.finish()
+    # mtime=0 — одинаковый результат для одинаковых данных
+    compressed = gzip.compress(data, compresslevel=9 if best else GZIP_LEVEL, mtime=0)
+    if padding is None:
+        return compressed
+    header = bytearray(compressed[:10])
+    header[3] = gzip.FNAME
+    return bytes(header) + b'a' * padding + b'\x00' + compressed[10:]
+
+
+class StreamCompressor:
+    """
+    Сжатие потокового ответа: после каждого куска данные сбрасываются
+    (flush), чтобы браузер получал страницу по частям, а не в конце.
+    """
+
+    def __init__(self, encoding, max_random_bytes=0):
+        self.encoding = encoding
+        self._padding = _random_padding(max_random_bytes)
+        if encoding == 'br':
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            # Сырой deflate: заголовок gzip (с добавкой в имени файла)
+            # и контрольная сумма пишутся здесь
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS)
+            self._header = _gzip_header(self._padding)
+            self._crc = 0
+            self._size = 0
+
+    def compress(self, chunk):
+        if self.encoding == 'br':
+            data = self._compressor.process(chunk) + self._compressor.flush()
+            if self._padding:
+                data += _brotli_padding(self._padding)
+                self._padding = None
+            return data
+        self._crc = zlib.crc32(chunk, self._crc)
+        self._size += len(chunk)
+        data = self._header + self._compressor.compress(chunk) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        self._header = b''
+        return data
+
+    def finish(self):
+        if self.encoding == 'br':
+            return self._compressor.finish()
+        data = self._header + self._compressor.flush() + struct.pack('<LL', self._crc, self._size & 0xFFFFFFFF)
+        self._header = b''
+        return data
+
+
+def compress_stream(chunks, encoding, max_random_bytes=0):
+    compressor = StreamCompressor(encoding, max_random_bytes)
+    for chunk in chunks:
+        if not chunk:
+            continue
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.finish()
@@ -0,0 +1,344 @@
+# pantheon/cube.py
+"""
+Куб для сводных таблиц: ячейки CubeCell с числом личностей, суммами
+просмотров и индексов популярности и максимальным индексом по
+измерениям континент, страна, домен, сфера деятельности и век рождения.
+
+Куб строится одним GROUP BY по личностям (век вычисляется в запросе),
+после импорта — целиком, после правок — только затронутые века, как
+временная шкала (pantheon.timeline). Сводная таблица по любым
+измерениям — сумма ячеек куба (GROUP BY по CubeCell), без чтения
+HistoricalFigure; свертка и детализация (континент -> страна,
+домен -> сфера деятельности) — та же сумма с другим набором измерений.
+
+Названия континентов, доменов и сфер копируются в ячейки при
+пересчете: правка справочников без изменения личностей попадает в куб
+после rebuild_cube или следующего импорта.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Max, Q, Sum, Value
+from django.db.models.functions import Floor
+from django.dispatch import receiver
+
+from . import dimensions
+from .models import Country, CubeCell, HistoricalFigure
+from .signals import figures_changed
+
+CENTURY = 100
+
+# Измерение -> поле ячейки
+DIMENSIONS = {
+    'continent': 'continent',
+    'country': 'country_id',
+    'domain': 'domain',
+    'industry': 'industry',
+    'century': 'century',
+}
+DIMENSION_LABELS = {
+    'continent': 'Континент',
+    'country': 'Страна',
+    'domain': 'Домен',
+    'industry': 'Сфера деятельности',
+    'century': 'Век',
+}
+
+# Детализация измерения и обратная ей свертка
+DRILL_DOWN = {'continent': 'country', 'domain': 'industry'}
+ROLL_UP = {child: parent for parent, child in DRILL_DOWN.items()}
+
+MEASURES = {
+    'count': 'Количество личностей',
+    'page_views': 'Сумма просмотров',
+    'popularity_sum': 'Сумма индексов популярности',
+    'avg_popularity': 'Средняя популярность',
+    'max_popularity': 'Максимальная популярность',
+}
+
+# Значение фильтра «не указано»
+NONE = 'none'
+NONE_LABEL = 'Не указано'
+
+_ROMAN = (
+    (1000, 'M'), (900, 'CM'), (500, 'D'), (400, 'CD'), (100, 'C'), (90, 'XC'),
+    (50, 'L'), (40, 'XL'), (10, 'X'), (9, 'IX'), (5, 'V'), (4, 'IV'), (1, 'I'),
+)
+
+
+class PivotError(ValueError):
+    """Некорректные параметры сводной таблицы"""
+
+
+# Построение куба
+
+def _century_filter(field, centuries):
+    """Условие «field попадает в один из веков centuries» (None — год не указан)"""
+    q = Q()
+    for start in centuries:
+        if start is None:
+            q |= Q(**{f'{field}__isnull': True})
+        else:
+            q |= Q(**{f'{field}__gte': start, f'{field}__lt': start + CENTURY})
+    return q
+
+
+def _collect(year_filter):
+    """Группы личностей по измерениям куба, одним запросом"""
+    return HistoricalFigure.objects.filter(year_filter).order_by().annotate(
+        century_number=Floor(F('birth_year') / Value(float(CENTURY))),
+    ).values(
+        'city__country__continent', 'city__country', 'occupation__domain', 'occupation__industry',
+        'century_number',
+    ).annotate(
+        count=Count('id'),
+        views=Sum('page_views'),
+        popularity=Sum('historical_popularity_index'),
+        top=Max('historical_popularity_index'),
+    )
+
+
+def refresh_cube(centuries=None):
+    """
+    Пересчитывает ячейки веков centuries (первые годы веков, None в
+    наборе — личности без года рождения); centuries=None — весь куб.
+    """
+    if centuries is None:
+        year_filter = Q()
+        stale = CubeCell.objects.all()
+    else:
+        if not centuries:
+            return 0
+        year_filter = _century_filter('birth_year', centuries)
+        stale = CubeCell.objects.filter(_century_filter('century', centuries))
+
+    cells = [
+        CubeCell(
+            continent=row['city__country__continent'] or '',
+            country_id=row['city__country'],
+            domain=row['occupation__domain'] or '',
+            industry=row['occupation__industry'] or '',
+            century=int(row['century_number']) * CENTURY if row['century_number'] is not None else None,
+            figure_count=row['count'],
+            page_views_sum=row['views'] or 0,
+            popularity_sum=row['popularity'] or 0,
+            max_popularity=row['top'] or 0,
+        )
+        for row in _collect(year_filter)
+    ]
+    with transaction.atomic():
+        stale.delete()
+        CubeCell.objects.bulk_create(cells, batch_size=1000)
+    return len(cells)
+
+
+@receiver(figures_changed)
+def update_cube(sender, before, after, full, **kwargs):
+    if full:
+        refresh_cube()
+        return
+    # Не через timeline.bucket_start: импорт timeline отсюда подключил бы
+    # его обработчик раньше обработчика мест (см. PantheonConfig.ready)
+    refresh_cube(centuries={
+        state['birth_year'] // CENTURY * CENTURY if state['birth_year'] is not None else None
+        for state in [*before, *after]
+    })
+
+
+# Параметры сводной таблицы
+
+def parse_dimensions(values):
+    """['continent,domain', 'century'] -> ['continent', 'domain', 'century']"""
+    names = [name.strip() for value in values for name in str(value).split(',') if name.strip()]
+    unknown = [name for name in names if name not in DIMENSIONS]
+    if unknown:
+        raise PivotError(f'Неизвестные измерения: {", ".join(unknown)} (доступны: {", ".join(DIMENSIONS)})')
+    if len(set(names)) != len(names):
+        raise PivotError('Измерение указано дважды')
+    return names
+
+
+def parse_filters(params):
+    """Фильтры из параметров запроса: {измерение: значение ячейки}"""
+    filters = {}
+    for name in DIMENSIONS:
+        value = params.get(name)
+        if value is None or value == '':
+            continue
+        if value == NONE:
+            filters[name] = None if name in ('country', 'century') else ''
+            continue
+        if name in ('country', 'century'):
+            try:
+                value = int(value)
+            except ValueError:
+                raise PivotError(f'{DIMENSION_LABELS[name]}: ожидается число, получено {value!r}')
+        filters[name] = value
+    return filters
+
+
+def parse_measure(value):
+    value = value or 'count'
+    if value not in MEASURES:
+        raise PivotError(f'Неизвестная мера: {value} (доступны: {", ".join(MEASURES)})')
+    return value
+
+
+def filter_value(value):
+    """Значение ячейки для параметра фильтра в адресе"""
+    return NONE if value is None or value == '' else str(value)
+
+
+# Подписи значений
+
+def century_label(start):
+    """1800 -> 'XIX век', -400 -> 'IV век до н. э.'"""
+    number = start // CENTURY + 1 if start >= 0 else -start // CENTURY
+    roman = ''
+    for value, letters in _ROMAN:
+        count, number = divmod(number, value)
+        roman += letters * count
+    return f'{roman} век' if start >= 0 else f'{roman} век до н. э.'
+
+
+def value_label(name, value):
+    if value is None or value == '':
+        return NONE_LABEL
+    if name == 'country':
+        return (dimensions.country(value) or {}).get('name') or f'#{value}'
+    if name == 'century':
+        return century_label(value)
+    return value
+
+
+def _sort_key(names, labels, key):
+    # Века — по времени, остальное — по подписи; «не указано» в конце
+    return tuple(
+        (value is None or value == '', value if name == 'century' else label)
+        for name, label, value in zip(names, labels, key)
+    )
+
+
+# Сводная таблица
+
+def _empty():
+    return {'count': 0, 'page_views': 0, 'popularity_sum': Decimal(0), 'max_popularity': None}
+
+
+def _add(target, values):
+    target['count'] += values['count'] or 0
+    target['page_views'] += values['page_views'] or 0
+    target['popularity_sum'] += values['popularity_sum'] or 0
+    top = values['max_popularity']
+    if top is not None and (target['max_popularity'] is None or top > target['max_popularity']):
+        target['max_popularity'] = top
+
+
+def _finish(values):
+    count = values['count']
+    values['avg_popularity'] = values['popularity_sum'] / count if count else None
+    return values
+
+
+class Pivot:
+    """
+    Сводная таблица: строки и столбцы — сочетания значений измерений
+    rows и columns, в ячейках — меры (MEASURES) по личностям с фильтрами
+    filters; итоги по строкам, столбцам и общий.
+    """
+
+    def __init__(self, rows=(), columns=(), filters=None):
+        self.rows = list(rows)
+        self.columns = list(columns)
+        self.filters = dict(filters or {})
+        overlap = set(self.rows) & set(self.columns)
+        if overlap:
+            raise PivotError(f'Измерение в строках и столбцах одновременно: {", ".join(sorted(overlap))}')
+        self.cells = {}
+        self.row_totals = {}
+        self.column_totals = {}
+        self.total = _empty()
+        self._load()
+        if 'country' in self.rows or 'country' in self.columns:
+            # Названия стран для подписей — одним запросом
+            countries = set()
+            for names, keys in ((self.rows, self.row_totals), (self.columns, self.column_totals)):
+                if 'country' in names:
+                    position = names.index('country')
+                    countries.update(key[position] for key in keys)
+            dimensions.get_many(Country, list(countries))
+        self.row_keys = self._sorted(self.rows, self.row_totals)
+        self.column_keys = self._sorted(self.columns, self.column_totals)
+
+    def _queryset(self):
+        q = Q()
+        for name, value in self.filters.items():
+            field = DIMENSIONS[name]
+            q &= Q(**{f'{field}__isnull': True}) if value is None else Q(**{field: value})
+        return CubeCell.objects.filter(q).order_by()
+
+    def _load(self):
+        measures = {
+            'count': Sum('figure_count'),
+            'page_views': Sum('page_views_sum'),
+            'popularity_sum': Sum('popularity_sum'),
+            'max_popularity': Max('max_popularity'),
+        }
+        row_fields = [DIMENSIONS[name] for name in self.rows]
+        column_fields = [DIMENSIONS[name] for name in self.columns]
+        if row_fields or column_fields:
+            groups = self._queryset().values(*row_fields, *column_fields).annotate(**measures)
+        else:
+            groups = [self._queryset().aggregate(**measures)]
+
+        for group in groups:
+            row_key = tuple(group[field] for field in row_fields)
+            column_key = tuple(group[field] for field in column_fields)
+            _add(self.cells.setdefault((row_key, column_key), _empty()), group)
+            _add(self.row_totals.setdefault(row_key, _empty()), group)
+            _add(self.column_totals.setdefault(column_key, _empty()), group)
+            _add(self.total, group)
+
+        for values in (*self.cells.values(), *self.row_totals.values(), *self.column_totals.values(), self.total):
+            _finish(values)
+
+    def _sorted(self, names, totals):
+        labelled = [(key, self.labels(names, key)) for key in totals]
+        labelled.sort(key=lambda item: _sort_key(names, item[1], item[0]))
+        return [key for key, _ in labelled]
+
+    def labels(self, names, key):
+        return [value_label(name, value) for name, value in zip(names, key)]
+
+    def cell(self, row_key, column_key):
+        return self.cells.get((row_key, column_key))
+
+    def as_dict(self):
+        """Представление для JSON: ключи, подписи и все меры каждой ячейки"""
+        return {
+            'rows': self.rows,
+            'columns': self.columns,
+            'filters': {name: filter_value(value) for name, value in self.filters.items()},
+            'row_keys': [
+                {'key': list(key), 'labels': self.labels(self.rows, key)} for key in self.row_keys
+            ],
+            'column_keys': [
+                {'key': list(key), 'labels': self.labels(self.columns, key)} for key in self.column_keys
+            ],
+            'cells': [
+                [_serialize(self.cell(row_key, column_key)) for column_key in self.column_keys]
+                for row_key in self.row_keys
+            ],
+            'row_totals': [_serialize(self.row_totals[key]) for key in self.row_keys],
+            'column_totals': [_serialize(self.column_totals[key]) for key in self.column_keys],
+            'total': _serialize(self.total),
+        }
+
+
+def _serialize(values):
+    if values is None:
+        return None
+    return {
+        name: float(value) if isinstance(value, Decimal) else value
+        for name, value in values.items()
+    }
@@ -0,0 +1,277 @@
+# pantheon/dimensions.py
+"""
+Кэш справочников (страны, города, профессии) в памяти процесса.
+
+Записи хранятся по id, id — по естественному ключу (название страны,
+(название, id страны) города, название профессии). Размер каждого словаря
+ограничен PANTHEON_DIMENSION_CACHE_SIZE (вытесняются давно не использованные).
+Сохранение и удаление справочников увеличивает DataVersion.DIMENSIONS;
+кэш сверяется с ней не чаще раза в PANTHEON_DIMENSION_CACHE_CHECK_INTERVAL
+секунд и сбрасывается целиком при расхождении.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import City, Country, DataVersion, Occupation
+
+
+class _LRU:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.data = OrderedDict()
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def __len__(self):
+        return len(self.data)
+
+    def get(self, key, default=None):
+        try:
+            self.data.move_to_end(key)
+        except KeyError:
+            return default
+        return self.data[key]
+
+    def put(self, key, value):
+        self.data[key] = value
+        self.data.move_to_end(key)
+        if len(self.data) > self.capacity:
+            self.data.popitem(last=False)
+
+
+class _Dimension:
+    """Записи одной модели: поля по id и id по естественному ключу"""
+
+    def __init__(self, model, fields, key_fields, label, capacity):
+        self.model = model
+        self.fields = fields
+        self.key_fields = key_fields
+        self.label = label
+        self.capacity = capacity
+        self.clear()
+
+    def clear(self):
+        self.rows = _LRU(self.capacity)
+        self.ids = _LRU(self.capacity)
+        # Загружена вся таблица: промах по ключу означает, что записи нет
+        self.complete = False
+        self._choices = None
+
+    def _key(self, row):
+        values = tuple(row[field] for field in self.key_fields)
+        return values[0] if len(values) == 1 else values
+
+    def _store(self, rows):
+        for row in rows:
+            self.rows.put(row['id'], row)
+            self.ids.put(self._key(row), row['id'])
+
+    def _query(self, **filters):
+        return self.model.objects.filter(**filters).order_by().values('id', *self.fields)
+
+    def preload(self):
+        """Загружает таблицу целиком, если она помещается в кэш"""
+        if self.complete:
+            return True
+        if self.model.objects.count() > self.capacity:
+            return False
+        self._store(self._query())
+        self.complete = True
+        return True
+
+    def get(self, pk):
+        if pk is None:
+            return None
+        row = self.rows.get(pk)
+        if row is None and not self.complete:
+            self._store(self._query(pk=pk))
+            row = self.rows.get(pk)
+        return row
+
+    def get_many(self, ids):
+        missing = [pk for pk in set(ids) if pk is not None and pk not in self.rows]
+        if missing and not self.complete:
+            self._store(self._query(pk__in=missing))
+        return {pk: self.rows.get(pk) for pk in ids if pk in self.rows}
+
+    def find(self, key):
+        """id записи по естественному ключу или None"""
+        pk = self.ids.get(key)
+        if pk is None and not self.complete:
+            values = key if isinstance(key, tuple) else (key,)
+            self._store(self._query(**dict(zip(self.key_fields, values)))[:1])
+            pk = self.ids.get(key)
+        return pk
+
+    def choices(self):
+        """[(id, подпись)] в порядке модели для форм или None, если таблица велика"""
+        if self._choices is None:
+            if not self.preload():
+                return None
+            pairs = [(pk, self.label(self, row)) for pk, row in self.rows.data.items()]
+            self._choices = sorted(pairs, key=lambda pair: pair[1])
+        return self._choices
+
+
+def _country_label(dimension, row):
+    return f"{row['name']} ({row['continent']})"
+
+
+def _city_label(dimension, row):
+    return f"{row['name']}, {country_name(row['country_id'])}"
+
+
+def _occupation_label(dimension, row):
+    return row['name']
+
+
+class _Registry:
+    def __init__(self):
+        capacity = settings.PANTHEON_DIMENSION_CACHE_SIZE
+        self.dimensions = {
+            Country: _Dimension(Country, ('name', 'continent'), ('name',), _country_label, capacity),
+            City: _Dimension(City, ('name', 'country_id', 'state'), ('name', 'country_id'), _city_label, capacity),
+            Occupation: _Dimension(
+                Occupation, ('name', 'industry', 'domain'), ('name',), _occupation_label, capacity
+            ),
+        }
+        self.version = None
+        self.checked_at = 0.0
+        self.lock = threading.RLock()
+
+    def dimension(self, model):
+        """Справочник модели, предварительно сверив версию"""
+        now = time.monotonic()
+        if now - self.checked_at >= settings.PANTHEON_DIMENSION_CACHE_CHECK_INTERVAL:
+            version = DataVersion.current(DataVersion.DIMENSIONS)
+            with self.lock:
+                if version != self.version:
+                    for dimension in self.dimensions.values():
+                        dimension.clear()
+                    self.version = version
+                self.checked_at = now
+        return self.dimensions[model]
+
+    def invalidate(self):
+        # Следующее обращение сверит версию с БД
+        self.checked_at = 0.0
+
+
+_registry = _Registry()
+
+
+def _locked(function):
+    def wrapper(*args, **kwargs):
+        with _registry.lock:
+            return function(*args, **kwargs)
+    wrapper.__doc__ = function.__doc__
+    return wrapper
+
+
+# Чтение
+
+@_locked
+def country(pk):
+    return _registry.dimension(Country).get(pk)
+
+
+@_locked
+def city(pk):
+    return _registry.dimension(City).get(pk)
+
+
+@_locked
+def occupation(pk):
+    return _registry.dimension(Occupation).get(pk)
+
+
+@_locked
+def get_many(model, ids):
+    """Записи справочника по списку id одним запросом для промахов"""
+    return _registry.dimension(model).get_many(ids)
+
+
+def country_name(pk):
+    row = country(pk)
+    return row['name'] if row else ''
+
+
+def city_label(pk):
+    """«Город, Страна» по id города, пустая строка для None"""
+    row = city(pk)
+    return f"{row['name']}, {country_name(row['country_id'])}" if row else ''
+
+
+def occupation_name(pk):
+    row = occupation(pk)
+    return row['name'] if row else ''
+
+
+@_locked
+def lookup_id(model, key):
+    """id справочника по ключу: название или (название, id страны) для города"""
+    return _registry.dimension(model).find(key)
+
+
+@_locked
+def preload(*models):
+    """Загружает справочники целиком (если помещаются), например перед импортом"""
+    return all(_registry.dimension(model).preload() for model in models or _registry.dimensions)
+
+
+@_locked
+def prefetch(figures):
+    """
+    Загружает города (вместе со странами) и профессии списка личностей:
+    по запросу на справочник вместо запроса на каждый промах при выводе
+    """
+    cities = get_many(City, [figure.city_id for figure in figures])
+    get_many(Country, [row['country_id'] for row in cities.values()])
+    get_many(Occupation, [figure.occupation_id for figure in figures])
+
+
+@_locked
+def choices(model):
+    """Варианты выбора для форм или None, если справочник больше кэша"""
+    if model is City:
+        # Подписи городов включают название страны
+        _registry.dimension(Country).preload()
+    return _registry.dimension(model).choices()
+
+
+# Сброс
+
+def _bump():
+    DataVersion.bump(DataVersion.DIMENSIONS)
+    _registry.invalidate()
+
+
+def _schedule_bump():
+    # Одно увеличение версии на транзакцию, даже если справочников
+    # создано много (импорт)
+    connection = transaction.get_connection()
+    if any(callback is _bump for _, callback, *_ in connection.run_on_commit):
+        return
+    transaction.on_commit(_bump)
+
+
+def invalidate():
+    """Сбросить кэши справочников во всех процессах"""
+    _bump()
+
+
+@receiver(post_save, sender=Country)
+@receiver(post_save, sender=City)
+@receiver(post_save, sender=Occupation)
+@receiver(post_delete, sender=Country)
+@receiver(post_delete, sender=City)
+@receiver(post_delete, sender=Occupation)
+def dimension_changed(sender, **kwargs):
+    _schedule_bump()
@@ -0,0 +1,241 @@
+# pantheon/facets.py
+"""
+Фасетный индекс исторических личностей в памяти процесса.
+
+Записи нумеруются позициями в порядке списка (по убыванию популярности),
+значения фасетов кодируются целыми числами, для каждого значения хранится
+битовое множество позиций (Python int). Фильтр — AND по фасетам и OR по
+значениям внутри фасета, количество — int.bit_count(); никаких GROUP BY
+на запрос. Индекс перестраивается при смене версии личностей или
+справочников (DataVersion).
+"""
+import threading
+from array import array
+
+from .models import DataVersion, HistoricalFigure
+
+# Порядок определяет порядок блоков в интерфейсе
+FACETS = {
+    'continent': 'Континент',
+    'country': 'Страна',
+    'domain': 'Домен',
+    'industry': 'Индустрия',
+    'century': 'Век рождения',
+}
+
+# Код отсутствующего значения в колонках
+MISSING = 0xFFFF
+
+_WORD_BITS = 64
+
+
+def _century_label(century):
+    start = century * 100
+    if start < 0:
+        return f'{-start - 99}–{-start} до н. э.'
+    return f'{start}–{start + 99}'
+
+
+def _bitset(positions, size):
+    # Сборка через bytearray: OR больших int по одному биту квадратичен
+    buffer = bytearray(size)
+    for position in positions:
+        buffer[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+def _positions(mask, offset, limit):
+    """Позиции установленных битов mask, начиная с offset-го, не больше limit"""
+    if limit <= 0 or mask <= 0:
+        return []
+    size = (mask.bit_length() + _WORD_BITS - 1) // _WORD_BITS * 8
+    words = memoryview(mask.to_bytes(size, 'little')).cast('Q')
+    result = []
+    for index, word in enumerate(words):
+        if not word:
+            continue
+        count = word.bit_count()
+        if offset >= count:
+            offset -= count
+            continue
+        base = index * _WORD_BITS
+        while word and len(result) < limit:
+            low = word & -word
+            if offset:
+                offset -= 1
+            else:
+                result.append(base + low.bit_length() - 1)
+            word ^= low
+        if len(result) >= limit:
+            break
+    return result
+
+
+class _Facet:
+    """Закодированная колонка фасета и битовые множества значений"""
+
+    def __init__(self, name, keys):
+        self.name = name
+        values = sorted({key for key, _ in keys if key is not None})
+        self.values = values
+        self.labels = dict(keys)
+        self.codes = {value: code for code, value in enumerate(values)}
+        self.column = array('H', (
+            MISSING if key is None else self.codes[key] for key, _ in keys
+        ))
+
+        positions = [[] for _ in values]
+        for position, code in enumerate(self.column):
+            if code != MISSING:
+                positions[code].append(position)
+        size = (len(self.column) + 7) // 8
+        self.postings = [_bitset(items, size) for items in positions]
+
+
+class FacetIndex:
+    """Неизменяемый снимок фасетов для одной версии данных"""
+
+    def __init__(self, version, ids, facets):
+        self.version = version
+        self.ids = ids
+        self.facets = facets
+        self.all = (1 << len(ids)) - 1
+
+    @classmethod
+    def build(cls, version):
+        rows = HistoricalFigure.objects.order_by(
+            '-historical_popularity_index', 'id'
+        ).values_list(
+            'id',
+            'city__country__continent',
+            'city__country_id', 'city__country__name',
+            'occupation__domain', 'occupation__industry',
+            'birth_year',
+        )
+
+        ids = array('q')
+        keys = {name: [] for name in FACETS}
+        for figure_id, continent, country_id, country, domain, industry, birth_year in rows.iterator(chunk_size=5000):
+            ids.append(figure_id)
+            keys['continent'].append((continent or None, continent))
+            keys['country'].append((country_id, country))
+            keys['domain'].append((domain or None, domain))
+            keys['industry'].append((industry or None, industry))
+            century = birth_year // 100 if birth_year is not None else None
+            keys['century'].append((century, _century_label(century) if century is not None else None))
+
+        facets = {name: _Facet(name, facet_keys) for name, facet_keys in keys.items()}
+        return cls(version, ids, facets)
+
+    def parse_filters(self, params):
+        """
+        Выбранные значения из GET-параметров: {фасет: множество кодов}.
+
+        Неизвестные значения отбрасываются. params — QueryDict или словарь
+        списков строк.
+        """
+        filters = {}
+        for name, facet in self.facets.items():
+            codes = set()
+            for raw in params.getlist(name) if hasattr(params, 'getlist') else params.get(name, ()):
+                key = raw
+                if name in ('country', 'century'):
+                    try:
+                        key = int(raw)
+                    except (TypeError, ValueError):
+                        continue
+                if key in facet.codes:
+                    codes.add(facet.codes[key])
+            if codes:
+                filters[name] = codes
+        return filters
+
+    def match(self, filters, exclude=None):
+        """Битовое множество записей, подходящих под фильтры (кроме exclude)"""
+        mask = self.all
+        for name, codes in filters.items():
+            if name == exclude:
+                continue
+            postings = self.facets[name].postings
+            selected = 0
+            for code in codes:
+                selected |= postings[code]
+            mask &= selected
+        return mask
+
+    def counts(self, filters):
+        """
+        Количество записей по каждому значению каждого фасета.
+
+        Для фасета учитываются фильтры всех остальных фасетов, поэтому
+        соседние значения уже выбранного фасета остаются доступными.
+        """
+        result = {}
+        for name, facet in self.facets.items():
+            mask = self.match(filters, exclude=name)
+            selected = filters.get(name, ())
+            values = []
+            for code, posting in enumerate(facet.postings):
+                count = (posting & mask).bit_count()
+                if count or code in selected:
+                    value = facet.values[code]
+                    values.append({
+                        'value': value,
+                        'label': facet.labels[value],
+                        'count': count,
+                        'selected': code in selected,
+                    })
+            if name == 'century':
+                values.sort(key=lambda item: item['value'])
+            else:
+                values.sort(key=lambda item: (-item['count'], str(item['label'])))
+            result[name] = values
+        return result
+
+    def page_ids(self, mask, offset, limit):
+        """id записей mask в порядке списка, срез [offset:offset + limit]"""
+        return [self.ids[position] for position in _positions(mask, offset, limit)]
+
+
+class FacetResult:
+    """
+    Отфильтрованный список личностей для Paginator: количество берется
+    из индекса, срез загружает из БД только записи страницы.
+    """
+
+    def __init__(self, index, mask, queryset):
+        self.index = index
+        self.mask = mask
+        self.queryset = queryset
+
+    def count(self):
+        return self.mask.bit_count()
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            raise TypeError('FacetResult поддерживает только срезы')
+        start = key.start or 0
+        stop = self.count() if key.stop is None else key.stop
+        ids = self.index.page_ids(self.mask, start, stop - start)
+        found = self.queryset.in_bulk(ids)
+        return [found[figure_id] for figure_id in ids if figure_id in found]
+
+
+_index = None
+_lock = threading.Lock()
+
+
+def get_facet_index():
+    """Индекс для текущей версии данных, перестраивается при ее смене"""
+    global _index
+    version = DataVersion.versions(DataVersion.FIGURES, DataVersion.DIMENSIONS)
+    index = _index
+    if index is not None and index.version == version:
+        return index
+    with _lock:
+        if _index is None or _index.version != version:
+            _index = FacetIndex.build(version)
+        return _index
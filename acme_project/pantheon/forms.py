@@ -2,20 +2,56 @@
 from django import forms
 from .models import HistoricalFigure, City, Occupation, Country
 from django.core.exceptions import ValidationError
+from django.forms.models import ModelChoiceIterator
+from . import dimensions
+
+
+class _CachedChoices:
+    """Варианты выбора из кэша справочников, вычисляются при отрисовке"""
+    
+    def __init__(self, field):
+        self.field = field
+    
+    def __iter__(self):
+        cached = dimensions.choices(self.field.queryset.model)
+        if cached is None:
+            yield from ModelChoiceIterator(self.field)
+            return
+        if self.field.empty_label is not None:
+            yield ('', self.field.empty_label)
+        yield from cached
+    
+    def __len__(self):
+        return len(list(iter(self)))
+
+
+class CachedModelChoiceField(forms.ModelChoiceField):
+    """
+    Выбор записи справочника: список вариантов берется из кэша
+    справочников, а не запросом всей таблицы на каждую форму.
+    Проверка выбранного значения — как у ModelChoiceField.
+    """
+    
+    def _get_choices(self):
+        if hasattr(self, '_choices'):
+            return self._choices
+        return _CachedChoices(self)
+    
+    choices = property(_get_choices, forms.ChoiceField._set_choices)
 
 
 class HistoricalFigureForm(forms.ModelForm):
     """Форма для создания и редактирования исторической личности"""
     
     # Поля для выбора связанных объектов
-    city = forms.ModelChoiceField(
+    city = CachedModelChoiceField(
         queryset=City.objects.all(),
         required=False,
         label="Место рождения (город)",
         widget=forms.Select(attrs={'class': 'form-control'})
     )
     
-    occupation = forms.ModelChoiceField(
+    occupation = CachedModelChoiceField(
         queryset=Occupation.objects.all(),
         required=False,
         label="Основная профессия",
@@ -29,7 +65,7 @@ class HistoricalFigureForm(forms.ModelForm):
         widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Название города'})
     )
     
-    new_country = forms.ModelChoiceField(
+    new_country = CachedModelChoiceField(
         queryset=Country.objects.all(),
         required=False,
         label="Страна для нового города",
@@ -42,6 +78,42 @@ class HistoricalFigureForm(forms.ModelForm):
         widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Название профессии'})
     )
     
+    # Оригинальные названия хранятся в словаре строк (InternedString),
+    # у модели это свойства, а не поля
+    original_city_name = forms.CharField(
+        required=False, max_length=100, label="Город (оригинал)",
+        widget=forms.TextInput(attrs={'class': 'form-control'})
+    )
+    original_country_name = forms.CharField(
+        required=False, max_length=100, label="Страна (оригинал)",
+        widget=forms.TextInput(attrs={'class': 'form-control'})
+    )
+    original_continent_name = forms.CharField(
+        required=False, max_length=100, label="Континент (оригинал)",
+        widget=forms.TextInput(attrs={'class': 'form-control'})
+    )
+    original_occupation_name = forms.CharField(
+        required=False, max_length=200, label="Профессия (оригинал)",
+        widget=forms.TextInput(attrs={'class': 'form-control'})
+    )
+    original_industry_name = forms.CharField(
+        required=False, max_length=200, label="Сфера деятельности (оригинал)",
+        widget=forms.TextInput(attrs={'class': 'form-control'})
+    )
+    original_domain_name = forms.CharField(
+        required=False, max_length=200, label="Домен (оригинал)",
+        widget=forms.TextInput(attrs={'class': 'form-control'})
+    )
+    
+    ORIGINAL_NAME_FIELDS = [
+        'original_city_name',
+        'original_country_name',
+        'original_continent_name',
+        'original_occupation_name',
+        'original_industry_name',
+        'original_domain_name',
+    ]
+    
     class Meta:
         model = HistoricalFigure
         fields = [
@@ -54,12 +126,6 @@ class HistoricalFigureForm(forms.ModelForm):
             'average_views',
             'historical_popularity_index',
             'article_languages',
-            'original_city_name',
-            'original_country_name',
-            'original_continent_name',
-            'original_occupation_name',
-            'original_industry_name',
-            'original_domain_name',
         ]
         widgets = {
             'article_id': forms.NumberInput(attrs={'class': 'form-control'}),
@@ -69,12 +135,6 @@ class HistoricalFigureForm(forms.ModelForm):
             'average_views': forms.NumberInput(attrs={'class': 'form-control'}),
             'historical_popularity_index': forms.NumberInput(attrs={'class': 'form-control'}),
             'article_languages': forms.NumberInput(attrs={'class': 'form-control'}),
-            'original_city_name': forms.TextInput(attrs={'class': 'form-control'}),
-            'original_country_name': forms.TextInput(attrs={'class': 'form-control'}),
-            'original_continent_name': forms.TextInput(attrs={'class': 'form-control'}),
-            'original_occupation_name': forms.TextInput(attrs={'class': 'form-control'}),
-            'original_industry_name': forms.TextInput(attrs={'class': 'form-control'}),
-            'original_domain_name': forms.TextInput(attrs={'class': 'form-control'}),
         }
         labels = {
             'article_id': 'ID статьи',
@@ -86,6 +146,12 @@ class HistoricalFigureForm(forms.ModelForm):
             'article_languages': 'Языки статьи',
         }
     
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk:
+            for name in self.ORIGINAL_NAME_FIELDS:
+                self.initial.setdefault(name, getattr(self.instance, name))
+    
     def clean(self):
         """Кастомная валидация формы"""
         cleaned_data = super().clean()
@@ -102,34 +168,49 @@ class HistoricalFigureForm(forms.ModelForm):
         """Переопределение метода сохранения для обработки связанных объектов"""
         instance = super().save(commit=False)
         
+        for name in self.ORIGINAL_NAME_FIELDS:
+            setattr(instance, name, self.cleaned_data.get(name, ''))
+        
+        # Индекс задан вручную: поправка HPI калибруется заново
+        if 'historical_popularity_index' in self.changed_data:
+            instance.hpi_adjustment = None
+        
         # Создание нового города, если указан
         new_city_name = self.cleaned_data.get('new_city_name')
         new_country = self.cleaned_data.get('new_country')
         
         if new_city_name and new_country:
-            city, created = City.objects.get_or_create(
-                name=new_city_name,
-                country=new_country,
-                defaults={
-                    'name': new_city_name,
-                    'country': new_country,
-                }
-            )
-            instance.city = city
+            city_id = dimensions.lookup_id(City, (new_city_name, new_country.pk))
+            if city_id is not None:
+                instance.city_id = city_id
+            else:
+                city, created = City.objects.get_or_create(
+                    name=new_city_name,
+                    country=new_country,
+                    defaults={
+                        'name': new_city_name,
+                        'country': new_country,
+                    }
+                )
+                instance.city = city
         
         # Создание новой профессии, если указана
         new_occupation_name = self.cleaned_data.get('new_occupation_name')
         
         if new_occupation_name:
-            occupation, created = Occupation.objects.get_or_create(
-                name=new_occupation_name,
-                defaults={
-                    'name': new_occupation_name,
-                    'industry': 'Не указано',
-                    'domain': 'Не указано',
-                }
-            )
-            instance.occupation = occupation
+            occupation_id = dimensions.lookup_id(Occupation, new_occupation_name)
+            if occupation_id is not None:
+                instance.occupation_id = occupation_id
+            else:
+                occupation, created = Occupation.objects.get_or_create(
+                    name=new_occupation_name,
+                    defaults={
+                        'name': new_occupation_name,
+                        'industry': 'Не указано',
+                        'domain': 'Не указано',
+                    }
+                )
+                instance.occupation = occupation
         
         if commit:
             instance.save()
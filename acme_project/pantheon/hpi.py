@@ -0,0 +1,237 @@
+# pantheon/hpi.py
+"""
+Векторный пересчет индекса исторической популярности (HPI).
+
+Индекс Pantheon 1.0 — сумма логарифмов:
+
+    HPI = ln(L) + ln(V) + ln(M) + age(A) + поправка
+
+L — число языков статьи, V — просмотры, M — средние просмотры в месяц
+(входят через -ln(CV) = ln(M) - ln(σ)), A — возраст на REFERENCE_YEAR.
+Величин, которых нет в датасете (σ, просмотры не на английском), хватает
+поправки записи: она калибруется по индексу из CSV или формы сразу при
+записи индекса (calibrate_hpi, для существующих записей — миграция 0007).
+Поэтому пересчет не трогает запись, пока не изменились L, V, M или год
+рождения.
+
+Для пересчета нужен NumPy (необязательная зависимость, только для этого
+модуля); калибровка выполняется в SQL и без него.
+"""
+import math
+
+from django.db import connection, transaction
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.functions import Cast, Greatest, Ln
+from django.dispatch import receiver
+
+from .changes import record_changes
+from .models import POPULARITY_CATEGORIES, HistoricalFigure
+from .signals import figures_changed, notify_figures_changed
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+REFERENCE_YEAR = 2015
+AGE_THRESHOLD = 70
+
+# Точность поля historical_popularity_index
+HPI_DECIMAL_PLACES = 4
+
+FETCH_SIZE = 100_000
+WRITE_BATCH_SIZE = 1000
+
+_TEMP_TABLE = 'pantheon_hpi_update'
+
+
+def numpy_available():
+    return np is not None
+
+
+def _age_term(birth_year):
+    # Младше AGE_THRESHOLD лет — линейно до log4(AGE_THRESHOLD)
+    age = np.clip(REFERENCE_YEAR - birth_year, 0, None)
+    term = np.where(
+        age >= AGE_THRESHOLD,
+        np.log(np.maximum(age, AGE_THRESHOLD)) / math.log(4),
+        age / AGE_THRESHOLD * math.log(AGE_THRESHOLD, 4),
+    )
+    # Год рождения неизвестен: слагаемое целиком в поправке
+    return np.where(np.isnan(birth_year), 0.0, term)
+
+
+def hpi_base(languages, views, average_views, birth_year):
+    """Слагаемые индекса, выражаемые через поля записи (массивы NumPy)"""
+    return (
+        np.log(np.maximum(languages, 1))
+        + np.log(np.maximum(views, 1))
+        + np.log(np.maximum(average_views, 1))
+        + _age_term(birth_year)
+    )
+
+
+def _log_at_least_one(field):
+    return Ln(Greatest(Cast(field, FloatField()), Value(1.0)))
+
+
+def hpi_base_expression():
+    """hpi_base для выражений ORM: то же вычисление в SQL"""
+    age = Greatest(Value(float(REFERENCE_YEAR)) - Cast('birth_year', FloatField()), Value(0.0))
+    age_term = Case(
+        When(birth_year__isnull=True, then=Value(0.0)),
+        When(birth_year__lte=REFERENCE_YEAR - AGE_THRESHOLD, then=Ln(age) / Value(math.log(4))),
+        default=age / Value(float(AGE_THRESHOLD)) * Value(math.log(AGE_THRESHOLD, 4)),
+        output_field=FloatField(),
+    )
+    return (
+        _log_at_least_one('article_languages')
+        + _log_at_least_one('page_views')
+        + _log_at_least_one('average_views')
+        + age_term
+    )
+
+
+def calibrate_hpi(ids=None):
+    """
+    Калибрует пустую поправку по текущему индексу записи (всех или ids),
+    чтобы дальнейшие правки L, V, M и года рождения отражались в индексе
+    при пересчете.
+    """
+    figures = HistoricalFigure.objects.filter(hpi_adjustment__isnull=True)
+    if ids is not None:
+        figures = figures.filter(pk__in=ids)
+    return figures.update(
+        hpi_adjustment=Cast(F('historical_popularity_index'), FloatField()) - hpi_base_expression()
+    )
+
+
+def category_codes(hpi):
+    """Номер категории популярности (0 — самая низкая) для массива индексов"""
+    thresholds = sorted(threshold for threshold, _ in POPULARITY_CATEGORIES)
+    return np.digitize(hpi, thresholds)
+
+
+def load_columns():
+    """Колонки всех личностей в массивы float64 (NULL -> NaN)"""
+    figures = HistoricalFigure.objects.order_by().annotate(
+        average_views_value=Cast('average_views', FloatField()),
+        hpi_value=Cast('historical_popularity_index', FloatField()),
+    ).values_list(
+        'id', 'article_languages', 'page_views', 'birth_year', 'hpi_adjustment',
+        'average_views_value', 'hpi_value',
+    )
+    sql, params = figures.query.sql_with_params()
+    chunks = []
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        # Аннотации в SELECT идут после полей модели: порядок берем из описания
+        names = [column[0] for column in cursor.description]
+        while True:
+            rows = cursor.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            chunks.append(np.array(rows, dtype=np.float64))
+    data = np.concatenate(chunks) if chunks else np.empty((0, len(names)))
+    columns = {name: data[:, index] for index, name in enumerate(names)}
+    return {
+        'id': columns['id'],
+        'languages': columns['article_languages'],
+        'views': columns['page_views'],
+        'average_views': columns['average_views_value'],
+        'birth_year': columns['birth_year'],
+        'hpi': columns['hpi_value'],
+        'adjustment': columns['hpi_adjustment'],
+    }
+
+
+def recompute(columns):
+    """
+    Новые значения индекса и поправки.
+
+    Возвращает (маска записей для записи в БД, новый индекс, поправка, статистика).
+    """
+    base = hpi_base(
+        columns['languages'], columns['views'], columns['average_views'], columns['birth_year']
+    )
+    old_hpi = columns['hpi']
+    adjustment = columns['adjustment'].copy()
+    uncalibrated = np.isnan(adjustment)
+    adjustment[uncalibrated] = old_hpi[uncalibrated] - base[uncalibrated]
+
+    new_hpi = np.round(base + adjustment, HPI_DECIMAL_PLACES)
+    changed = np.abs(new_hpi - old_hpi) >= 0.5 * 10 ** -HPI_DECIMAL_PLACES
+    new_hpi[~changed] = old_hpi[~changed]
+
+    stats = {
+        'total': len(old_hpi),
+        'calibrated': int(uncalibrated.sum()),
+        'changed': int(changed.sum()),
+        'category_changed': int((category_codes(old_hpi) != category_codes(new_hpi)).sum()),
+        'max_delta': float(np.abs(new_hpi - old_hpi).max()) if len(old_hpi) else 0.0,
+    }
+    return changed | uncalibrated, new_hpi, adjustment, stats
+
+
+def write_back(ids, hpi, adjustment, batch_size=WRITE_BATCH_SIZE):
+    """
+    Записывает индекс и поправку: вставка пачками во временную таблицу
+    и один UPDATE ... FROM по первичному ключу.
+    """
+    quote = connection.ops.quote_name
+    table = quote(HistoricalFigure._meta.db_table)
+    temp = quote(_TEMP_TABLE)
+    rows = list(zip(ids.astype(np.int64).tolist(), hpi.tolist(), adjustment.tolist()))
+
+    # Таблица удаляется только после успешного UPDATE: при ошибке
+    # откат atomic() отменяет и ее создание, а DROP в прерванной
+    # транзакции PostgreSQL сам завершился бы ошибкой и скрыл исходную
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TEMPORARY TABLE {temp} '
+            f'(id bigint PRIMARY KEY, hpi numeric(10, 4), adjustment double precision)'
+        )
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            placeholders = ', '.join(['(%s, %s, %s)'] * len(batch))
+            cursor.execute(
+                f'INSERT INTO {temp} (id, hpi, adjustment) VALUES {placeholders}',
+                [value for row in batch for value in row],
+            )
+        cursor.execute(
+            f'UPDATE {table} SET '
+            f'{quote("historical_popularity_index")} = {temp}.hpi, '
+            f'{quote("hpi_adjustment")} = {temp}.adjustment '
+            f'FROM {temp} WHERE {table}.{quote("id")} = {temp}.id'
+        )
+        updated = cursor.rowcount
+        cursor.execute(f'DROP TABLE {temp}')
+    return updated
+
+
+def recompute_hpi(dry_run=False):
+    """Пересчет индекса всех личностей, возвращает статистику"""
+    columns = load_columns()
+    to_write, new_hpi, adjustment, stats = recompute(columns)
+    if dry_run or not to_write.any():
+        return stats
+
+    with transaction.atomic():
+        write_back(columns['id'][to_write], new_hpi[to_write], adjustment[to_write])
+        # В журнал — только изменившийся индекс (поправка наружу не отдается);
+        # article_id лента возьмет из самой записи
+        changed_ids = columns['id'][new_hpi != columns['hpi']]
+        record_changes(updated=((int(pk), None) for pk in changed_ids))
+    if stats['changed']:
+        # Места, агрегаты и прочие производные данные зависят от индекса
+        notify_figures_changed(full=True)
+    return stats
+
+
+@receiver(figures_changed)
+def calibrate_changed(sender, before, after, full, **kwargs):
+    # Индекс новой записи или заданный вручную сразу становится базой поправки
+    if full:
+        calibrate_hpi()
+    elif after:
+        calibrate_hpi(ids=[state['id'] for state in after])
@@ -0,0 +1,385 @@
+# pantheon/importer.py
+import csv
+import os
+import re
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import transaction
+
+from . import dimensions
+from .changes import record_changes
+from .models import City, Country, HistoricalFigure, InternedString, Occupation
+from .resolution import DimensionResolver
+from .signals import notify_figures_changed
+from .snapshots import snapshot_after_import
+
+DEFAULT_BATCH_SIZE = 1000
+
+# Сколько сообщений об ошибках хранить (счетчик ведется по всем)
+MAX_ERRORS = 100
+
+# Поля личности, которые обновляются при update_existing
+UPDATE_FIELDS = [
+    'full_name', 'birth_year', 'city', 'occupation',
+    'page_views', 'average_views', 'historical_popularity_index', 'article_languages',
+    'original_city', 'original_country', 'original_continent',
+    'original_occupation', 'original_industry', 'original_domain',
+]
+
+# Ссылки на словарь строк (InternedString) -> колонка CSV
+ORIGINAL_COLUMNS = {
+    'original_city': 'city',
+    'original_country': 'country',
+    'original_continent': 'continent',
+    'original_occupation': 'occupation',
+    'original_industry': 'industry',
+    'original_domain': 'domain',
+}
+
+_YEAR_RE = re.compile(r'^\s*(-?\d+)')
+
+
+class RowError(ValueError):
+    pass
+
+
+def _text(row, key):
+    return (row.get(key) or '').strip()
+
+
+def _int(row, key, default=0):
+    value = _text(row, key)
+    if not value:
+        return default
+    try:
+        return int(Decimal(value))
+    except InvalidOperation:
+        raise RowError(f'{key}: ожидалось число, получено {value!r}')
+
+
+def _decimal(row, key):
+    value = _text(row, key)
+    if not value:
+        return Decimal(0)
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        raise RowError(f'{key}: ожидалось число, получено {value!r}')
+
+
+def _birth_year(row):
+    # В датасете встречаются значения вида "1237?" и "Unknown"
+    match = _YEAR_RE.match(_text(row, 'birth_year'))
+    return int(match.group(1)) if match else None
+
+
+def _coordinate(row, key):
+    value = _text(row, key)
+    if not value:
+        return None
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        return None
+
+
+def _same(current, figure, field):
+    attname = current._meta.get_field(field).attname
+    return getattr(current, attname) == getattr(figure, attname)
+
+
+class CsvImporter:
+    """
+    Пакетный импорт CSV Pantheon.
+
+    Справочники (страны, города, профессии) кэшируются на время импорта,
+    личности создаются bulk_create пачками по batch_size, существующие
+    (по article_id) обновляются bulk_update, если update_existing.
+    progress(stats) вызывается после каждой пачки. Если resolve (по
+    умолчанию PANTHEON_RESOLVE_DIMENSIONS), города и профессии без точного
+    совпадения сопоставляются с похожими существующими (pantheon.resolution),
+    сопоставления попадают в stats['resolved_messages'].
+
+    Модели задаются атрибутами класса, чтобы тот же импорт мог писать
+    в теневые таблицы (см. pantheon.swap).
+    """
+
+    country_model = Country
+    city_model = City
+    occupation_model = Occupation
+    figure_model = HistoricalFigure
+
+    def __init__(self, update_existing=False, batch_size=DEFAULT_BATCH_SIZE, progress=None, source='',
+                 resolve=None):
+        self.update_existing = update_existing
+        self.source = source
+        self.batch_size = batch_size
+        self.progress = progress
+        self.countries = {}
+        self.cities = {}
+        self.occupations = {}
+        self.interned = {}
+        if resolve is None:
+            resolve = getattr(settings, 'PANTHEON_RESOLVE_DIMENSIONS', False)
+        self.resolver = DimensionResolver(self.city_model, self.occupation_model) if resolve else None
+        dimensions.preload(self.country_model, self.city_model, self.occupation_model)
+        self.stats = {
+            'rows': 0,
+            'created': 0,
+            'updated': 0,
+            'skipped': 0,
+            'errors': 0,
+            'error_messages': [],
+            'resolved': 0,
+            'resolved_messages': [],
+            'started': time.monotonic(),
+        }
+
+    def error(self, line, message):
+        self.stats['errors'] += 1
+        if len(self.stats['error_messages']) < MAX_ERRORS:
+            self.stats['error_messages'].append(f'Строка {line}: {message}')
+
+    # Справочники
+
+    def get_or_create(self, model, key, lookup, defaults):
+        """Запись справочника; key — ключ кэша этого импорта"""
+        # Существующие записи — из кэша справочников, без запроса
+        pk = dimensions.lookup_id(model, key)
+        if pk is not None:
+            return model(pk=pk, **lookup)
+        obj, _ = model.objects.get_or_create(**lookup, defaults=defaults)
+        return obj
+
+    def known(self, model, key):
+        """Есть ли запись справочника точно с таким ключом"""
+        return dimensions.lookup_id(model, key) is not None
+
+    def resolve(self, model, key, find):
+        """
+        Похожая запись справочника (Match), если точного совпадения по key
+        нет; find() ищет ее через DimensionResolver. Match с pk=None —
+        каноническое написание из файла, запись которого еще не создана
+        """
+        if self.resolver is None or self.known(model, key):
+            return None
+        match = find()
+        if match is None:
+            return None
+        self.stats['resolved'] += 1
+        if len(self.stats['resolved_messages']) < MAX_ERRORS:
+            variant = key[0] if isinstance(key, tuple) else key
+            record = f'#{match.pk}, ' if match.pk is not None else ''
+            distance = f', {match.distance:.0f} км' if match.distance is not None else ''
+            self.stats['resolved_messages'].append(
+                f'{model._meta.verbose_name} «{variant}» -> «{match.name}» '
+                f'({record}сходство {match.score:.2f}{distance})'
+            )
+        return match
+
+    def get_country(self, name, continent):
+        if not name:
+            return None
+        if name not in self.countries:
+            self.countries[name] = self.get_or_create(
+                self.country_model, name,
+                {'name': name},
+                {'continent': continent},
+            )
+        return self.countries[name]
+
+    def get_city(self, row, country):
+        name = _text(row, 'city')
+        if not name or country is None:
+            return None
+        key = (name, country.pk)
+        if key not in self.cities:
+            latitude, longitude = _coordinate(row, 'latitude'), _coordinate(row, 'longitude')
+            match = self.resolve(
+                self.city_model, key,
+                lambda: self.resolver.match_city(name, country.pk, latitude, longitude, country.name),
+            )
+            if match is not None and match.pk is None:
+                # Каноническое написание создается по этой строке
+                city = self.get_city({**row, 'city': match.name}, country)
+            elif match is not None:
+                city = self.city_model(pk=match.pk, name=match.name)
+            else:
+                city = self.get_or_create(
+                    self.city_model, key,
+                    {'name': name, 'country': country},
+                    {'state': _text(row, 'state') or None, 'latitude': latitude, 'longitude': longitude},
+                )
+                if self.resolver is not None:
+                    self.resolver.add_city(city)
+            self.cities[key] = city
+        return self.cities[key]
+
+    def get_occupation(self, name, industry, domain):
+        if not name:
+            return None
+        if name not in self.occupations:
+            match = self.resolve(
+                self.occupation_model, name, lambda: self.resolver.match_occupation(name)
+            )
+            if match is not None and match.pk is None:
+                occupation = self.get_occupation(match.name, industry, domain)
+            elif match is not None:
+                occupation = self.occupation_model(pk=match.pk, name=match.name)
+            else:
+                occupation = self.get_or_create(
+                    self.occupation_model, name,
+                    {'name': name},
+                    {'industry': industry, 'domain': domain},
+                )
+                if self.resolver is not None:
+                    self.resolver.add_occupation(occupation)
+            self.occupations[name] = occupation
+        return self.occupations[name]
+
+    # Строки
+
+    def build_figure(self, row):
+        article_id = _int(row, 'article_id', default=None)
+        if article_id is None:
+            raise RowError('не указан article_id')
+
+        country = self.get_country(_text(row, 'country'), _text(row, 'continent'))
+        return self.figure_model(
+            article_id=article_id,
+            full_name=_text(row, 'full_name'),
+            birth_year=_birth_year(row),
+            city=self.get_city(row, country),
+            occupation=self.get_occupation(
+                _text(row, 'occupation'), _text(row, 'industry'), _text(row, 'domain')
+            ),
+            page_views=_int(row, 'page_views'),
+            average_views=_decimal(row, 'average_views'),
+            historical_popularity_index=_decimal(row, 'historical_popularity_index'),
+            article_languages=_int(row, 'article_languages'),
+            **{
+                f'{field}_id': self.interned.get(_text(row, column))
+                for field, column in ORIGINAL_COLUMNS.items()
+            },
+        )
+
+    def existing_figures(self, article_ids):
+        """Уже сохраненные личности пачки: {article_id: объект}"""
+        return self.figure_model.objects.in_bulk(article_ids, field_name='article_id')
+
+    def flush(self, batch):
+        # Одна транзакция на пачку: и новые справочники, и личности
+        with transaction.atomic():
+            # Оригинальные названия пачки — в словарь строк одним запросом
+            self.interned = InternedString.intern(
+                _text(row, column) for _, row in batch for column in ORIGINAL_COLUMNS.values()
+            )
+            figures = {}
+            for line, row in batch:
+                try:
+                    figure = self.build_figure(row)
+                except RowError as error:
+                    self.error(line, error)
+                    continue
+                figures[figure.article_id] = figure
+
+            existing = self.existing_figures(list(figures))
+            new = [figure for article_id, figure in figures.items() if article_id not in existing]
+            self.figure_model.objects.bulk_create(new)
+            self.stats['created'] += len(new)
+
+            changed = []
+            if self.update_existing:
+                for article_id, current in existing.items():
+                    figure = figures[article_id]
+                    # Неизмененные строки не переписываем
+                    if all(_same(current, figure, field) for field in UPDATE_FIELDS):
+                        continue
+                    for field in UPDATE_FIELDS:
+                        setattr(current, field, getattr(figure, field))
+                    # Индекс пришел из файла: поправка HPI калибруется заново
+                    current.hpi_adjustment = None
+                    changed.append(current)
+                self.figure_model.objects.bulk_update(changed, UPDATE_FIELDS + ['hpi_adjustment'])
+                self.stats['updated'] += len(changed)
+                self.stats['skipped'] += len(existing) - len(changed)
+            else:
+                self.stats['skipped'] += len(existing)
+            self.record_changes(new, changed)
+
+        self.stats['rows'] += len(batch)
+        if self.progress:
+            self.progress(self.stats)
+
+    def record_changes(self, new, changed):
+        """Журнал изменений (pantheon.changes) в транзакции пачки"""
+        if any(figure.pk is None for figure in new):
+            # СУБД не вернула id из bulk_create
+            ids = dict(self.figure_model.objects.filter(
+                article_id__in=[figure.article_id for figure in new]
+            ).values_list('article_id', 'id'))
+            for figure in new:
+                figure.pk = ids.get(figure.article_id)
+        record_changes(
+            inserted=[(figure.pk, figure.article_id) for figure in new],
+            updated=[(figure.pk, figure.article_id) for figure in changed],
+        )
+
+    def plan(self, rows):
+        """
+        Предварительный проход по файлу: варианты названий городов и
+        профессий с частотами для DimensionResolver
+        """
+        cities, occupations = {}, {}
+        for row in rows:
+            name, country = _text(row, 'city'), _text(row, 'country')
+            if name and country:
+                count, latitude, longitude = cities.get((name, country), (0, None, None))
+                if not count:
+                    latitude, longitude = _coordinate(row, 'latitude'), _coordinate(row, 'longitude')
+                cities[(name, country)] = (count + 1, latitude, longitude)
+            occupation = _text(row, 'occupation')
+            if occupation:
+                occupations[occupation] = occupations.get(occupation, 0) + 1
+        self.resolver.plan_cities(cities)
+        self.resolver.plan_occupations(occupations)
+
+    def run(self, file):
+        """Импортирует открытый текстовый файл CSV, возвращает статистику"""
+        if self.resolver is not None and file.seekable():
+            # Каноническое написание — самое частое в файле, а не первое
+            start = file.tell()
+            self.plan(csv.DictReader(file))
+            file.seek(start)
+        reader = csv.DictReader(file)
+        batch = []
+        # Строка 1 — заголовок
+        for line, row in enumerate(reader, start=2):
+            batch.append((line, row))
+            if len(batch) >= self.batch_size:
+                self.flush(batch)
+                batch = []
+        if batch:
+            self.flush(batch)
+
+        self.finish()
+        return self.stats
+
+    def finish(self):
+        # Пересчет производных данных (агрегаты и т.п.) одним проходом
+        notify_figures_changed(full=True)
+        snapshot_after_import(self.source)
+
+
+def import_csv(path, importer_class=CsvImporter, **options):
+    """Импорт CSV файла по пути, см. CsvImporter"""
+    options.setdefault('source', os.path.basename(path))
+    with open(path, 'r', encoding='utf-8', newline='') as file:
+        return importer_class(**options).run(file)
+
+
+def rows_per_second(stats):
+    elapsed = time.monotonic() - stats['started']
+    return stats['rows'] / elapsed if elapsed > 0 else 0.0
@@ -0,0 +1,164 @@
+# pantheon/jobs.py
+import os
+import time
+import uuid
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+
+from .importer import MAX_ERRORS, import_csv
+from .models import ImportJob
+from .routers import use_primary
+
+# Как часто (сек.) сохранять прогресс задачи в БД
+PROGRESS_INTERVAL = 1.0
+
+
+def import_dir():
+    path = Path(settings.PANTHEON_IMPORT_DIR)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def enqueue_upload(uploaded_file, update_existing=False):
+    """
+    Сохраняет загруженный файл на диск по частям и ставит задачу в очередь.
+
+    Файл не читается в память целиком: UploadedFile.chunks() отдает его
+    кусками, крупные загрузки Django уже держит во временном файле.
+    """
+    path = import_dir() / f'{uuid.uuid4().hex}.csv'
+    size = 0
+    with open(path, 'wb') as destination:
+        for chunk in uploaded_file.chunks():
+            destination.write(chunk)
+            size += len(chunk)
+
+    return ImportJob.objects.create(
+        file_path=str(path),
+        original_name=os.path.basename(uploaded_file.name),
+        file_size=size,
+        update_existing=update_existing,
+    )
+
+
+def _remove_upload(job):
+    """Удаляет загруженный файл задачи: после импорта он больше не нужен"""
+    try:
+        os.remove(job.file_path)
+    except FileNotFoundError:
+        pass
+
+
+def fail_stale_jobs():
+    """
+    Помечает ошибкой задачи, чей воркер перестал обновлять прогресс.
+
+    Воркер, убитый посреди импорта, оставляет задачу в статусе running
+    навсегда. Заново в очередь такая задача не ставится: если воркер
+    падает на самом файле (например, по памяти), повтор уронил бы и
+    следующий. Пометка — тот же условный UPDATE, что и захват, поэтому
+    два воркера не обработают одну задачу дважды.
+    """
+    timeout = getattr(settings, 'PANTHEON_IMPORT_JOB_TIMEOUT', 30 * 60)
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    failed = []
+    with use_primary():
+        stale = ImportJob.objects.filter(
+            status=ImportJob.STATUS_RUNNING, heartbeat_at__lt=cutoff
+        ).only('pk', 'file_path')
+        for job in stale:
+            marked = ImportJob.objects.filter(
+                pk=job.pk, status=ImportJob.STATUS_RUNNING, heartbeat_at__lt=cutoff
+            ).update(
+                status=ImportJob.STATUS_FAILED,
+                errors=f'Воркер не отвечал больше {timeout} с',
+                finished_at=timezone.now(),
+            )
+            if marked:
+                _remove_upload(job)
+                failed.append(job.pk)
+    return failed
+
+
+def claim_next_job():
+    """
+    Забирает самую старую задачу из очереди.
+
+    Захват — условный UPDATE по статусу, поэтому несколько воркеров
+    не возьмут одну задачу ни на PostgreSQL, ни на SQLite. Перед
+    захватом зависшие задачи помечаются ошибкой (fail_stale_jobs).
+    """
+    fail_stale_jobs()
+    with use_primary():
+        for job in ImportJob.objects.filter(status=ImportJob.STATUS_PENDING).order_by('created_at')[:10]:
+            now = timezone.now()
+            claimed = ImportJob.objects.filter(
+                pk=job.pk, status=ImportJob.STATUS_PENDING
+            ).update(status=ImportJob.STATUS_RUNNING, started_at=now, heartbeat_at=now)
+            if claimed:
+                job.refresh_from_db()
+                return job
+    return None
+
+
+class _ProgressWriter:
+    """
+    Сохраняет счетчики импорта в задачу не чаще PROGRESS_INTERVAL.
+
+    Заодно обновляет heartbeat_at — признак того, что воркер жив.
+    """
+
+    def __init__(self, job):
+        self.job = job
+        self.last_saved = 0.0
+
+    def __call__(self, stats, force=False):
+        now = time.monotonic()
+        if not force and now - self.last_saved < PROGRESS_INTERVAL:
+            return
+        self.last_saved = now
+        ImportJob.objects.filter(pk=self.job.pk).update(
+            rows_processed=stats['rows'],
+            created_count=stats['created'],
+            updated_count=stats['updated'],
+            error_count=stats['errors'],
+            errors='\n'.join(stats['error_messages'][:MAX_ERRORS]),
+            heartbeat_at=timezone.now(),
+        )
+
+
+def run_job(job):
+    """
+    Выполняет задачу импорта и фиксирует итоговый статус.
+
+    Загруженный файл удаляется в любом исходе: повторно задача не
+    запускается, а иначе каталог загрузок рос бы без ограничений.
+    """
+    progress = _ProgressWriter(job)
+    with use_primary():
+        try:
+            stats = import_csv(
+                job.file_path,
+                update_existing=job.update_existing,
+                progress=progress,
+                source=job.original_name,
+            )
+        except Exception as error:
+            ImportJob.objects.filter(pk=job.pk).update(
+                status=ImportJob.STATUS_FAILED,
+                errors=f'{type(error).__name__}: {error}',
+                finished_at=timezone.now(),
+            )
+            raise
+        finally:
+            _remove_upload(job)
+        progress(stats, force=True)
+        ImportJob.objects.filter(pk=job.pk).update(
+            status=ImportJob.STATUS_DONE,
+            finished_at=timezone.now(),
+        )
+    job.refresh_from_db()
+    return job
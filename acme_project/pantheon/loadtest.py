@@ -0,0 +1,395 @@
+# pantheon/loadtest.py
+"""
+Нагрузочное тестирование: локальный сервер приложения и параллельные
+клиенты со смесью запросов.
+
+LocalServer запускает приложение в этом же процессе: WSGI на
+многопоточном wsgiref или ASGI на uvicorn (если установлен). Клиенты —
+потоки с собственным HTTP-соединением; каждый выбирает следующий запрос
+по весам смеси (DEFAULT_MIX). Итог — пропускная способность,
+перцентили задержки и доля ошибок по каждому виду запроса.
+"""
+import http.client
+import random
+import socket
+import socketserver
+import threading
+import time
+from collections import defaultdict
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+from django.urls import reverse
+
+from .models import City, HistoricalFigure, Occupation
+from .signals import STATE_FIELDS, notify_figures_changed
+
+# Вид запроса -> вес в смеси
+DEFAULT_MIX = {
+    'home': 10,
+    'list': 25,
+    'list_deep': 10,
+    'detail': 35,
+    'statistics': 10,
+    'create': 5,
+    'update': 5,
+}
+
+# Страницы списка для «неглубокого» просмотра
+SHALLOW_PAGES = 5
+
+FIGURES_PER_PAGE = 100
+
+PERCENTILES = (50, 95, 99)
+
+# article_id личностей, созданных нагрузочным тестом
+ARTICLE_ID_BASE = 900_000_000
+
+
+class LoadTestError(Exception):
+    pass
+
+
+def parse_mix(text):
+    """'home=10,detail=30' -> {'home': 10, 'detail': 30}"""
+    mix = {}
+    for part in filter(None, (part.strip() for part in text.split(','))):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in DEFAULT_MIX:
+            raise LoadTestError(f'Неизвестный вид запроса: {name} (доступны: {", ".join(DEFAULT_MIX)})')
+        try:
+            mix[name] = float(weight) if weight else 1.0
+        except ValueError:
+            raise LoadTestError(f'Вес должен быть числом: {part}')
+    if not mix or sum(mix.values()) <= 0:
+        raise LoadTestError('Пустая смесь запросов')
+    return mix
+
+
+# Сервер
+
+class _ThreadingWSGIServer(socketserver.ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def _free_port(host):
+    with socket.socket() as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+class LocalServer:
+    """Приложение на 127.0.0.1 в фоновом потоке: kind — 'wsgi' или 'asgi'"""
+
+    def __init__(self, kind='wsgi', host='127.0.0.1'):
+        self.kind = kind
+        self.host = host
+        self.port = None
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        return f'http://{self.host}:{self.port}'
+
+    def start(self):
+        if self.kind == 'asgi':
+            self._start_asgi()
+        else:
+            self._start_wsgi()
+        return self
+
+    def _start_wsgi(self):
+        from django.core.wsgi import get_wsgi_application
+
+        self._server = _ThreadingWSGIServer((self.host, 0), _QuietHandler)
+        self._server.set_app(get_wsgi_application())
+        self.port = self._server.server_port
+        self._thread = threading.Thread(target=self._server.serve_forever, name='pantheon-loadtest-wsgi', daemon=True)
+        self._thread.start()
+
+    def _start_asgi(self):
+        try:
+            import uvicorn
+        except ImportError:
+            raise LoadTestError('Для --server asgi нужен uvicorn (pip install uvicorn)')
+        from django.core.asgi import get_asgi_application
+
+        self.port = _free_port(self.host)
+        config = uvicorn.Config(get_asgi_application(), host=self.host, port=self.port, log_level='warning')
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, name='pantheon-loadtest-asgi', daemon=True)
+        self._thread.start()
+        deadline = time.monotonic() + 10
+        while not self._server.started:
+            if time.monotonic() > deadline or not self._thread.is_alive():
+                raise LoadTestError('ASGI сервер не запустился')
+            time.sleep(0.05)
+
+    def stop(self):
+        if self._server is None:
+            return
+        if self.kind == 'asgi':
+            self._server.should_exit = True
+        else:
+            self._server.shutdown()
+            self._server.server_close()
+        self._thread.join(timeout=10)
+        self._server = None
+
+
+# Клиенты
+
+class Target:
+    """Данные для построения запросов: id личностей, число страниц, справочники"""
+
+    def __init__(self, figure_ids, total_figures, city_ids, occupation_ids):
+        self.figure_ids = figure_ids
+        self.total_pages = max(1, -(-total_figures // FIGURES_PER_PAGE))
+        self.city_ids = city_ids
+        self.occupation_ids = occupation_ids
+
+    @classmethod
+    def from_database(cls, sample=100_000):
+        return cls(
+            list(HistoricalFigure.objects.order_by('pk').values_list('pk', flat=True)[:sample]),
+            HistoricalFigure.objects.count(),
+            list(City.objects.values_list('pk', flat=True)[:sample]),
+            list(Occupation.objects.values_list('pk', flat=True)),
+        )
+
+
+class Client(threading.Thread):
+    """
+    Клиент нагрузки: до deadline (time.monotonic) отправляет запросы,
+    складывая (вид, код ответа, секунды) в samples
+    """
+
+    def __init__(self, number, base_url, target, mix, deadline, budget, seed=None):
+        super().__init__(name=f'pantheon-loadtest-client-{number}', daemon=True)
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.number = number
+        self.target = target
+        self.kinds = list(mix)
+        self.weights = [mix[kind] for kind in self.kinds]
+        self.deadline = deadline
+        self.budget = budget
+        self.random = random.Random(None if seed is None else seed + number)
+        self.samples = []
+        self.cookies = SimpleCookie()
+        self.created = []
+        self.sequence = 0
+        self.connection = None
+
+    def run(self):
+        self.connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        try:
+            while time.monotonic() < self.deadline and self.budget.take():
+                kind = self.random.choices(self.kinds, self.weights)[0]
+                started = time.perf_counter()
+                try:
+                    status = getattr(self, f'do_{kind}')()
+                except (OSError, http.client.HTTPException):
+                    self.connection.close()
+                    status = 0
+                self.samples.append((kind, status, time.perf_counter() - started))
+        finally:
+            self.connection.close()
+
+    # HTTP
+
+    def request(self, method, path, fields=None):
+        headers = {}
+        body = None
+        if fields is not None:
+            body = urlencode(fields)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            headers['X-CSRFToken'] = self.csrf_token()
+        cookie = '; '.join(f'{name}={morsel.value}' for name, morsel in self.cookies.items())
+        if cookie:
+            headers['Cookie'] = cookie
+        self.connection.request(method, path, body=body, headers=headers)
+        response = self.connection.getresponse()
+        response.read()
+        for header in response.headers.get_all('Set-Cookie') or ():
+            self.cookies.load(header)
+        return response
+
+    def csrf_token(self):
+        if 'csrftoken' not in self.cookies:
+            # Первая форма выдает cookie CSRF; этот запрос не учитывается
+            self.connection.request('GET', reverse('figure_create'))
+            response = self.connection.getresponse()
+            response.read()
+            for header in response.headers.get_all('Set-Cookie') or ():
+                self.cookies.load(header)
+        morsel = self.cookies.get('csrftoken')
+        return morsel.value if morsel else ''
+
+    def get(self, path):
+        return self.request('GET', path).status
+
+    # Виды запросов
+
+    def do_home(self):
+        return self.get(reverse('home'))
+
+    def do_list(self):
+        page = self.random.randint(1, min(SHALLOW_PAGES, self.target.total_pages))
+        return self.get(f'{reverse("figure_list")}?page={page}')
+
+    def do_list_deep(self):
+        page = self.random.randint(1, self.target.total_pages)
+        return self.get(f'{reverse("figure_list")}?page={page}')
+
+    def do_detail(self):
+        if not self.target.figure_ids:
+            return self.do_list()
+        return self.get(reverse('figure_detail', args=[self.random.choice(self.target.figure_ids)]))
+
+    def do_statistics(self):
+        return self.get(reverse('statistics'))
+
+    def figure_fields(self, article_id):
+        return {
+            'article_id': article_id,
+            'full_name': f'Load Test {article_id}',
+            'birth_year': self.random.randint(-500, 2000),
+            'city': self.random.choice(self.target.city_ids) if self.target.city_ids else '',
+            'occupation': self.random.choice(self.target.occupation_ids) if self.target.occupation_ids else '',
+            'page_views': self.random.randint(0, 10_000_000),
+            'average_views': round(self.random.uniform(0, 100_000), 2),
+            'historical_popularity_index': round(self.random.uniform(0, 30), 4),
+            'article_languages': self.random.randint(1, 200),
+        }
+
+    def do_create(self):
+        self.sequence += 1
+        article_id = ARTICLE_ID_BASE + self.number * 1_000_000 + self.sequence
+        fields = self.figure_fields(article_id)
+        response = self.request('POST', reverse('figure_create'), fields)
+        location = response.headers.get('Location', '')
+        if response.status == 302:
+            self.created.append((location.rstrip('/').rsplit('/', 1)[-1], article_id))
+        # Форма с ошибками возвращается с кодом 200
+        return response.status if response.status != 200 else 422
+
+    def do_update(self):
+        if not self.created:
+            return self.do_create()
+        pk, article_id = self.random.choice(self.created)
+        response = self.request('POST', reverse('figure_update', args=[pk]), self.figure_fields(article_id))
+        return response.status if response.status != 200 else 422
+
+
+def delete_created():
+    """Удаляет личности, созданные нагрузочным тестом; возвращает их число"""
+    created = HistoricalFigure.objects.filter(article_id__gte=ARTICLE_ID_BASE)
+    states = list(created.values(*STATE_FIELDS))
+    if states:
+        created.delete()
+        notify_figures_changed(before=states)
+    return len(states)
+
+
+class Budget:
+    """Общий лимит числа запросов для всех клиентов (None — без лимита)"""
+
+    def __init__(self, limit=None):
+        self.remaining = limit
+        self.lock = threading.Lock()
+
+    def take(self):
+        if self.remaining is None:
+            return True
+        with self.lock:
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            return True
+
+
+def run_load(base_url, target, mix, concurrency, duration, requests=None, seed=None):
+    """Запускает клиентов, возвращает (samples, длительность в секундах)"""
+    deadline = time.monotonic() + duration
+    budget = Budget(requests)
+    clients = [
+        Client(number, base_url, target, mix, deadline, budget, seed)
+        for number in range(concurrency)
+    ]
+    started = time.perf_counter()
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    elapsed = time.perf_counter() - started
+    return [sample for client in clients for sample in client.samples], elapsed
+
+
+# Отчет
+
+def percentile(sorted_values, percent):
+    """Перцентиль по ближайшему рангу"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * percent // 100))
+    return sorted_values[min(len(sorted_values), int(rank)) - 1]
+
+
+def _summary(samples, elapsed):
+    latencies = sorted(seconds * 1000 for _, _, seconds in samples)
+    errors = sum(1 for _, status, _ in samples if status == 0 or status >= 400)
+    statuses = defaultdict(int)
+    for _, status, _ in samples:
+        statuses[str(status)] += 1
+    return {
+        'requests': len(samples),
+        'errors': errors,
+        'error_rate': round(errors / len(samples), 4) if samples else 0.0,
+        'throughput_rps': round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        'latency_ms': {
+            'mean': round(sum(latencies) / len(latencies), 2) if latencies else None,
+            **{f'p{percent}': round(percentile(latencies, percent), 2) if latencies else None
+               for percent in PERCENTILES},
+            'max': round(latencies[-1], 2) if latencies else None,
+        },
+        'statuses': dict(sorted(statuses.items())),
+    }
+
+
+def summarize(samples, elapsed):
+    """{'total': сводка, 'endpoints': {вид: сводка}}"""
+    by_kind = defaultdict(list)
+    for sample in samples:
+        by_kind[sample[0]].append(sample)
+    return {
+        'total': _summary(samples, elapsed),
+        'endpoints': {kind: _summary(items, elapsed) for kind, items in sorted(by_kind.items())},
+    }
+
+
+def compare_reports(previous, current):
+    """
+    [(вид, rps было, rps стало, p95 было, p95 стало)] по видам из обоих
+    отчетов и по итогу
+    """
+    rows = []
+    names = ['total'] + sorted(set(previous['endpoints']) & set(current['endpoints']))
+    for name in names:
+        old = previous['total'] if name == 'total' else previous['endpoints'][name]
+        new = current['total'] if name == 'total' else current['endpoints'][name]
+        rows.append((
+            name,
+            old['throughput_rps'], new['throughput_rps'],
+            old['latency_ms']['p95'], new['latency_ms']['p95'],
+        ))
+    return rows
@@ -0,0 +1,62 @@
+# pantheon/management/base.py
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from pantheon.profiling import Profiler
+
+PROFILE_REPORT_LIMIT = 25
+
+
+class PantheonCommand(BaseCommand):
+    """
+    Базовая команда pantheon с параметром --profile.
+
+    --profile [ФАЙЛ] — выполнить команду под cProfile и сохранить статистику
+    pstats (по умолчанию в PANTHEON_PROFILE_DIR/<команда>-<время>.prof),
+    --profile-collapsed — дополнительно записать выборки стека для флеймграфа.
+    """
+
+    def create_parser(self, prog_name, subcommand, **kwargs):
+        parser = super().create_parser(prog_name, subcommand, **kwargs)
+        self._command_name = subcommand
+        parser.add_argument(
+            '--profile',
+            nargs='?',
+            const='',
+            default=None,
+            metavar='ФАЙЛ',
+            help='Профилировать выполнение и сохранить статистику pstats'
+        )
+        parser.add_argument(
+            '--profile-collapsed',
+            action='store_true',
+            help='Вместе с --profile записать стеки для флеймграфа (.collapsed)'
+        )
+        return parser
+
+    def execute(self, *args, **options):
+        path = options.get('profile')
+        if path is None:
+            return super().execute(*args, **options)
+
+        profiler = Profiler(collapsed=options.get('profile_collapsed', False))
+        try:
+            with profiler:
+                return super().execute(*args, **options)
+        finally:
+            self._write_profile(profiler, path or self._default_profile_path())
+
+    def _default_profile_path(self):
+        name = getattr(self, '_command_name', None) or self.__module__.rsplit('.', 1)[-1]
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        return os.path.join(settings.PANTHEON_PROFILE_DIR, f'{name}-{stamp}.prof')
+
+    def _write_profile(self, profiler, path):
+        paths = profiler.dump(path)
+        self.stderr.write(profiler.report(PROFILE_REPORT_LIMIT))
+        self.stderr.write(f'Время выполнения: {profiler.elapsed:.2f} с')
+        for written in paths:
+            self.stderr.write(f'Профиль сохранен: {written}')
@@ -1,9 +1,9 @@
 # pantheon/management/commands/analyze_data.py
-from django.core.management.base import BaseCommand
 from django.db.models import Count, Avg, Max, Min, Sum
+from pantheon.management.base import PantheonCommand
 from pantheon.models import HistoricalFigure, Country, City, Occupation
 
-class Command(BaseCommand):
+class Command(PantheonCommand):
     help = 'Анализ данных Pantheon Project'
     
     def handle(self, *args, **options):
@@ -60,9 +60,7 @@ class Command(BaseCommand):
         
         # Самые распространенные профессии
         self.stdout.write(f'\nТОП-5 ПРОФЕССИЙ:')
-        occupations = Occupation.objects.annotate(
-            figure_count=Count('historical_figures')
-        ).order_by('-figure_count')[:5]
+        occupations = Occupation.objects.order_by('-figure_count')[:5]
         
         for i, occ in enumerate(occupations, 1):
             self.stdout.write(
@@ -73,9 +71,7 @@ class Command(BaseCommand):
         
         # Города с наибольшим количеством личностей
         self.stdout.write(f'\nТОП-5 ГОРОДОВ:')
-        cities = City.objects.select_related('country').annotate(
-            figure_count=Count('historical_figures')
-        ).order_by('-figure_count')[:5]
+        cities = City.objects.select_related('country').order_by('-figure_count')[:5]
         
         for i, city in enumerate(cities, 1):
             self.stdout.write(
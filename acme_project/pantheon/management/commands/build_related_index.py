@@ -0,0 +1,27 @@
+# pantheon/management/commands/build_related_index.py
+import time
+from pantheon.management.base import PantheonCommand
+from pantheon.related import DEFAULT_TOP_K, build_related_index
+from pantheon.routers import use_primary
+
+
+class Command(PantheonCommand):
+    help = 'Построение индекса похожих личностей для детальной страницы'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=DEFAULT_TOP_K,
+            help=f'Количество похожих личностей на запись (по умолчанию {DEFAULT_TOP_K})'
+        )
+    
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        
+        with use_primary():
+            total = build_related_index(top_k=options['top'])
+        
+        self.stdout.write(self.style.SUCCESS(
+            f'Индекс построен: {total:,} записей за {time.monotonic() - started:.1f} с'
+        ))
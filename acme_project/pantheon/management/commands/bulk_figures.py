@@ -0,0 +1,74 @@
+# pantheon/management/commands/bulk_figures.py
+from decimal import Decimal
+from django.core.exceptions import ValidationError
+from django.core.management.base import CommandError
+from pantheon.management.base import PantheonCommand
+from pantheon.bulk import (
+    FILTERS, build_changes, bulk_delete_figures, bulk_update_figures, filter_figures, preview_count,
+)
+from pantheon.models import City, Occupation
+from pantheon.routers import use_primary
+
+
+class Command(PantheonCommand):
+    help = 'Массовое изменение или удаление исторических личностей одним запросом'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--filter',
+            action='append',
+            default=[],
+            metavar='ИМЯ=ЗНАЧЕНИЕ',
+            help=f'Условие отбора, можно повторять. Доступно: {", ".join(FILTERS)}'
+        )
+        parser.add_argument('--set-occupation', type=int, help='Назначить профессию (id)')
+        parser.add_argument('--set-city', type=int, help='Назначить город (id)')
+        parser.add_argument('--hpi-delta', type=Decimal, help='Прибавить к индексу популярности')
+        parser.add_argument('--set-hpi', type=Decimal, help='Установить индекс популярности')
+        parser.add_argument('--delete', action='store_true', help='Удалить отобранные записи')
+        parser.add_argument('--dry-run', action='store_true', help='Только показать количество записей')
+
+    def parse_filters(self, items):
+        filters = {}
+        for item in items:
+            name, sep, value = item.partition('=')
+            if not sep:
+                raise CommandError(f'Фильтр должен иметь вид имя=значение: {item}')
+            filters[name] = value.split(',') if name == 'ids' else value
+        return filters
+
+    def handle(self, *args, **options):
+        filters = self.parse_filters(options['filter'])
+        if not filters:
+            raise CommandError('Укажите хотя бы один --filter, чтобы не изменить всю таблицу случайно')
+
+        with use_primary():
+            try:
+                queryset = filter_figures(**filters)
+                changes = build_changes(
+                    occupation=options['set_occupation'],
+                    city=options['set_city'],
+                    hpi_delta=options['hpi_delta'],
+                    hpi_value=options['set_hpi'],
+                )
+            except ValidationError as error:
+                raise CommandError('; '.join(error.messages))
+            except (City.DoesNotExist, Occupation.DoesNotExist):
+                raise CommandError('Указанный город или профессия не найдены')
+
+            if options['delete'] and changes:
+                raise CommandError('--delete нельзя совмещать с изменением полей')
+            if not options['delete'] and not changes:
+                raise CommandError('Не задано ни одно изменение и не указан --delete')
+
+            count = preview_count(queryset)
+            self.stdout.write(f'Под условия попадает записей: {count:,}')
+            if options['dry_run'] or not count:
+                return
+
+            if options['delete']:
+                deleted = bulk_delete_figures(queryset)
+                self.stdout.write(self.style.SUCCESS(f'Удалено записей: {deleted:,}'))
+            else:
+                updated = bulk_update_figures(queryset, **changes)
+                self.stdout.write(self.style.SUCCESS(f'Изменено записей: {updated:,}'))
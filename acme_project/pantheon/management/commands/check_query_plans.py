@@ -0,0 +1,116 @@
+# pantheon/management/commands/check_query_plans.py
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.db import connection
+
+from pantheon.importer import import_csv
+from pantheon.management.base import PantheonCommand
+from pantheon.plans import (
+    DEFAULT_LARGE_TABLE_ROWS, PlanError, baseline_path, collect_plans, compare, load_baseline,
+    save_baseline,
+)
+from pantheon.routers import use_primary
+
+
+class Command(PantheonCommand):
+    help = (
+        'Проверка планов запросов страниц и команд pantheon: полные просмотры '
+        'и сортировки больших таблиц, сравнение с эталоном'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'targets',
+            nargs='*',
+            help='Проверить только эти цели (figure_list, statistics, analyze_data, ...)'
+        )
+        parser.add_argument(
+            '--update-baseline',
+            action='store_true',
+            help='Сохранить текущие планы как эталон'
+        )
+        parser.add_argument(
+            '--baseline-dir',
+            default=None,
+            help='Каталог эталонов (по умолчанию PANTHEON_QUERY_PLAN_DIR), '
+                 'файл эталона — <СУБД>.json'
+        )
+        parser.add_argument(
+            '--large-table-rows',
+            type=int,
+            default=DEFAULT_LARGE_TABLE_ROWS,
+            help='С какого числа строк таблица считается большой '
+                 f'(по умолчанию {DEFAULT_LARGE_TABLE_ROWS})'
+        )
+        parser.add_argument(
+            '--seed',
+            metavar='CSV',
+            help='Проверять на тестовой БД, загруженной из этого CSV (для CI)'
+        )
+
+    def handle(self, *args, **options):
+        directory = Path(options['baseline_dir'] or settings.PANTHEON_QUERY_PLAN_DIR)
+        path = baseline_path(directory)
+
+        with use_primary():
+            if options['seed']:
+                report = self.collect_seeded(options['seed'], options)
+            else:
+                report = collect_plans(options['targets'], options['large_table_rows'])
+
+        self.print_report(report, options['verbosity'])
+
+        if options['update_baseline']:
+            if options['targets']:
+                # Остальные цели эталона сохраняются как были
+                try:
+                    report = {**load_baseline(path), **report}
+                except PlanError:
+                    pass
+            save_baseline(path, report)
+            self.stdout.write(self.style.SUCCESS(f'Эталон сохранен: {path}'))
+            return
+
+        try:
+            baseline = load_baseline(path)
+        except PlanError as error:
+            raise CommandError(str(error))
+
+        regressions = compare(baseline, report)
+        for target, key, sql, issues in regressions:
+            self.stdout.write(self.style.ERROR(
+                f'{target} [{key}]: {", ".join(issues)}\n    {sql[:300]}'
+            ))
+        if regressions:
+            raise CommandError(f'Планы запросов ухудшились: {len(regressions)}')
+        self.stdout.write(self.style.SUCCESS('Планы запросов не хуже эталона'))
+
+    def collect_seeded(self, csv_file, options):
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            stats = import_csv(csv_file)
+            self.stdout.write(f'Тестовая БД: загружено {stats["created"]:,} личностей')
+            with connection.cursor() as cursor:
+                # Статистика для планировщика. В PostgreSQL еще и карта
+                # видимости: без нее выбор index-only scan зависит от того,
+                # успел ли пройти autovacuum, и эталон не воспроизводится
+                cursor.execute('VACUUM ANALYZE' if connection.vendor == 'postgresql' else 'ANALYZE')
+            return collect_plans(options['targets'], options['large_table_rows'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def print_report(self, report, verbosity):
+        for target, plans in report.items():
+            issues = sorted({issue for plan in plans.values() for issue in plan['issues']})
+            queries = sum(plan['count'] for plan in plans.values())
+            line = f'{target:24} запросов: {queries:3}'
+            if issues:
+                line += f'  {", ".join(issues)}'
+            self.stdout.write(line)
+            if verbosity > 1:
+                for key, plan in plans.items():
+                    self.stdout.write(f'  [{key}] x{plan["count"]} {plan["sql"][:200]}')
+                    for row in plan['plan']:
+                        self.stdout.write(f'      {row}')
@@ -0,0 +1,44 @@
+# pantheon/management/commands/import_worker.py
+import time
+from pantheon.management.base import PantheonCommand
+from pantheon.jobs import claim_next_job, run_job
+
+
+class Command(PantheonCommand):
+    help = 'Фоновый обработчик очереди загрузок CSV (задачи ImportJob)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Обработать задачи из очереди и завершиться'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=2.0,
+            help='Пауза между проверками очереди, сек. (по умолчанию 2)'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Обработчик импорта запущен')
+
+        while True:
+            job = claim_next_job()
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+                continue
+
+            self.stdout.write(f'{job}: начат')
+            try:
+                job = run_job(job)
+            except Exception as error:
+                self.stdout.write(self.style.ERROR(f'{job}: ошибка {error}'))
+                continue
+
+            self.stdout.write(self.style.SUCCESS(
+                f'{job}: {job.rows_processed} строк, '
+                f'{job.rows_per_second:,.0f} строк/с, ошибок {job.error_count}'
+            ))
@@ -0,0 +1,228 @@
+# pantheon/management/commands/load_test.py
+import json
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from pantheon.importer import import_csv
+from pantheon.loadtest import (
+    DEFAULT_MIX, LoadTestError, LocalServer, Target, compare_reports, delete_created, parse_mix,
+    run_load, summarize,
+)
+from pantheon.management.base import PantheonCommand
+from pantheon.routers import use_primary
+from pantheon.warmup import warm_up
+
+WARMUP_STEPS = ('urls', 'templates', 'dimensions', 'facets')
+
+
+class Command(PantheonCommand):
+    help = (
+        'Нагрузочный тест: приложение на локальном сервере, параллельные клиенты '
+        'со смесью запросов, отчет о пропускной способности и задержках в JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed',
+            metavar='CSV',
+            help='Тестировать на тестовой БД, загруженной из этого CSV'
+        )
+        parser.add_argument(
+            '--url',
+            help='Нагружать уже запущенный сервер по этому адресу вместо локального'
+        )
+        parser.add_argument(
+            '--server',
+            choices=['wsgi', 'asgi'],
+            default='wsgi',
+            help='Локальный сервер: wsgi (wsgiref, потоки) или asgi (uvicorn)'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=8,
+            help='Число параллельных клиентов (по умолчанию 8)'
+        )
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=30.0,
+            help='Длительность теста, с (по умолчанию 30)'
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=None,
+            help='Остановиться после этого числа запросов'
+        )
+        parser.add_argument(
+            '--mix',
+            default=None,
+            help='Смесь запросов "вид=вес,...", виды: ' + ', '.join(DEFAULT_MIX)
+        )
+        parser.add_argument(
+            '--random-seed',
+            type=int,
+            default=None,
+            help='Начальное значение генератора (воспроизводимая последовательность запросов)'
+        )
+        parser.add_argument(
+            '--label',
+            default='',
+            help='Метка прогона в отчете (версия, ветка)'
+        )
+        parser.add_argument(
+            '--output',
+            metavar='ФАЙЛ',
+            help='Сохранить отчет в JSON'
+        )
+        parser.add_argument(
+            '--compare',
+            metavar='ФАЙЛ',
+            help='Сравнить с отчетом предыдущего прогона'
+        )
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1:
+            raise CommandError('--concurrency должен быть не меньше 1')
+        if options['seed'] and options['url']:
+            raise CommandError('--seed нельзя совмещать с --url: внешний сервер работает со своей БД')
+        try:
+            mix = parse_mix(options['mix']) if options['mix'] else dict(DEFAULT_MIX)
+        except LoadTestError as error:
+            raise CommandError(str(error))
+        previous = self.load_report(options['compare']) if options['compare'] else None
+
+        with use_primary():
+            if options['seed']:
+                report = self.run_seeded(options['seed'], mix, options)
+            else:
+                report = self.run(mix, options)
+
+        self.print_report(report)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+            self.stdout.write(f'Отчет сохранен: {options["output"]}')
+        if previous:
+            self.print_comparison(previous, report)
+
+    def run_seeded(self, csv_file, mix, options):
+        test_settings = connection.settings_dict.setdefault('TEST', {})
+        original_name = test_settings.get('NAME')
+        temporary = None
+        if connection.vendor == 'sqlite' and not original_name:
+            # БД в памяти не видна потокам сервера — тестовая БД в файле
+            descriptor, temporary = tempfile.mkstemp(prefix='pantheon-loadtest-', suffix='.sqlite3')
+            os.close(descriptor)
+            test_settings['NAME'] = temporary
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            stats = import_csv(csv_file)
+            self.stdout.write(f'Тестовая БД: загружено {stats["created"]:,} личностей')
+            with connection.cursor() as cursor:
+                # Статистика для планировщика
+                cursor.execute('ANALYZE')
+            return self.run(mix, options, cleanup=False)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            test_settings['NAME'] = original_name
+            if temporary and os.path.exists(temporary):
+                os.remove(temporary)
+
+    def run(self, mix, options, cleanup=True):
+        hosts = list(settings.ALLOWED_HOSTS) + ['127.0.0.1', 'localhost']
+        # Производственный режим: без DEBUG (он копит SQL-запросы в памяти)
+        # и с одной БД, чтобы реплики не искажали результат локального прогона
+        overrides = {'DEBUG': False, 'ALLOWED_HOSTS': hosts}
+        if not options['url']:
+            overrides['PANTHEON_READ_REPLICAS'] = []
+
+        with override_settings(**overrides):
+            target = Target.from_database()
+            server = None
+            if options['url']:
+                base_url = options['url'].rstrip('/')
+            else:
+                warm_up(WARMUP_STEPS)
+                try:
+                    server = LocalServer(options['server']).start()
+                except LoadTestError as error:
+                    raise CommandError(str(error))
+                base_url = server.url
+
+            self.stdout.write(
+                f'Нагрузка: {base_url}, клиентов: {options["concurrency"]}, '
+                f'{options["duration"]:g} с'
+                + (f' или {options["requests"]} запросов' if options['requests'] else '')
+            )
+            try:
+                samples, elapsed = run_load(
+                    base_url, target, mix, options['concurrency'], options['duration'],
+                    options['requests'], options['random_seed'],
+                )
+            finally:
+                if server:
+                    server.stop()
+                if cleanup and not options['url']:
+                    deleted = delete_created()
+                    if deleted:
+                        self.stdout.write(f'Удалено созданных тестом личностей: {deleted}')
+
+        report = summarize(samples, elapsed)
+        report['meta'] = {
+            'label': options['label'],
+            'started_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'target': options['url'] or f'local {options["server"]}',
+            'database': connection.vendor,
+            'figures': len(target.figure_ids),
+            'concurrency': options['concurrency'],
+            'duration_s': round(elapsed, 3),
+            'mix': mix,
+        }
+        return report
+
+    def load_report(self, path):
+        try:
+            with open(path, encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError) as error:
+            raise CommandError(f'Не удалось прочитать отчет {path}: {error}')
+
+    def print_report(self, report):
+        self.stdout.write(
+            f'\n{"запрос":12} {"всего":>7} {"ошибок":>7} {"rps":>8} '
+            f'{"p50, мс":>9} {"p95, мс":>9} {"p99, мс":>9}'
+        )
+        rows = list(report['endpoints'].items()) + [('итого', report['total'])]
+        for name, summary in rows:
+            latency = summary['latency_ms']
+            self.stdout.write(
+                f'{name:12} {summary["requests"]:7} {summary["errors"]:7} '
+                f'{summary["throughput_rps"]:8.1f} '
+                + ' '.join(
+                    f'{latency[key]:9.1f}' if latency[key] is not None else f'{"-":>9}'
+                    for key in ('p50', 'p95', 'p99')
+                )
+            )
+        if report['total']['errors']:
+            self.stdout.write(self.style.WARNING(
+                f'Доля ошибок: {report["total"]["error_rate"]:.2%}'
+            ))
+
+    def print_comparison(self, previous, current):
+        label = previous.get('meta', {}).get('label') or 'предыдущий'
+        self.stdout.write(f'\nСравнение с прогоном «{label}»:')
+        for name, old_rps, new_rps, old_p95, new_p95 in compare_reports(previous, current):
+            rps_change = f'{(new_rps / old_rps - 1):+.1%}' if old_rps else '-'
+            p95_change = f'{(new_p95 / old_p95 - 1):+.1%}' if old_p95 and new_p95 is not None else '-'
+            self.stdout.write(
+                f'  {name:12} rps {old_rps:8.1f} -> {new_rps:8.1f} ({rps_change:>7})   '
+                f'p95 {old_p95 or 0:8.1f} -> {new_p95 or 0:8.1f} мс ({p95_change:>7})'
+            )
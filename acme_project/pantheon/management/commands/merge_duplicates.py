@@ -0,0 +1,46 @@
+# pantheon/management/commands/merge_duplicates.py
+from pantheon.management.base import PantheonCommand
+from pantheon.models import City, Occupation
+from pantheon.resolution import find_duplicates, merge_duplicates
+from pantheon.routers import use_primary
+
+MODELS = {'city': City, 'occupation': Occupation}
+
+
+class Command(PantheonCommand):
+    help = 'Слияние дубликатов городов и профессий (варианты написания одного названия)'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model',
+            choices=sorted(MODELS),
+            action='append',
+            help='Справочник (можно несколько раз, по умолчанию все)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать найденные дубликаты'
+        )
+    
+    def handle(self, *args, **options):
+        with use_primary():
+            for name in options['model'] or sorted(MODELS):
+                model = MODELS[name]
+                groups = find_duplicates(model)
+                self.stdout.write(f'{model._meta.verbose_name_plural}: групп дубликатов {len(groups)}')
+                for group in groups:
+                    for duplicate in group.duplicates:
+                        distance = f', {duplicate.distance:.1f} км' if duplicate.distance is not None else ''
+                        self.stdout.write(
+                            f'  #{duplicate.pk} «{duplicate.name}» -> #{group.canonical.pk} '
+                            f'«{group.canonical.name}» (сходство {duplicate.score:.2f}{distance})'
+                        )
+                if options['dry_run'] or not groups:
+                    continue
+                
+                moved = merge_duplicates(model, groups)
+                removed = sum(len(group.duplicates) for group in groups)
+                self.stdout.write(self.style.SUCCESS(
+                    f'Удалено записей: {removed}, перенесено личностей: {moved:,}'
+                ))
@@ -0,0 +1,27 @@
+# pantheon/management/commands/prune_changes.py
+from django.conf import settings
+
+from pantheon.changes import prune_changes
+from pantheon.management.base import PantheonCommand
+from pantheon.routers import use_primary
+
+
+class Command(PantheonCommand):
+    help = (
+        'Удаление старых записей журнала изменений; потребители ленты с более '
+        'старым курсором получат полный снимок'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.PANTHEON_CHANGES_RETENTION_DAYS,
+            help='Сколько дней хранить журнал '
+                 f'(по умолчанию PANTHEON_CHANGES_RETENTION_DAYS = {settings.PANTHEON_CHANGES_RETENTION_DAYS})'
+        )
+    
+    def handle(self, *args, **options):
+        with use_primary():
+            deleted = prune_changes(options['days'])
+        self.stdout.write(self.style.SUCCESS(f'Удалено записей журнала: {deleted:,}'))
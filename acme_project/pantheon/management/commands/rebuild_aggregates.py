@@ -0,0 +1,21 @@
+# pantheon/management/commands/rebuild_aggregates.py
+from django.db import transaction
+from pantheon.management.base import PantheonCommand
+from pantheon.aggregates import refresh_aggregates
+from pantheon.models import City, Country, Occupation
+from pantheon.routers import use_primary
+
+
+class Command(PantheonCommand):
+    help = 'Полный пересчет агрегатов городов, стран и профессий'
+    
+    def handle(self, *args, **options):
+        with use_primary(), transaction.atomic():
+            refresh_aggregates()
+        
+        self.stdout.write(
+            f'Городов с личностями: {City.objects.filter(figure_count__gt=0).count():,}\n'
+            f'Стран с личностями: {Country.objects.filter(figure_count__gt=0).count():,}\n'
+            f'Профессий с личностями: {Occupation.objects.filter(figure_count__gt=0).count():,}'
+        )
+        self.stdout.write(self.style.SUCCESS('Агрегаты пересчитаны'))
@@ -0,0 +1,19 @@
+# pantheon/management/commands/rebuild_cube.py
+from django.db.models import Sum
+
+from pantheon.cube import refresh_cube
+from pantheon.management.base import PantheonCommand
+from pantheon.models import CubeCell
+from pantheon.routers import use_primary
+
+
+class Command(PantheonCommand):
+    help = 'Полный пересчет куба сводных таблиц (континент, страна, домен, сфера, век)'
+    
+    def handle(self, *args, **options):
+        with use_primary():
+            cells = refresh_cube()
+            figures = CubeCell.objects.aggregate(total=Sum('figure_count'))['total'] or 0
+        
+        self.stdout.write(f'Ячеек: {cells:,}\nЛичностей: {figures:,}')
+        self.stdout.write(self.style.SUCCESS('Куб пересчитан'))
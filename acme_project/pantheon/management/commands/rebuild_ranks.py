@@ -0,0 +1,19 @@
+# pantheon/management/commands/rebuild_ranks.py
+from pantheon.management.base import PantheonCommand
+from pantheon.models import HistoricalFigure
+from pantheon.ranks import refresh_ranks
+from pantheon.routers import use_primary
+
+
+class Command(PantheonCommand):
+    help = 'Полный пересчет мест личностей в общем рейтинге, по континентам и доменам'
+    
+    def handle(self, *args, **options):
+        with use_primary():
+            updated = refresh_ranks()
+            unranked = HistoricalFigure.objects.filter(global_rank__isnull=True).count()
+        
+        self.stdout.write(f'Обновлено записей: {updated:,}')
+        if unranked:
+            self.stdout.write(self.style.WARNING(f'Без места в рейтинге: {unranked:,}'))
+        self.stdout.write(self.style.SUCCESS('Рейтинги пересчитаны'))
@@ -0,0 +1,18 @@
+# pantheon/management/commands/rebuild_timeline.py
+from pantheon.management.base import PantheonCommand
+from pantheon.models import TimelineBucket
+from pantheon.routers import use_primary
+from pantheon.timeline import refresh_timeline
+
+
+class Command(PantheonCommand):
+    help = 'Полный пересчет временной шкалы годов рождения (десятилетия и века)'
+    
+    def handle(self, *args, **options):
+        with use_primary():
+            refresh_timeline()
+            decades = TimelineBucket.objects.filter(size=TimelineBucket.DECADE).count()
+            centuries = TimelineBucket.objects.filter(size=TimelineBucket.CENTURY).count()
+        
+        self.stdout.write(f'Десятилетий: {decades:,}\nВеков: {centuries:,}')
+        self.stdout.write(self.style.SUCCESS('Временная шкала пересчитана'))
@@ -0,0 +1,37 @@
+# pantheon/management/commands/recompute_hpi.py
+import time
+from django.core.management.base import CommandError
+from pantheon.management.base import PantheonCommand
+from pantheon.hpi import numpy_available, recompute_hpi
+from pantheon.routers import use_primary
+
+
+class Command(PantheonCommand):
+    help = 'Пересчет индекса исторической популярности по просмотрам, языкам и году рождения'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только посчитать изменения, ничего не записывая'
+        )
+    
+    def handle(self, *args, **options):
+        if not numpy_available():
+            raise CommandError('Для пересчета нужен NumPy: pip install numpy')
+        
+        started = time.monotonic()
+        with use_primary():
+            stats = recompute_hpi(dry_run=options['dry_run'])
+        elapsed = time.monotonic() - started
+        
+        self.stdout.write(
+            f'Записей: {stats["total"]:,}\n'
+            f'Откалибровано поправок: {stats["calibrated"]:,}\n'
+            f'Изменен индекс: {stats["changed"]:,} (макс. изменение {stats["max_delta"]:.4f})\n'
+            f'Сменили категорию популярности: {stats["category_changed"]:,}'
+        )
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('Пробный запуск, изменения не записаны'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Индекс пересчитан за {elapsed:.1f} с'))
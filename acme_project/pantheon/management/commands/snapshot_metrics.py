@@ -0,0 +1,37 @@
+# pantheon/management/commands/snapshot_metrics.py
+from pantheon.management.base import PantheonCommand
+from pantheon.models import MetricSnapshot
+from pantheon.routers import use_primary
+from pantheon.snapshots import take_snapshot
+
+
+class Command(PantheonCommand):
+    help = 'Снимок метрик личностей в историю просмотров (импорт делает его сам)'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--source',
+            default='snapshot_metrics',
+            help='Подпись снимка (по умолчанию snapshot_metrics)'
+        )
+        parser.add_argument(
+            '--list',
+            action='store_true',
+            help='Показать последние снимки, ничего не записывая'
+        )
+    
+    def handle(self, *args, **options):
+        if options['list']:
+            for snapshot in MetricSnapshot.objects.all()[:20]:
+                self.stdout.write(
+                    f'#{snapshot.pk:<5} {snapshot.snapshot_date}  {snapshot.source:30} '
+                    f'изменилось {snapshot.changed_count:,} из {snapshot.figure_count:,}'
+                )
+            return
+        
+        with use_primary():
+            snapshot = take_snapshot(options['source'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Снимок #{snapshot.pk}: изменилось {snapshot.changed_count:,} '
+            f'из {snapshot.figure_count:,} личностей'
+        ))
@@ -0,0 +1,70 @@
+# pantheon/management/commands/warmup.py
+import json
+
+from pantheon.management.base import PantheonCommand
+from pantheon.profiling import importtime_report, measure_imports
+from pantheon.warmup import STEPS, warm_up
+
+
+class Command(PantheonCommand):
+    help = 'Прогрев кэшей после выкладки и отчет о времени импорта при загрузке воркера'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--step',
+            choices=list(STEPS),
+            action='append',
+            help='Шаг прогрева (можно несколько раз, по умолчанию все)'
+        )
+        parser.add_argument(
+            '--importtime',
+            action='store_true',
+            help='Вместо прогрева измерить импорт модулей при загрузке (python -X importtime)'
+        )
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=20,
+            help='Строк в отчете об импорте (по умолчанию 20)'
+        )
+        parser.add_argument(
+            '--output',
+            metavar='ФАЙЛ',
+            help='Сохранить отчет об импорте в JSON (для сравнения между выкладками)'
+        )
+    
+    def handle(self, *args, **options):
+        if options['importtime']:
+            self.report_imports(options['top'], options['output'])
+            return
+        
+        total = 0.0
+        for name, seconds, detail in warm_up(options['step']):
+            total += seconds
+            self.stdout.write(f'{name:12} {seconds * 1000:8.0f} мс  {detail}')
+        self.stdout.write(self.style.SUCCESS(f'Прогрев завершен за {total:.2f} с'))
+    
+    def report_imports(self, top, output):
+        try:
+            report = importtime_report(measure_imports(), limit=top)
+        except RuntimeError as error:
+            self.stdout.write(self.style.ERROR(f'Не удалось измерить импорт: {error}'))
+            return
+        
+        self.stdout.write(
+            f'Импорт при загрузке: {report["total_us"] / 1000:.0f} мс, модулей: {report["modules"]}'
+        )
+        self.stdout.write('\nИмпорты верхнего уровня (с вложенными), мс:')
+        for item in report['top_cumulative']:
+            self.stdout.write(f'  {item["cumulative"] / 1000:8.1f}  {item["module"]}')
+        self.stdout.write('\nСамые долгие модули сами по себе, мс:')
+        for item in report['top_self']:
+            self.stdout.write(f'  {item["self"] / 1000:8.1f}  {item["module"]}')
+        self.stdout.write('\nПо пакетам, мс:')
+        for package, microseconds in report['packages']:
+            self.stdout.write(f'  {microseconds / 1000:8.1f}  {package}')
+        
+        if output:
+            with open(output, 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+            self.stdout.write(f'\nОтчет сохранен: {output}')
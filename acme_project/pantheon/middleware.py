@@ -0,0 +1,220 @@
+# pantheon/middleware.py
+import mimetypes
+import os
+import random
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.http import FileResponse
+from django.utils.cache import patch_vary_headers
+
+from .compression import MAX_RANDOM_BYTES, MIN_LENGTH, compress, compress_stream, is_compressible, negotiate
+from .models import RequestProfile
+from .profiling import Profiler
+from .routers import pin_primary, primary_pinned_until, routing_scope
+from .staticfiles import SUFFIXES, find_file
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+# Файлы с хешем в имени не меняются, остальные кэшируются ненадолго
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+STATIC_CACHE_CONTROL = 'public, max-age=60'
+
+
+class ReplicaPinningMiddleware:
+    """
+    Прилипание к основной БД после записи.
+
+    Изменяющие запросы (POST и т.п.) целиком выполняются на основной БД.
+    Если во время запроса была запись, клиенту выставляется cookie, и
+    следующие PANTHEON_REPLICA_STICKY_SECONDS секунд его чтения тоже идут
+    в основную БД, а не в отстающую реплику.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        pinned = (
+            request.method not in SAFE_METHODS
+            or primary_pinned_until(request) > time.time()
+        )
+        with routing_scope(pinned=pinned) as state:
+            response = self.get_response(request)
+            if state['wrote']:
+                pin_primary(response)
+        return response
+
+
+class SampledProfilingMiddleware:
+    """
+    Профилирование выборки запросов.
+
+    Под cProfile выполняется доля PANTHEON_PROFILE_SAMPLE_RATE запросов,
+    а также запросы сотрудников с заголовком PANTHEON_PROFILE_HEADER.
+    Самые затратные функции сохраняются в RequestProfile (смотреть в
+    админке), для каждого представления хранятся последние
+    PANTHEON_PROFILE_KEEP профилей. Одновременно профилируется не больше
+    одного запроса на процесс, остальные выполняются как обычно.
+    """
+
+    _busy = threading.Lock()
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        requested = self._requested(request)
+        if not (requested or self._sampled()):
+            return self.get_response(request)
+        if not self._busy.acquire(blocking=False):
+            return self.get_response(request)
+
+        try:
+            with Profiler() as profiler:
+                response = self.get_response(request)
+        finally:
+            self._busy.release()
+
+        # Запись профиля — служебная: у нее свое состояние маршрутизации,
+        # и клиент из-за нее к основной БД не привязывается
+        with routing_scope(pinned=True):
+            profile = self._save(request, response, profiler, requested)
+        if requested:
+            response['X-Pantheon-Profile-Id'] = str(profile.pk)
+        return response
+
+    def _requested(self, request):
+        header = getattr(settings, 'PANTHEON_PROFILE_HEADER', None)
+        if not header or not request.headers.get(header):
+            return False
+        user = getattr(request, 'user', None)
+        return bool(user and user.is_staff)
+
+    def _sampled(self):
+        rate = getattr(settings, 'PANTHEON_PROFILE_SAMPLE_RATE', 0.0)
+        return rate > 0 and random.random() < rate
+
+    def _save(self, request, response, profiler, requested):
+        match = request.resolver_match
+        view_name = (match.view_name if match else '') or request.path
+        profile = RequestProfile.objects.create(
+            view_name=view_name[:200],
+            path=request.get_full_path()[:500],
+            method=request.method,
+            status_code=response.status_code,
+            duration_ms=profiler.elapsed * 1000,
+            requested=requested,
+            functions=profiler.top_functions(settings.PANTHEON_PROFILE_TOP_N, sort='tottime'),
+        )
+        # Старые профили представления сверх PANTHEON_PROFILE_KEEP
+        stale = RequestProfile.objects.filter(view_name=profile.view_name).order_by(
+            '-created_at', '-pk'
+        ).values_list('pk', flat=True)[settings.PANTHEON_PROFILE_KEEP:settings.PANTHEON_PROFILE_KEEP + 1]
+        for pk in stale:
+            RequestProfile.objects.filter(view_name=profile.view_name, pk__lte=pk).delete()
+        return profile
+
+
+class CompressionMiddleware:
+    """
+    Сжатие ответов brotli (если установлен) или gzip по Accept-Encoding.
+
+    Потоковые ответы (StreamingHttpResponse, FileResponse) сжимаются по
+    кускам со сбросом после каждого, так что потоковый список личностей
+    по-прежнему отображается по мере загрузки. Длина сжатого ответа
+    случайно увеличивается (MAX_RANDOM_BYTES) против BREACH. Ставится
+    в MIDDLEWARE раньше всех, кто читает или меняет тело ответа.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if response.has_header('Content-Encoding') or not is_compressible(response.get('Content-Type')):
+            return response
+        if getattr(response, 'is_async', False):
+            return response
+        if not response.streaming and len(response.content) < MIN_LENGTH:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = negotiate(request.headers.get('Accept-Encoding'))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = compress_stream(
+                response.streaming_content, encoding, max_random_bytes=MAX_RANDOM_BYTES,
+            )
+            del response['Content-Length']
+        else:
+            compressed = compress(response.content, encoding, max_random_bytes=MAX_RANDOM_BYTES)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        # Сжатое тело отличается побайтно: ETag становится слабым
+        if response.has_header('ETag'):
+            response['ETag'] = re.sub(r'^"', 'W/"', response['ETag'])
+        response['Content-Encoding'] = encoding
+        return response
+
+
+class PrecompressedStaticMiddleware:
+    """
+    Раздача собранной статики из STATIC_ROOT (см. pantheon.staticfiles).
+
+    Если рядом с файлом лежит .br/.gz копия и клиент ее принимает, отдается
+    она, без сжатия на лету. Файлы с хешем в имени получают
+    Cache-Control: immutable на год. Для файлов, которых нет в STATIC_ROOT,
+    запрос идет дальше (при DEBUG статику раздает runserver).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.root = settings.STATIC_ROOT
+        self.prefix = urlsplit(settings.STATIC_URL or '').path
+        if not self.prefix.startswith('/'):
+            self.prefix = '/' + self.prefix
+
+    def __call__(self, request):
+        if (
+            self.root
+            and request.method in ('GET', 'HEAD')
+            and request.path_info.startswith(self.prefix)
+        ):
+            response = self._serve(request, request.path_info[len(self.prefix):])
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    def _serve(self, request, name):
+        path = find_file(self.root, name)
+        if path is None:
+            return None
+        variants = [encoding for encoding, suffix in SUFFIXES.items() if os.path.isfile(path + suffix)]
+        encoding = negotiate(request.headers.get('Accept-Encoding'), variants) if variants else None
+
+        content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        if content_type.startswith('text/') or content_type in ('application/javascript', 'application/json'):
+            content_type += '; charset=utf-8'
+        response = FileResponse(
+            open(path + SUFFIXES[encoding] if encoding else path, 'rb'),
+            content_type=content_type,
+        )
+        if encoding:
+            response['Content-Encoding'] = encoding
+        if variants:
+            patch_vary_headers(response, ('Accept-Encoding',))
+        is_hashed = getattr(staticfiles_storage, 'is_hashed', None)
+        response['Cache-Control'] = (
+            IMMUTABLE_CACHE_CONTROL if is_hashed and is_hashed(name) else STATIC_CACHE_CONTROL
+        )
+        return response
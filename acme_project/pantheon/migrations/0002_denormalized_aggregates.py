@@ -0,0 +1,121 @@
+# Generated by Django 4.2.30 on 2026-10-19 15:34
+
+from django.db import migrations, models
+from django.db.models import Avg, Count, Max, Sum
+
+
+def fill_aggregates(apps, schema_editor):
+    HistoricalFigure = apps.get_model('pantheon', 'HistoricalFigure')
+    City = apps.get_model('pantheon', 'City')
+    Country = apps.get_model('pantheon', 'Country')
+    Occupation = apps.get_model('pantheon', 'Occupation')
+
+    for model, key in ((City, 'city'), (Occupation, 'occupation')):
+        rows = HistoricalFigure.objects.filter(**{f'{key}__isnull': False}).values(key).annotate(
+            figure_count=Count('id'),
+            popularity_sum=Sum('historical_popularity_index'),
+            avg_popularity=Avg('historical_popularity_index'),
+            max_popularity=Max('historical_popularity_index'),
+        ).order_by()
+        for row in rows:
+            model.objects.filter(pk=row.pop(key)).update(**row)
+
+    rows = City.objects.filter(figure_count__gt=0).values('country').annotate(
+        total=Sum('figure_count'),
+        popularity=Sum('popularity_sum'),
+        best=Max('max_popularity'),
+    ).order_by()
+    for row in rows:
+        Country.objects.filter(pk=row['country']).update(
+            figure_count=row['total'],
+            popularity_sum=row['popularity'],
+            avg_popularity=row['popularity'] / row['total'],
+            max_popularity=row['best'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pantheon', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='city',
+            name='avg_popularity',
+            field=models.DecimalField(decimal_places=4, default=0, max_digits=10, verbose_name='Средняя популярность'),
+        ),
+        migrations.AddField(
+            model_name='city',
+            name='figure_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Количество личностей'),
+        ),
+        migrations.AddField(
+            model_name='city',
+            name='max_popularity',
+            field=models.DecimalField(decimal_places=4, default=0, max_digits=10, verbose_name='Максимальная популярность'),
+        ),
+        migrations.AddField(
+            model_name='city',
+            name='popularity_sum',
+            field=models.DecimalField(decimal_places=4, default=0, max_digits=16, verbose_name='Сумма индексов популярности'),
+        ),
+        migrations.AddField(
+            model_name='country',
+            name='avg_popularity',
+            field=models.DecimalField(decimal_places=4, default=0, max_digits=10, verbose_name='Средняя популярность'),
+        ),
+        migrations.AddField(
+            model_name='country',
+            name='figure_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Количество личностей'),
+        ),
+        migrations.AddField(
+            model_name='country',
+            name='max_popularity',
+            field=models.DecimalField(decimal_places=4, default=0, max_digits=10, verbose_name='Максимальная популярность'),
+        ),
+        migrations.AddField(
+            model_name='country',
+            name='popularity_sum',
+            field=models.DecimalField(decimal_places=4, default=0, max_digits=16, verbose_name='Сумма индексов популярности'),
+        ),
+        migrations.AddField(
+            model_name='occupation',
+            name='avg_popularity',
+            field=models.DecimalField(decimal_places=4, default=0, max_digits=10, verbose_name='Средняя популярность'),
+        ),
+        migrations.AddField(
+            model_name='occupation',
+            name='figure_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Количество личностей'),
+        ),
+        migrations.AddField(
+            model_name='occupation',
+            name='max_popularity',
+            field=models.DecimalField(decimal_places=4, default=0, max_digits=10, verbose_name='Максимальная популярность'),
+        ),
+        migrations.AddField(
+            model_name='occupation',
+            name='popularity_sum',
+            field=models.DecimalField(decimal_places=4, default=0, max_digits=16, verbose_name='Сумма индексов популярности'),
+        ),
+        migrations.AddIndex(
+            model_name='city',
+            index=models.Index(fields=['-avg_popularity'], name='city_avg_popularity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='city',
+            index=models.Index(fields=['-figure_count'], name='city_figure_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='country',
+            index=models.Index(fields=['-figure_count'], name='country_figure_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='occupation',
+            index=models.Index(fields=['-figure_count'], name='occupation_figure_count_idx'),
+        ),
+        migrations.RunPython(fill_aggregates, migrations.RunPython.noop),
+    ]
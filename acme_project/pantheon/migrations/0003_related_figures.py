@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-19 15:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pantheon', '0002_denormalized_aggregates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedFigures',
+            fields=[
+                ('figure', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='related_index', serialize=False, to='pantheon.historicalfigure', verbose_name='Историческая личность')),
+                ('neighbor_ids', models.BinaryField(verbose_name='Похожие личности')),
+                ('built_at', models.DateTimeField(auto_now=True, verbose_name='Построено')),
+            ],
+            options={
+                'verbose_name': 'Похожие личности',
+                'verbose_name_plural': 'Похожие личности',
+            },
+        ),
+    ]
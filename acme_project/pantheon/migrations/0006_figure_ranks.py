@@ -0,0 +1,102 @@
+# Generated by Django 4.2.30 on 2026-10-19 15:47
+
+from django.db import migrations, models
+from django.db.models import F, FloatField, Window
+from django.db.models.functions import Cast, CumeDist, Rank
+
+# Копия pantheon.ranks на момент миграции: миграция не зависит от
+# дальнейших изменений кода приложения
+SCOPES = {
+    'global': None,
+    'continent': 'city__country__continent',
+    'domain': 'occupation__domain',
+}
+
+
+def fill_ranks(apps, schema_editor):
+    """Места всех личностей одним UPDATE ... FROM (SELECT ... OVER ...)"""
+    HistoricalFigure = apps.get_model('pantheon', 'HistoricalFigure')
+    connection = schema_editor.connection
+    quote = connection.ops.quote_name
+    table = quote(HistoricalFigure._meta.db_table)
+
+    order_by = Cast('historical_popularity_index', FloatField()).desc()
+    annotations = {}
+    for scope, group in SCOPES.items():
+        partition_by = [F(group)] if group else None
+        annotations[f'{scope}_rank_value'] = Window(Rank(), partition_by=partition_by, order_by=order_by)
+        annotations[f'{scope}_top_value'] = Window(CumeDist(), partition_by=partition_by, order_by=order_by)
+        if group:
+            annotations[f'{scope}_group'] = F(group)
+    ranked = HistoricalFigure.objects.order_by().annotate(**annotations).values('id', *annotations)
+    ranked_sql, params = ranked.query.get_compiler(connection=connection).as_sql()
+
+    assignments = []
+    for scope, group in SCOPES.items():
+        rank = f'ranked.{quote(scope + "_rank_value")}'
+        top = f'100.0 * ranked.{quote(scope + "_top_value")}'
+        if group:
+            missing = f'ranked.{quote(scope + "_group")} IS NULL'
+            rank = f'CASE WHEN {missing} THEN NULL ELSE {rank} END'
+            top = f'CASE WHEN {missing} THEN NULL ELSE {top} END'
+        assignments.append(f'{quote(scope + "_rank")} = {rank}')
+        assignments.append(f'{quote(scope + "_top_percent")} = {top}')
+
+    schema_editor.execute(
+        f'UPDATE {table} SET {", ".join(assignments)} '
+        f'FROM ({ranked_sql}) ranked WHERE {table}.{quote("id")} = ranked.{quote("id")}',
+        params,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pantheon', '0005_data_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historicalfigure',
+            name='continent_rank',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Место на континенте'),
+        ),
+        migrations.AddField(
+            model_name='historicalfigure',
+            name='continent_top_percent',
+            field=models.FloatField(blank=True, null=True, verbose_name='Топ, % (континент)'),
+        ),
+        migrations.AddField(
+            model_name='historicalfigure',
+            name='domain_rank',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Место в домене'),
+        ),
+        migrations.AddField(
+            model_name='historicalfigure',
+            name='domain_top_percent',
+            field=models.FloatField(blank=True, null=True, verbose_name='Топ, % (домен)'),
+        ),
+        migrations.AddField(
+            model_name='historicalfigure',
+            name='global_rank',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Место в общем рейтинге'),
+        ),
+        migrations.AddField(
+            model_name='historicalfigure',
+            name='global_top_percent',
+            field=models.FloatField(blank=True, null=True, verbose_name='Топ, % (общий)'),
+        ),
+        migrations.AddIndex(
+            model_name='historicalfigure',
+            index=models.Index(fields=['global_rank'], name='figure_global_rank_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='historicalfigure',
+            index=models.Index(fields=['continent_rank'], name='figure_continent_rank_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='historicalfigure',
+            index=models.Index(fields=['domain_rank'], name='figure_domain_rank_idx'),
+        ),
+        migrations.RunPython(fill_ranks, migrations.RunPython.noop),
+    ]
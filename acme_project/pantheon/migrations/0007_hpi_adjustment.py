@@ -0,0 +1,58 @@
+# Generated by Django 4.2.30 on 2026-10-19 15:50
+
+import math
+
+from django.db import migrations, models
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.functions import Cast, Greatest, Ln
+
+# Копия pantheon.hpi на момент миграции: миграция не зависит от
+# дальнейших изменений кода приложения
+REFERENCE_YEAR = 2015
+AGE_THRESHOLD = 70
+
+
+def _log_at_least_one(field):
+    return Ln(Greatest(Cast(field, FloatField()), Value(1.0)))
+
+
+def hpi_base_expression():
+    """Слагаемые индекса, выражаемые через поля записи"""
+    age = Greatest(Value(float(REFERENCE_YEAR)) - Cast('birth_year', FloatField()), Value(0.0))
+    age_term = Case(
+        When(birth_year__isnull=True, then=Value(0.0)),
+        When(birth_year__lte=REFERENCE_YEAR - AGE_THRESHOLD, then=Ln(age) / Value(math.log(4))),
+        default=age / Value(float(AGE_THRESHOLD)) * Value(math.log(AGE_THRESHOLD, 4)),
+        output_field=FloatField(),
+    )
+    return (
+        _log_at_least_one('article_languages')
+        + _log_at_least_one('page_views')
+        + _log_at_least_one('average_views')
+        + age_term
+    )
+
+
+def calibrate(apps, schema_editor):
+    # Поправки всех записей — по индексу на момент миграции, чтобы правки
+    # до первого recompute_hpi не растворялись в поправке
+    HistoricalFigure = apps.get_model('pantheon', 'HistoricalFigure')
+    HistoricalFigure.objects.using(schema_editor.connection.alias).filter(hpi_adjustment__isnull=True).update(
+        hpi_adjustment=Cast(F('historical_popularity_index'), FloatField()) - hpi_base_expression()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pantheon', '0006_figure_ranks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historicalfigure',
+            name='hpi_adjustment',
+            field=models.FloatField(blank=True, null=True, verbose_name='Поправка индекса популярности'),
+        ),
+        migrations.RunPython(calibrate, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,106 @@
+# Generated by Django 4.2.30 on 2026-10-19 16:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+# Новое поле-ссылка -> прежнее строковое поле
+ORIGINAL_FIELDS = {
+    'original_city': 'original_city_name',
+    'original_country': 'original_country_name',
+    'original_continent': 'original_continent_name',
+    'original_occupation': 'original_occupation_name',
+    'original_industry': 'original_industry_name',
+    'original_domain': 'original_domain_name',
+}
+
+LABELS = {
+    'original_city': 'Город (оригинал)',
+    'original_country': 'Страна (оригинал)',
+    'original_continent': 'Континент (оригинал)',
+    'original_occupation': 'Профессия (оригинал)',
+    'original_industry': 'Сфера деятельности (оригинал)',
+    'original_domain': 'Домен (оригинал)',
+}
+
+
+def intern_strings(apps, schema_editor):
+    HistoricalFigure = apps.get_model('pantheon', 'HistoricalFigure')
+    InternedString = apps.get_model('pantheon', 'InternedString')
+
+    values = set()
+    for name_field in ORIGINAL_FIELDS.values():
+        values.update(
+            HistoricalFigure.objects.exclude(**{name_field: ''}).values_list(name_field, flat=True).distinct()
+        )
+    InternedString.objects.bulk_create(
+        [InternedString(value=value) for value in values], batch_size=1000, ignore_conflicts=True
+    )
+
+    # Одна таблица личностей — один UPDATE с подзапросом на каждое поле
+    HistoricalFigure.objects.update(**{
+        field: Subquery(InternedString.objects.filter(value=OuterRef(name_field)).values('pk')[:1])
+        for field, name_field in ORIGINAL_FIELDS.items()
+    })
+
+
+def restore_strings(apps, schema_editor):
+    HistoricalFigure = apps.get_model('pantheon', 'HistoricalFigure')
+    InternedString = apps.get_model('pantheon', 'InternedString')
+
+    HistoricalFigure.objects.update(**{
+        name_field: models.functions.Coalesce(
+            Subquery(InternedString.objects.filter(pk=OuterRef(field)).values('value')[:1]),
+            models.Value(''),
+        )
+        for field, name_field in ORIGINAL_FIELDS.items()
+    })
+
+
+def interned_field(label):
+    return models.ForeignKey(
+        blank=True,
+        db_index=False,
+        null=True,
+        on_delete=django.db.models.deletion.PROTECT,
+        related_name='+',
+        to='pantheon.internedstring',
+        verbose_name=label,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pantheon', '0007_hpi_adjustment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InternedString',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.CharField(max_length=200, unique=True, verbose_name='Значение')),
+            ],
+            options={
+                'verbose_name': 'Строка словаря',
+                'verbose_name_plural': 'Словарь строк',
+            },
+        ),
+        *[
+            migrations.AddField(
+                model_name='historicalfigure',
+                name=field,
+                field=interned_field(LABELS[field]),
+            )
+            for field in ORIGINAL_FIELDS
+        ],
+        migrations.RunPython(intern_strings, restore_strings),
+        *[
+            migrations.RemoveField(
+                model_name='historicalfigure',
+                name=name_field,
+            )
+            for name_field in ORIGINAL_FIELDS.values()
+        ],
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 4.2.30 on 2026-10-19 16:03
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+import django.db.models.deletion
+
+# Копия pantheon.timeline на момент миграции: миграция не зависит от
+# дальнейших изменений кода приложения
+DECADE = 10
+CENTURY = 100
+
+
+def fill_timeline(apps, schema_editor):
+    """Интервалы по всем личностям: GROUP BY birth_year, свертка в Python"""
+    HistoricalFigure = apps.get_model('pantheon', 'HistoricalFigure')
+    TimelineBucket = apps.get_model('pantheon', 'TimelineBucket')
+    using = schema_editor.connection.alias
+
+    years = HistoricalFigure.objects.using(using).filter(birth_year__isnull=False).order_by().values(
+        'birth_year'
+    ).annotate(count=Count('id'), views=Sum('page_views'), best_rank=Min('global_rank'))
+    buckets = {}
+    for row in years:
+        for size in (DECADE, CENTURY):
+            bucket = buckets.setdefault((size, row['birth_year'] // size * size), [0, 0, None])
+            bucket[0] += row['count']
+            bucket[1] += row['views'] or 0
+            if row['best_rank'] is not None and (bucket[2] is None or row['best_rank'] < bucket[2]):
+                bucket[2] = row['best_rank']
+
+    # Самая популярная личность интервала — с наименьшим global_rank
+    ranks = {bucket[2] for bucket in buckets.values() if bucket[2] is not None}
+    by_rank = {}
+    figures = HistoricalFigure.objects.using(using).filter(global_rank__in=ranks)
+    for figure in figures.values('id', 'global_rank', 'birth_year'):
+        by_rank.setdefault(figure['global_rank'], []).append(figure)
+    tops = {}
+    for (size, start), bucket in buckets.items():
+        for figure in by_rank.get(bucket[2], ()):
+            if figure['birth_year'] is not None and figure['birth_year'] // size * size == start:
+                tops[size, start] = figure['id']
+                break
+
+    TimelineBucket.objects.using(using).bulk_create([
+        TimelineBucket(
+            size=size,
+            start_year=start,
+            figure_count=count,
+            page_views_sum=views,
+            top_figure_id=tops.get((size, start)),
+        )
+        for (size, start), (count, views, _) in sorted(buckets.items())
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pantheon', '0009_request_profiles'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('size', models.PositiveSmallIntegerField(choices=[(10, 'Десятилетие'), (100, 'Век')], verbose_name='Интервал')),
+                ('start_year', models.IntegerField(verbose_name='Начало')),
+                ('figure_count', models.PositiveIntegerField(default=0, verbose_name='Количество личностей')),
+                ('page_views_sum', models.BigIntegerField(default=0, verbose_name='Сумма просмотров')),
+                ('top_figure', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='pantheon.historicalfigure', verbose_name='Самая популярная личность')),
+            ],
+            options={
+                'verbose_name': 'Интервал временной шкалы',
+                'verbose_name_plural': 'Временная шкала',
+                'ordering': ['size', 'start_year'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='timelinebucket',
+            constraint=models.UniqueConstraint(fields=('size', 'start_year'), name='timeline_bucket_unique'),
+        ),
+        migrations.RunPython(fill_timeline, migrations.RunPython.noop),
+    ]
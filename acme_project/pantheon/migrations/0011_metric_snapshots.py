@@ -0,0 +1,101 @@
+# Generated by Django 4.2.30 on 2026-10-19 16:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# История метрик на PostgreSQL — секционированная по дате снимка таблица
+# (секции по месяцам создает pantheon.snapshots, секция DEFAULT страхует
+# вставку) с BRIN-индексом по дате. На остальных СУБД — обычная таблица.
+POSTGRESQL_METRIC_TABLE = """
+CREATE TABLE pantheon_figuremetric (
+    id bigserial NOT NULL,
+    page_views bigint NOT NULL,
+    average_views numeric(12, 2) NOT NULL,
+    historical_popularity_index numeric(10, 4) NOT NULL,
+    article_languages integer NOT NULL,
+    snapshot_date date NOT NULL,
+    figure_id bigint NOT NULL,
+    snapshot_id bigint NOT NULL,
+    PRIMARY KEY (id, snapshot_date)
+) PARTITION BY RANGE (snapshot_date);
+CREATE TABLE pantheon_figuremetric_default PARTITION OF pantheon_figuremetric DEFAULT;
+CREATE INDEX figure_metric_figure_idx ON pantheon_figuremetric (figure_id, snapshot_id);
+CREATE INDEX figure_metric_snapshot_idx ON pantheon_figuremetric (snapshot_id);
+CREATE INDEX figure_metric_date_brin ON pantheon_figuremetric USING brin (snapshot_date);
+"""
+
+
+def create_metric_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(POSTGRESQL_METRIC_TABLE)
+    else:
+        schema_editor.create_model(apps.get_model('pantheon', 'FigureMetric'))
+
+
+def drop_metric_table(apps, schema_editor):
+    # На PostgreSQL секции удаляются вместе с родительской таблицей
+    schema_editor.delete_model(apps.get_model('pantheon', 'FigureMetric'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pantheon', '0010_timeline_buckets'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetricSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('taken_at', models.DateTimeField(auto_now_add=True, verbose_name='Снят')),
+                ('snapshot_date', models.DateField(verbose_name='Дата снимка')),
+                ('source', models.CharField(blank=True, max_length=255, verbose_name='Источник')),
+                ('figure_count', models.PositiveIntegerField(default=0, verbose_name='Личностей')),
+                ('changed_count', models.PositiveIntegerField(default=0, verbose_name='Изменилось')),
+            ],
+            options={
+                'verbose_name': 'Снимок метрик',
+                'verbose_name_plural': 'Снимки метрик',
+                'ordering': ['-pk'],
+            },
+        ),
+        migrations.CreateModel(
+            name='LatestFigureMetric',
+            fields=[
+                ('page_views', models.BigIntegerField(verbose_name='Просмотры')),
+                ('average_views', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Средние просмотры')),
+                ('historical_popularity_index', models.DecimalField(decimal_places=4, max_digits=10, verbose_name='Индекс популярности')),
+                ('article_languages', models.IntegerField(verbose_name='Языки статьи')),
+                ('figure', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='latest_metric', serialize=False, to='pantheon.historicalfigure', verbose_name='Историческая личность')),
+                ('snapshot', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='pantheon.metricsnapshot', verbose_name='Снимок')),
+            ],
+            options={
+                'verbose_name': 'Последние метрики личности',
+                'verbose_name_plural': 'Последние метрики личностей',
+            },
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='FigureMetric',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('page_views', models.BigIntegerField(verbose_name='Просмотры')),
+                        ('average_views', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Средние просмотры')),
+                        ('historical_popularity_index', models.DecimalField(decimal_places=4, max_digits=10, verbose_name='Индекс популярности')),
+                        ('article_languages', models.IntegerField(verbose_name='Языки статьи')),
+                        ('snapshot_date', models.DateField(verbose_name='Дата снимка')),
+                        ('figure', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='pantheon.historicalfigure', verbose_name='Историческая личность')),
+                        ('snapshot', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='pantheon.metricsnapshot', verbose_name='Снимок')),
+                    ],
+                    options={
+                        'verbose_name': 'Метрики личности',
+                        'verbose_name_plural': 'История метрик',
+                        'indexes': [models.Index(fields=['figure', 'snapshot'], name='figure_metric_figure_idx')],
+                    },
+                ),
+            ],
+        ),
+        migrations.RunPython(create_metric_table, drop_metric_table),
+    ]
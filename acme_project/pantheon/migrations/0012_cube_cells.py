@@ -0,0 +1,74 @@
+# Generated by Django 4.2.30 on 2026-10-19 16:22
+
+from django.db import migrations, models
+from django.db.models import Count, F, Max, Sum, Value
+from django.db.models.functions import Floor
+import django.db.models.deletion
+
+# Копия pantheon.cube на момент миграции: миграция не зависит от
+# дальнейших изменений кода приложения
+CENTURY = 100
+
+
+def fill_cube(apps, schema_editor):
+    """Ячейки куба одним GROUP BY по личностям (век вычисляется в запросе)"""
+    HistoricalFigure = apps.get_model('pantheon', 'HistoricalFigure')
+    CubeCell = apps.get_model('pantheon', 'CubeCell')
+    using = schema_editor.connection.alias
+
+    groups = HistoricalFigure.objects.using(using).order_by().annotate(
+        century_number=Floor(F('birth_year') / Value(float(CENTURY))),
+    ).values(
+        'city__country__continent', 'city__country', 'occupation__domain', 'occupation__industry',
+        'century_number',
+    ).annotate(
+        count=Count('id'),
+        views=Sum('page_views'),
+        popularity=Sum('historical_popularity_index'),
+        top=Max('historical_popularity_index'),
+    )
+    CubeCell.objects.using(using).bulk_create([
+        CubeCell(
+            continent=row['city__country__continent'] or '',
+            country_id=row['city__country'],
+            domain=row['occupation__domain'] or '',
+            industry=row['occupation__industry'] or '',
+            century=int(row['century_number']) * CENTURY if row['century_number'] is not None else None,
+            figure_count=row['count'],
+            page_views_sum=row['views'] or 0,
+            popularity_sum=row['popularity'] or 0,
+            max_popularity=row['top'] or 0,
+        )
+        for row in groups
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pantheon', '0011_metric_snapshots'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CubeCell',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('continent', models.CharField(blank=True, default='', max_length=50, verbose_name='Континент')),
+                ('domain', models.CharField(blank=True, default='', max_length=200, verbose_name='Домен')),
+                ('industry', models.CharField(blank=True, default='', max_length=200, verbose_name='Сфера деятельности')),
+                ('century', models.IntegerField(blank=True, null=True, verbose_name='Век')),
+                ('figure_count', models.PositiveIntegerField(default=0, verbose_name='Количество личностей')),
+                ('page_views_sum', models.BigIntegerField(default=0, verbose_name='Сумма просмотров')),
+                ('popularity_sum', models.DecimalField(decimal_places=4, default=0, max_digits=16, verbose_name='Сумма индексов популярности')),
+                ('max_popularity', models.DecimalField(decimal_places=4, default=0, max_digits=10, verbose_name='Максимальная популярность')),
+                ('country', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='pantheon.country', verbose_name='Страна')),
+            ],
+            options={
+                'verbose_name': 'Ячейка куба',
+                'verbose_name_plural': 'Куб сводных таблиц',
+                'indexes': [models.Index(fields=['century'], name='cube_cell_century_idx'), models.Index(fields=['continent', 'country'], name='cube_cell_geo_idx'), models.Index(fields=['domain', 'industry'], name='cube_cell_domain_idx')],
+            },
+        ),
+        migrations.RunPython(fill_cube, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-19 16:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pantheon', '0012_cube_cells'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FigureChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('article_id', models.IntegerField(blank=True, null=True, verbose_name='ID статьи')),
+                ('operation', models.CharField(choices=[('I', 'Добавление'), ('U', 'Изменение'), ('D', 'Удаление')], max_length=1, verbose_name='Операция')),
+                ('changed_at', models.DateTimeField(auto_now_add=True, verbose_name='Время изменения')),
+                ('figure', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='pantheon.historicalfigure', verbose_name='Историческая личность')),
+            ],
+            options={
+                'verbose_name': 'Изменение личности',
+                'verbose_name_plural': 'Журнал изменений',
+                'ordering': ['pk'],
+            },
+        ),
+    ]
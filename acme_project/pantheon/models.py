@@ -1,4 +1,8 @@
-from django.db import models
+import struct
+import threading
+
+from django.db import models, transaction
+from django.utils import timezone
 
 # Create your models here.
 
@@ -6,6 +10,27 @@ class Country(models.Model):
     
     name = models.CharField(max_length=100, unique=True, verbose_name="Название страны")
     continent = models.CharField(max_length=50, verbose_name="Континент")
+
+    # Денормализованные агрегаты по историческим личностям (см. pantheon.aggregates)
+    figure_count = models.PositiveIntegerField(default=0, verbose_name="Количество личностей")
+    popularity_sum = models.DecimalField(
+        max_digits=16,
+        decimal_places=4,
+        default=0,
+        verbose_name="Сумма индексов популярности"
+    )
+    avg_popularity = models.DecimalField(
+        max_digits=10,
+        decimal_places=4,
+        default=0,
+        verbose_name="Средняя популярность"
+    )
+    max_popularity = models.DecimalField(
+        max_digits=10,
+        decimal_places=4,
+        default=0,
+        verbose_name="Максимальная популярность"
+    )
     
     class Meta:
         verbose_name = "Страна"
@@ -13,6 +38,7 @@ class Country(models.Model):
         ordering = ['name']
         indexes = [
             models.Index(fields=['continent']),
+            models.Index(fields=['-figure_count'], name='country_figure_count_idx'),
         ]
     
     def __str__(self):
@@ -42,6 +68,27 @@ class City(models.Model):
         related_name='cities',
         verbose_name="Страна"
     )
+
+    # Денормализованные агрегаты по историческим личностям (см. pantheon.aggregates)
+    figure_count = models.PositiveIntegerField(default=0, verbose_name="Количество личностей")
+    popularity_sum = models.DecimalField(
+        max_digits=16,
+        decimal_places=4,
+        default=0,
+        verbose_name="Сумма индексов популярности"
+    )
+    avg_popularity = models.DecimalField(
+        max_digits=10,
+        decimal_places=4,
+        default=0,
+        verbose_name="Средняя популярность"
+    )
+    max_popularity = models.DecimalField(
+        max_digits=10,
+        decimal_places=4,
+        default=0,
+        verbose_name="Максимальная популярность"
+    )
     
     class Meta:
         verbose_name = "Город"
@@ -51,25 +98,187 @@ class City(models.Model):
         unique_together = ['name', 'country']
         indexes = [
             models.Index(fields=['name']),
+            models.Index(fields=['-avg_popularity'], name='city_avg_popularity_idx'),
+            models.Index(fields=['-figure_count'], name='city_figure_count_idx'),
         ]
     
     def __str__(self):
-        return f"{self.name}, {self.country.name}"
+        # Без select_related('country') название страны берется из кэша справочников
+        if self._meta.get_field('country').is_cached(self):
+            return f"{self.name}, {self.country.name}"
+        from .dimensions import country_name
+        return f"{self.name}, {country_name(self.country_id)}"
         
 class Occupation(models.Model):
     
     name = models.CharField(max_length=200, unique=True, verbose_name="Профессия")
     industry = models.CharField(max_length=200, verbose_name="Индустрия")
     domain = models.CharField(max_length=200, verbose_name="Домен")
+
+    # Денормализованные агрегаты по историческим личностям (см. pantheon.aggregates)
+    figure_count = models.PositiveIntegerField(default=0, verbose_name="Количество личностей")
+    popularity_sum = models.DecimalField(
+        max_digits=16,
+        decimal_places=4,
+        default=0,
+        verbose_name="Сумма индексов популярности"
+    )
+    avg_popularity = models.DecimalField(
+        max_digits=10,
+        decimal_places=4,
+        default=0,
+        verbose_name="Средняя популярность"
+    )
+    max_popularity = models.DecimalField(
+        max_digits=10,
+        decimal_places=4,
+        default=0,
+        verbose_name="Максимальная популярность"
+    )
     
     class Meta:
         verbose_name = "Профессия"
         verbose_name_plural = "Профессии"
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['-figure_count'], name='occupation_figure_count_idx'),
+        ]
     
     def __str__(self):
         return self.name
         
+class InternedString(models.Model):
+    """
+    Словарь повторяющихся строк: оригинальные названия из датасета
+    хранятся у личностей ссылками на него.
+
+    Строки не изменяются и не удаляются, поэтому соответствие id и значений
+    кэшируется в процессе без сброса.
+    """
+
+    value = models.CharField(max_length=200, unique=True, verbose_name="Значение")
+
+    _values = {}
+    _ids = {}
+    # До какого id словарь загружен целиком (intern добавляет строки вразброс)
+    _loaded_up_to = 0
+    _lock = threading.Lock()
+
+    class Meta:
+        verbose_name = "Строка словаря"
+        verbose_name_plural = "Словарь строк"
+
+    def __str__(self):
+        return self.value
+
+    @classmethod
+    def _remember(cls, rows, loaded_up_to=0):
+        """
+        Запоминает строки после фиксации текущей транзакции: id строк,
+        вставленных в транзакции, которая затем откатится, не существуют
+        """
+        rows = list(rows)
+
+        def remember():
+            with cls._lock:
+                for pk, value in rows:
+                    cls._values[pk] = value
+                    cls._ids[value] = pk
+                cls._loaded_up_to = max(cls._loaded_up_to, loaded_up_to)
+
+        transaction.on_commit(remember)
+
+    @classmethod
+    def text(cls, pk):
+        """Строка по id, пустая строка для NULL"""
+        if pk is None:
+            return ''
+        try:
+            return cls._values[pk]
+        except KeyError:
+            pass
+        # Первое обращение или новые строки: догружаем хвост словаря
+        rows = dict(cls.objects.filter(pk__gt=cls._loaded_up_to).values_list('pk', 'value'))
+        loaded_up_to = max(rows, default=0)
+        if pk not in rows:
+            # Строка из транзакции, завершившейся позже более новых
+            rows.update(cls.objects.filter(pk=pk).values_list('pk', 'value'))
+        cls._remember(rows.items(), loaded_up_to)
+        return rows.get(pk, '')
+
+    @classmethod
+    def intern(cls, values):
+        """id строк values (создает недостающие), пустые строки -> None"""
+        values = {value for value in values if value}
+        ids = {value: cls._ids[value] for value in values if value in cls._ids}
+        missing = [value for value in values if value not in ids]
+        if missing:
+            cls.objects.bulk_create(
+                [cls(value=value) for value in missing], ignore_conflicts=True
+            )
+            rows = list(cls.objects.filter(value__in=missing).values_list('pk', 'value'))
+            cls._remember(rows)
+            ids.update((value, pk) for pk, value in rows)
+        return ids
+
+    @classmethod
+    def id_for(cls, value):
+        if not value:
+            return None
+        return cls.intern([value])[value]
+
+
+def _interned_property(field, label):
+    """
+    Строковое значение ссылки на InternedString, с присваиванием строки.
+    Присвоенная строка хранится в экземпляре и попадает в словарь только
+    при сохранении (HistoricalFigure.intern_names)
+    """
+    attname = f'{field}_id'
+
+    def getter(self):
+        pending = self.__dict__.get('_interned_names', {})
+        if attname in pending:
+            return pending[attname] or ''
+        return InternedString.text(getattr(self, attname))
+
+    def setter(self, value):
+        self.__dict__.setdefault('_interned_names', {})[attname] = value
+
+    getter.short_description = label
+    return property(getter, setter)
+
+
+def _interned_field(label):
+    return models.ForeignKey(
+        InternedString,
+        on_delete=models.PROTECT,
+        related_name='+',
+        blank=True,
+        null=True,
+        db_index=False,
+        verbose_name=label
+    )
+
+
+# Нижние границы индекса популярности для категорий, по убыванию
+POPULARITY_CATEGORIES = [
+    (24.0, "Очень высокая"),
+    (21.0, "Высокая"),
+    (18.0, "Средняя"),
+    (14.0, "Низкая"),
+]
+LOWEST_POPULARITY_CATEGORY = "Очень низкая"
+
+
+def popularity_category_for(hpi):
+    """Категория популярности по значению индекса"""
+    for threshold, category in POPULARITY_CATEGORIES:
+        if hpi >= threshold:
+            return category
+    return LOWEST_POPULARITY_CATEGORY
+
+
 class HistoricalFigure(models.Model):
     
     article_id = models.IntegerField(unique=True, verbose_name="ID статьи")
@@ -112,14 +321,37 @@ class HistoricalFigure(models.Model):
         verbose_name="Количество языков статьи"
     )
     
-    # Дополнительные поля для данных, которые могут отсутствовать в нормализованных таблицах
-    original_city_name = models.CharField(max_length=100, blank=True, verbose_name="Город (оригинал)")
-    original_country_name = models.CharField(max_length=100, blank=True, verbose_name="Страна (оригинал)")
-    original_continent_name = models.CharField(max_length=100, blank=True, verbose_name="Континент (оригинал)")
-    original_occupation_name = models.CharField(max_length=200, blank=True, verbose_name="Профессия (оригинал)")
-    original_industry_name = models.CharField(max_length=200, blank=True, verbose_name="Сфера деятельности (оригинал)")
-    original_domain_name = models.CharField(max_length=200, blank=True, verbose_name="Домен (оригинал)")
+    # Дополнительные поля для данных, которые могут отсутствовать в нормализованных таблицах.
+    # Значения сильно повторяются, поэтому хранятся ссылками на словарь строк;
+    # original_*_name отдают и принимают сами строки
+    original_city = _interned_field("Город (оригинал)")
+    original_country = _interned_field("Страна (оригинал)")
+    original_continent = _interned_field("Континент (оригинал)")
+    original_occupation = _interned_field("Профессия (оригинал)")
+    original_industry = _interned_field("Сфера деятельности (оригинал)")
+    original_domain = _interned_field("Домен (оригинал)")
+
+    original_city_name = _interned_property('original_city', "Город (оригинал)")
+    original_country_name = _interned_property('original_country', "Страна (оригинал)")
+    original_continent_name = _interned_property('original_continent', "Континент (оригинал)")
+    original_occupation_name = _interned_property('original_occupation', "Профессия (оригинал)")
+    original_industry_name = _interned_property('original_industry', "Сфера деятельности (оригинал)")
+    original_domain_name = _interned_property('original_domain', "Домен (оригинал)")
+
+    # Слагаемое индекса популярности, не выражаемое через поля записи
+    # (pantheon.hpi). NULL — откалибровать по текущему индексу
+    hpi_adjustment = models.FloatField(blank=True, null=True, verbose_name="Поправка индекса популярности")
     
+    # Места по индексу популярности (pantheon.ranks), пересчитываются
+    # после импорта и изменений. top_percent — доля личностей с индексом
+    # не ниже этой, в процентах
+    global_rank = models.PositiveIntegerField(blank=True, null=True, verbose_name="Место в общем рейтинге")
+    global_top_percent = models.FloatField(blank=True, null=True, verbose_name="Топ, % (общий)")
+    continent_rank = models.PositiveIntegerField(blank=True, null=True, verbose_name="Место на континенте")
+    continent_top_percent = models.FloatField(blank=True, null=True, verbose_name="Топ, % (континент)")
+    domain_rank = models.PositiveIntegerField(blank=True, null=True, verbose_name="Место в домене")
+    domain_top_percent = models.FloatField(blank=True, null=True, verbose_name="Топ, % (домен)")
+
     class Meta:
         verbose_name = "Историческая личность"
         verbose_name_plural = "Исторические личности"
@@ -129,10 +361,33 @@ class HistoricalFigure(models.Model):
             models.Index(fields=['historical_popularity_index']),
             models.Index(fields=['article_languages']),
             models.Index(fields=['page_views']),
+            models.Index(fields=['global_rank'], name='figure_global_rank_idx'),
+            models.Index(fields=['continent_rank'], name='figure_continent_rank_idx'),
+            models.Index(fields=['domain_rank'], name='figure_domain_rank_idx'),
         ]
     
     def __str__(self):
         return self.full_name
+
+    def save(self, *args, **kwargs):
+        self.intern_names([self])
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def intern_names(cls, figures):
+        """
+        Заносит присвоенные original_*_name в словарь строк одним запросом
+        на всю пачку; save() делает это сам, bulk_create/bulk_update — нет
+        """
+        figures = [figure for figure in figures if figure.__dict__.get('_interned_names')]
+        if not figures:
+            return
+        ids = InternedString.intern(
+            value for figure in figures for value in figure._interned_names.values()
+        )
+        for figure in figures:
+            for attname, value in figure.__dict__.pop('_interned_names').items():
+                setattr(figure, attname, ids.get(value))
     
     @property
     def birth_location(self):
@@ -146,14 +401,394 @@ class HistoricalFigure(models.Model):
     @property
     def popularity_category(self):
         """Определяет категорию популярности на основе индекса"""
-        if self.historical_popularity_index >= 24.0:
-            return "Очень высокая"
-        elif self.historical_popularity_index >= 21.0:
-            return "Высокая"
-        elif self.historical_popularity_index >= 18.0:
-            return "Средняя"
-        elif self.historical_popularity_index >= 14.0:
-            return "Низкая"
-        else:
-            return "Очень низкая"
+        return popularity_category_for(self.historical_popularity_index)
         
+
+class RelatedFigures(models.Model):
+    """Предрассчитанный список похожих личностей (см. build_related_index)"""
+
+    # Без ограничения внешнего ключа: удаление личностей не трогает индекс,
+    # устаревшие id отбрасываются при чтении и при следующей перестройке
+    figure = models.OneToOneField(
+        HistoricalFigure,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        primary_key=True,
+        related_name='related_index',
+        verbose_name="Историческая личность"
+    )
+    # id соседей, упакованные как int64 little-endian, в порядке убывания сходства
+    neighbor_ids = models.BinaryField(verbose_name="Похожие личности")
+    built_at = models.DateTimeField(auto_now=True, verbose_name="Построено")
+
+    class Meta:
+        verbose_name = "Похожие личности"
+        verbose_name_plural = "Похожие личности"
+
+    def __str__(self):
+        return f"Похожие для #{self.figure_id}"
+
+    @staticmethod
+    def pack(ids):
+        return struct.pack(f'<{len(ids)}q', *ids)
+
+    @property
+    def ids(self):
+        data = bytes(self.neighbor_ids)
+        return list(struct.unpack(f'<{len(data) // 8}q', data))
+
+class ImportJob(models.Model):
+    """Фоновая загрузка CSV, выполняется командой import_worker"""
+
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'В очереди'),
+        (STATUS_RUNNING, 'Выполняется'),
+        (STATUS_DONE, 'Завершен'),
+        (STATUS_FAILED, 'Ошибка'),
+    ]
+
+    file_path = models.CharField(max_length=500, verbose_name="Файл")
+    original_name = models.CharField(max_length=255, verbose_name="Исходное имя файла")
+    file_size = models.BigIntegerField(default=0, verbose_name="Размер файла")
+    update_existing = models.BooleanField(default=False, verbose_name="Обновлять существующие")
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=STATUS_PENDING,
+        verbose_name="Статус"
+    )
+    rows_processed = models.PositiveIntegerField(default=0, verbose_name="Обработано строк")
+    created_count = models.PositiveIntegerField(default=0, verbose_name="Создано")
+    updated_count = models.PositiveIntegerField(default=0, verbose_name="Обновлено")
+    error_count = models.PositiveIntegerField(default=0, verbose_name="Ошибок")
+    errors = models.TextField(blank=True, verbose_name="Сообщения об ошибках")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создан")
+    started_at = models.DateTimeField(blank=True, null=True, verbose_name="Начат")
+    # Обновляется воркером вместе с прогрессом: по нему claim_next_job
+    # находит задачи, чей воркер умер, не дописав статус
+    heartbeat_at = models.DateTimeField(blank=True, null=True, verbose_name="Последний отклик")
+    finished_at = models.DateTimeField(blank=True, null=True, verbose_name="Завершен")
+
+    class Meta:
+        verbose_name = "Задача импорта"
+        verbose_name_plural = "Задачи импорта"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"Импорт #{self.pk}: {self.original_name}"
+
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_DONE, self.STATUS_FAILED)
+
+    @property
+    def rows_per_second(self):
+        """Средняя скорость импорта"""
+        if not self.started_at:
+            return 0.0
+        end = self.finished_at or timezone.now()
+        elapsed = (end - self.started_at).total_seconds()
+        return self.rows_processed / elapsed if elapsed > 0 else 0.0
+
+
+class DataVersion(models.Model):
+    """
+    Номера версий данных, строка на каждый вид: FIGURES — личности
+    (увеличивается при каждом figures_changed), DIMENSIONS — справочники
+    стран, городов и профессий (pantheon.dimensions), CHANGES — записи
+    журнала изменений (строка блокируется на время записи, см.
+    pantheon.changes).
+
+    Процессные индексы и кэши сравнивают свою версию с текущей
+    и перестраиваются при расхождении.
+    """
+
+    FIGURES = 1
+    DIMENSIONS = 2
+    CHANGES = 3
+
+    version = models.BigIntegerField(default=0, verbose_name="Версия")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Изменена")
+
+    class Meta:
+        verbose_name = "Версия данных"
+        verbose_name_plural = "Версия данных"
+
+    def __str__(self):
+        return f"Версия данных {self.version}"
+
+    @classmethod
+    def current(cls, scope=FIGURES):
+        version = cls.objects.filter(pk=scope).values_list('version', flat=True).first()
+        return version or 0
+
+    @classmethod
+    def versions(cls, *scopes):
+        """Версии нескольких видов данных одним запросом (кортеж в порядке scopes)"""
+        found = dict(cls.objects.filter(pk__in=scopes).values_list('pk', 'version'))
+        return tuple(found.get(scope, 0) for scope in scopes)
+
+    @classmethod
+    def bump(cls, scope=FIGURES):
+        updated = cls.objects.filter(pk=scope).update(
+            version=models.F('version') + 1, updated_at=timezone.now()
+        )
+        if not updated:
+            cls.objects.get_or_create(pk=scope, defaults={'version': 1})
+        return cls.current(scope)
+
+
+class RequestProfile(models.Model):
+    """Профиль одного запроса (SampledProfilingMiddleware): самые затратные функции"""
+
+    view_name = models.CharField(max_length=200, db_index=True, verbose_name="Представление")
+    path = models.CharField(max_length=500, verbose_name="Путь")
+    method = models.CharField(max_length=10, verbose_name="Метод")
+    status_code = models.PositiveSmallIntegerField(verbose_name="Код ответа")
+    duration_ms = models.FloatField(verbose_name="Длительность, мс")
+    requested = models.BooleanField(default=False, verbose_name="По заголовку")
+    functions = models.JSONField(default=list, verbose_name="Самые затратные функции")
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="Создан")
+
+    class Meta:
+        verbose_name = "Профиль запроса"
+        verbose_name_plural = "Профили запросов"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.view_name}: {self.duration_ms:.0f} мс"
+
+
+class TimelineBucket(models.Model):
+    """
+    Десятилетие или век рождения: число личностей, сумма просмотров
+    и самая популярная личность (см. pantheon.timeline)
+    """
+
+    DECADE = 10
+    CENTURY = 100
+    SIZE_CHOICES = [
+        (DECADE, 'Десятилетие'),
+        (CENTURY, 'Век'),
+    ]
+
+    size = models.PositiveSmallIntegerField(choices=SIZE_CHOICES, verbose_name="Интервал")
+    # Первый год интервала: 1850 для 1850-1859, -400 для -400..-301
+    start_year = models.IntegerField(verbose_name="Начало")
+    figure_count = models.PositiveIntegerField(default=0, verbose_name="Количество личностей")
+    page_views_sum = models.BigIntegerField(default=0, verbose_name="Сумма просмотров")
+    # Без ограничения внешнего ключа, как у RelatedFigures: таблицу
+    # личностей можно заменить целиком (import_pantheon --swap)
+    top_figure = models.ForeignKey(
+        HistoricalFigure,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name="Самая популярная личность"
+    )
+
+    class Meta:
+        verbose_name = "Интервал временной шкалы"
+        verbose_name_plural = "Временная шкала"
+        ordering = ['size', 'start_year']
+        constraints = [
+            models.UniqueConstraint(fields=['size', 'start_year'], name='timeline_bucket_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.start_year}–{self.end_year}: {self.figure_count}"
+
+    @property
+    def end_year(self):
+        return self.start_year + self.size - 1
+
+
+class MetricSnapshot(models.Model):
+    """Снимок метрик личностей после импорта (см. pantheon.snapshots)"""
+
+    taken_at = models.DateTimeField(auto_now_add=True, verbose_name="Снят")
+    snapshot_date = models.DateField(verbose_name="Дата снимка")
+    source = models.CharField(max_length=255, blank=True, verbose_name="Источник")
+    figure_count = models.PositiveIntegerField(default=0, verbose_name="Личностей")
+    changed_count = models.PositiveIntegerField(default=0, verbose_name="Изменилось")
+
+    class Meta:
+        verbose_name = "Снимок метрик"
+        verbose_name_plural = "Снимки метрик"
+        ordering = ['-pk']
+
+    def __str__(self):
+        return f"Снимок #{self.pk} от {self.snapshot_date}"
+
+
+class _MetricValues(models.Model):
+    """Метрики личности, которые попадают в снимки"""
+
+    page_views = models.BigIntegerField(verbose_name="Просмотры")
+    average_views = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="Средние просмотры")
+    historical_popularity_index = models.DecimalField(
+        max_digits=10, decimal_places=4, verbose_name="Индекс популярности"
+    )
+    article_languages = models.IntegerField(verbose_name="Языки статьи")
+
+    class Meta:
+        abstract = True
+
+
+class FigureMetric(_MetricValues):
+    """
+    История метрик: строка пишется, только если метрики личности
+    изменились с предыдущего снимка. Значение на снимок — последняя строка
+    не позже него. Только добавление; на PostgreSQL таблица секционирована
+    по snapshot_date (секция на месяц) и имеет BRIN-индекс по дате, см.
+    миграцию 0011.
+    """
+
+    snapshot = models.ForeignKey(
+        MetricSnapshot,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='+',
+        verbose_name="Снимок"
+    )
+    snapshot_date = models.DateField(verbose_name="Дата снимка")
+    # Без ограничения внешнего ключа: история переживает удаление
+    # личностей и замену таблицы (import_pantheon --swap)
+    figure = models.ForeignKey(
+        HistoricalFigure,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        db_index=False,
+        related_name='+',
+        verbose_name="Историческая личность"
+    )
+
+    class Meta:
+        verbose_name = "Метрики личности"
+        verbose_name_plural = "История метрик"
+        indexes = [
+            models.Index(fields=['figure', 'snapshot'], name='figure_metric_figure_idx'),
+        ]
+
+
+class LatestFigureMetric(_MetricValues):
+    """Метрики личности в последнем снимке, где они менялись (для поиска изменений)"""
+
+    figure = models.OneToOneField(
+        HistoricalFigure,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        primary_key=True,
+        related_name='latest_metric',
+        verbose_name="Историческая личность"
+    )
+    snapshot = models.ForeignKey(
+        MetricSnapshot,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='+',
+        verbose_name="Снимок"
+    )
+
+    class Meta:
+        verbose_name = "Последние метрики личности"
+        verbose_name_plural = "Последние метрики личностей"
+
+
+class CubeCell(models.Model):
+    """
+    Ячейка куба для сводных таблиц: личности одного континента, страны,
+    домена, сферы деятельности и века рождения (см. pantheon.cube).
+    Пустая строка или NULL в измерении — значение не указано.
+    """
+
+    continent = models.CharField(max_length=50, blank=True, default='', verbose_name="Континент")
+    # Без ограничения внешнего ключа, как у TimelineBucket
+    country = models.ForeignKey(
+        Country,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name="Страна"
+    )
+    domain = models.CharField(max_length=200, blank=True, default='', verbose_name="Домен")
+    industry = models.CharField(max_length=200, blank=True, default='', verbose_name="Сфера деятельности")
+    # Первый год века рождения: 1800 для 1800-1899, -400 для -400..-301
+    century = models.IntegerField(null=True, blank=True, verbose_name="Век")
+
+    figure_count = models.PositiveIntegerField(default=0, verbose_name="Количество личностей")
+    page_views_sum = models.BigIntegerField(default=0, verbose_name="Сумма просмотров")
+    popularity_sum = models.DecimalField(
+        max_digits=16,
+        decimal_places=4,
+        default=0,
+        verbose_name="Сумма индексов популярности"
+    )
+    max_popularity = models.DecimalField(
+        max_digits=10,
+        decimal_places=4,
+        default=0,
+        verbose_name="Максимальная популярность"
+    )
+
+    class Meta:
+        verbose_name = "Ячейка куба"
+        verbose_name_plural = "Куб сводных таблиц"
+        indexes = [
+            models.Index(fields=['century'], name='cube_cell_century_idx'),
+            models.Index(fields=['continent', 'country'], name='cube_cell_geo_idx'),
+            models.Index(fields=['domain', 'industry'], name='cube_cell_domain_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.continent or '—'} / {self.domain or '—'} / {self.century}: {self.figure_count}"
+
+
+class FigureChange(models.Model):
+    """
+    Запись журнала изменений личностей (см. pantheon.changes): id —
+    номер изменения, монотонно растущий в порядке фиксации транзакций
+    """
+
+    INSERT = 'I'
+    UPDATE = 'U'
+    DELETE = 'D'
+    OPERATION_CHOICES = [
+        (INSERT, 'Добавление'),
+        (UPDATE, 'Изменение'),
+        (DELETE, 'Удаление'),
+    ]
+
+    # Без ограничения внешнего ключа: запись переживает удаление личности
+    figure = models.ForeignKey(
+        HistoricalFigure,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        db_index=False,
+        related_name='+',
+        verbose_name="Историческая личность"
+    )
+    # Известен не всегда (пересчет индекса знает только id); для удаления
+    # записывается обязательно — по нему потребители удаляют свою копию
+    article_id = models.IntegerField(null=True, blank=True, verbose_name="ID статьи")
+    operation = models.CharField(max_length=1, choices=OPERATION_CHOICES, verbose_name="Операция")
+    changed_at = models.DateTimeField(auto_now_add=True, verbose_name="Время изменения")
+
+    class Meta:
+        verbose_name = "Изменение личности"
+        verbose_name_plural = "Журнал изменений"
+        ordering = ['pk']
+
+    def __str__(self):
+        return f"#{self.pk} {self.get_operation_display()} {self.figure_id}"
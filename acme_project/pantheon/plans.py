@@ -0,0 +1,310 @@
+# pantheon/plans.py
+"""
+Проверка планов запросов представлений и команд pantheon.
+
+Каждая цель (страница или команда) выполняется с перехватом SQL, для
+каждого запроса снимается EXPLAIN (PostgreSQL — FORMAT JSON, SQLite —
+EXPLAIN QUERY PLAN) и выделяются проблемы: полный просмотр (Seq Scan /
+SCAN без индекса) и сортировка (Sort / TEMP B-TREE) по таблицам, в которых
+не меньше large_table_rows строк. Результат сравнивается с сохраненным
+эталоном: новая проблема у запроса — регрессия.
+
+Запросы сопоставляются по отпечатку — тексту SQL без литералов.
+"""
+import hashlib
+import io
+import json
+import re
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import DatabaseError, connection, reset_queries, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from .hpi import numpy_available
+from .models import HistoricalFigure
+
+DEFAULT_LARGE_TABLE_ROWS = 1000
+
+EXPLAINABLE = ('SELECT', 'WITH', 'UPDATE', 'DELETE')
+
+_LITERAL = re.compile(r"'(?:[^']|'')*'|(?<![\w.])-?\d+(?:\.\d+)?(?![\w.])")
+_PLACEHOLDER_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_ALIAS = re.compile(r'"?(\w+)"?\s+(?:AS\s+)?"?(T\d+)"?\s+ON', re.IGNORECASE)
+_SQLITE_SCAN = re.compile(r'^(SCAN|SEARCH) (\w+)(.*)$')
+
+
+class PlanError(Exception):
+    """Эталон не найден или не читается"""
+
+
+def normalize_sql(sql):
+    """Текст запроса без литералов и со свернутыми списками IN"""
+    sql = _LITERAL.sub('?', sql)
+    sql = _PLACEHOLDER_LIST.sub('(...)', sql)
+    return ' '.join(sql.split())
+
+
+def fingerprint(sql):
+    return hashlib.sha1(normalize_sql(sql).encode()).hexdigest()[:12]
+
+
+# Цели проверки
+
+def view_targets():
+    """[(имя, url)] страниц, планы запросов которых проверяются"""
+    figure_list = reverse('figure_list')
+    targets = [
+        ('home_stats', reverse('home_fragment_stats')),
+        ('home_recent', reverse('home_fragment_recent')),
+        ('home_metrics', reverse('home_fragment_metrics')),
+        ('figure_list', figure_list),
+        ('figure_list_page', f'{figure_list}?page=50'),
+        ('figure_list_filtered', f'{figure_list}?continent=Europe&domain=ARTS'),
+        ('figure_facets', reverse('figure_facets')),
+        ('statistics', reverse('statistics')),
+        ('figure_by_rank', f'{reverse("figure_by_rank")}?rank=10'),
+        ('timeline', reverse('timeline')),
+        ('timeline_data', f'{reverse("timeline_data")}?start=1800&end=1899'),
+        ('pivot', reverse('pivot')),
+        ('api_pivot', f'{reverse("api_pivot")}?rows=country&columns=century&continent=Europe'),
+        ('api_changes', f'{reverse("api_changes")}?since=0&limit=1000'),
+        ('admin_figures', reverse('admin:pantheon_historicalfigure_changelist')),
+        ('admin_figures_search', f'{reverse("admin:pantheon_historicalfigure_changelist")}?q=Newton'),
+        ('admin_cities', reverse('admin:pantheon_city_changelist')),
+        ('admin_countries', reverse('admin:pantheon_country_changelist')),
+        ('admin_occupations', reverse('admin:pantheon_occupation_changelist')),
+    ]
+    figure_id = HistoricalFigure.objects.order_by('pk').values_list('pk', flat=True).first()
+    if figure_id is not None:
+        targets += [
+            ('figure_detail', reverse('figure_detail', args=[figure_id])),
+            ('figure_update', reverse('figure_update', args=[figure_id])),
+        ]
+    return targets
+
+
+def command_targets():
+    """[(имя, аргументы call_command)] проверяемых команд"""
+    targets = [
+        ('analyze_data', ['analyze_data']),
+        ('rebuild_aggregates', ['rebuild_aggregates']),
+        ('rebuild_ranks', ['rebuild_ranks']),
+    ]
+    if numpy_available():
+        targets.append(('recompute_hpi', ['recompute_hpi', '--dry-run']))
+    return targets
+
+
+@contextmanager
+def _isolated():
+    """Все изменения целей откатываются, кэши и реплики отключены"""
+    with override_settings(
+        CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+        PANTHEON_READ_REPLICAS=[],
+        PANTHEON_PROFILE_SAMPLE_RATE=0.0,
+    ), transaction.atomic():
+        try:
+            yield
+        finally:
+            transaction.set_rollback(True)
+
+
+def capture_queries(only=None):
+    """{цель: [SQL]} по всем страницам и командам (или только по only)"""
+    captured = {}
+    with _isolated():
+        user = get_user_model().objects.create(
+            username='pantheon-query-plans', is_staff=True, is_superuser=True
+        )
+        client = Client()
+        client.force_login(user)
+
+        for name, url in view_targets():
+            if only and name not in only:
+                continue
+            # Журнал запросов ограничен по длине: разность длин до и после
+            # работает, только если он не заполнен
+            reset_queries()
+            with CaptureQueriesContext(connection) as context:
+                response = client.get(url)
+                if response.streaming:
+                    # Запросы потокового ответа выполняются при чтении
+                    b''.join(response.streaming_content)
+            captured[name] = [query['sql'] for query in context.captured_queries]
+
+        for name, args in command_targets():
+            if only and name not in only:
+                continue
+            reset_queries()
+            with CaptureQueriesContext(connection) as context:
+                call_command(*args, stdout=io.StringIO(), stderr=io.StringIO())
+            captured[name] = [query['sql'] for query in context.captured_queries]
+    return captured
+
+
+# Планы
+
+class _TableSizes:
+    def __init__(self):
+        self.sizes = {}
+
+    def __getitem__(self, table):
+        if table not in self.sizes:
+            self.sizes[table] = self._count(table)
+        return self.sizes[table]
+
+    def _count(self, table):
+        if table not in connection.introspection.table_names():
+            return 0
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE relname = %s', [table])
+                row = cursor.fetchone()
+                if row and row[0] >= 0:
+                    return row[0]
+            cursor.execute(f'SELECT COUNT(*) FROM {connection.ops.quote_name(table)}')
+            return cursor.fetchone()[0]
+
+
+def _explain(sql):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+            plan = cursor.fetchone()[0]
+            return plan if isinstance(plan, list) else json.loads(plan)
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        return [row[3] for row in cursor.fetchall()]
+
+
+def _postgresql_issues(plan, sizes, threshold):
+    issues, lines = set(), []
+
+    def relations(node):
+        found = {node['Relation Name']} if 'Relation Name' in node else set()
+        for child in node.get('Plans', []):
+            found |= relations(child)
+        return found
+
+    def walk(node, depth):
+        node_type = node['Node Type']
+        relation = node.get('Relation Name')
+        lines.append('  ' * depth + node_type + (f' on {relation}' if relation else ''))
+        if node_type == 'Seq Scan' and sizes[relation] >= threshold:
+            issues.add(f'seq_scan:{relation}')
+        if node_type == 'Sort':
+            for table in relations(node):
+                if sizes[table] >= threshold:
+                    issues.add(f'sort:{table}')
+        for child in node.get('Plans', []):
+            walk(child, depth + 1)
+
+    walk(plan[0]['Plan'], 0)
+    return issues, lines
+
+
+def _sqlite_issues(plan, sql, sizes, threshold):
+    aliases = {alias: table for table, alias in _ALIAS.findall(sql)}
+    issues, tables = set(), set()
+    sorts = False
+    for detail in plan:
+        match = _SQLITE_SCAN.match(detail)
+        if match:
+            operation, name, rest = match.groups()
+            table = aliases.get(name, name)
+            if sizes[table] < threshold:
+                continue
+            tables.add(table)
+            if operation == 'SCAN' and 'INDEX' not in rest:
+                issues.add(f'seq_scan:{table}')
+        elif detail.startswith('USE TEMP B-TREE'):
+            sorts = True
+    if sorts:
+        issues.update(f'sort:{table}' for table in tables)
+    return issues, list(plan)
+
+
+def analyze(sql, sizes, threshold):
+    """(проблемы, строки плана) одного запроса или None, если EXPLAIN неприменим"""
+    if not sql.lstrip().upper().startswith(EXPLAINABLE):
+        return None
+    try:
+        with transaction.atomic():
+            plan = _explain(sql)
+    except DatabaseError:
+        # Например, запрос к уже удаленной временной таблице
+        return None
+    if connection.vendor == 'postgresql':
+        issues, lines = _postgresql_issues(plan, sizes, threshold)
+    else:
+        issues, lines = _sqlite_issues(plan, sql, sizes, threshold)
+    return sorted(issues), lines
+
+
+def collect_plans(only=None, threshold=DEFAULT_LARGE_TABLE_ROWS):
+    """
+    {цель: {отпечаток: {sql, count, issues, plan}}} — планы всех
+    уникальных запросов каждой цели.
+    """
+    sizes = _TableSizes()
+    report = {}
+    for target, queries in capture_queries(only).items():
+        plans = report[target] = {}
+        for sql in queries:
+            key = fingerprint(sql)
+            if key in plans:
+                plans[key]['count'] += 1
+                continue
+            result = analyze(sql, sizes, threshold)
+            if result is None:
+                continue
+            issues, lines = result
+            plans[key] = {
+                'sql': normalize_sql(sql),
+                'count': 1,
+                'issues': issues,
+                'plan': lines,
+            }
+    return report
+
+
+# Эталон
+
+def baseline_path(directory):
+    return directory / f'{connection.vendor}.json'
+
+
+def load_baseline(path):
+    try:
+        with open(path, encoding='utf-8') as source:
+            return json.load(source)
+    except FileNotFoundError:
+        raise PlanError(f'Эталон {path} не найден, создайте его с --update-baseline')
+    except ValueError as error:
+        raise PlanError(f'Эталон {path} не читается: {error}')
+
+
+def save_baseline(path, report):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as output:
+        json.dump(report, output, ensure_ascii=False, indent=2, sort_keys=True)
+        output.write('\n')
+
+
+def compare(baseline, report):
+    """
+    Регрессии относительно эталона: [(цель, отпечаток, sql, новые проблемы)].
+    Новый запрос считается регрессией, только если у него есть проблемы.
+    """
+    regressions = []
+    for target, plans in report.items():
+        known = baseline.get(target, {})
+        for key, plan in plans.items():
+            previous = set(known[key]['issues']) if key in known else set()
+            added = sorted(set(plan['issues']) - previous)
+            if added:
+                regressions.append((target, key, plan['sql'], added))
+    return regressions
@@ -0,0 +1,181 @@
+# pantheon/profiling.py
+"""
+Профилирование команд и запросов.
+
+Profiler — cProfile вокруг блока кода; по желанию параллельно снимает
+выборки стека основного потока для флеймграфа (формат collapsed stacks,
+как у flamegraph.pl и speedscope: «f1;f2;f3 число_выборок»).
+
+measure_imports — время импорта модулей при загрузке приложения
+(python -X importtime в отдельном процессе).
+"""
+import cProfile
+import io
+import os
+import pstats
+import re
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+DEFAULT_SAMPLE_INTERVAL = 0.005
+
+
+def _frame_label(code):
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+class StackSampler(threading.Thread):
+    """Периодические снимки стека заданного потока"""
+
+    def __init__(self, thread_id, interval=DEFAULT_SAMPLE_INTERVAL):
+        super().__init__(name='pantheon-stack-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def write_collapsed(self, path):
+        with open(path, 'w', encoding='utf-8') as output:
+            for stack, count in self.stacks.most_common():
+                output.write(f'{stack} {count}\n')
+
+
+class Profiler:
+    """
+    Контекстный менеджер профилирования:
+
+        with Profiler(collapsed=True) as profiler:
+            ...
+        profiler.dump('import.prof')
+    """
+
+    def __init__(self, collapsed=False, interval=DEFAULT_SAMPLE_INTERVAL):
+        self.profile = cProfile.Profile()
+        self.sampler = StackSampler(threading.get_ident(), interval) if collapsed else None
+        self.elapsed = 0.0
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        if self.sampler:
+            self.sampler.start()
+        self.profile.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profile.disable()
+        if self.sampler:
+            self.sampler.stop()
+        self.elapsed = time.perf_counter() - self._started
+        return False
+
+    def dump(self, path):
+        """Пишет статистику pstats в path и выборки стека в path.collapsed"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.profile.dump_stats(path)
+        paths = [path]
+        if self.sampler:
+            collapsed_path = os.path.splitext(path)[0] + '.collapsed'
+            self.sampler.write_collapsed(collapsed_path)
+            paths.append(collapsed_path)
+        return paths
+
+    def top_functions(self, limit=20, sort='cumulative'):
+        """[{function, calls, total, cumulative}] самых затратных функций"""
+        stats = pstats.Stats(self.profile, stream=io.StringIO())
+        stats.sort_stats(sort)
+        functions = []
+        for func in stats.fcn_list[:limit]:
+            _, calls, total, cumulative, _ = stats.stats[func]
+            filename, line, name = func
+            functions.append({
+                'function': f'{name} ({filename}:{line})' if line else name,
+                'calls': calls,
+                'total': round(total, 6),
+                'cumulative': round(cumulative, 6),
+            })
+        return functions
+
+    def report(self, limit=20, sort='cumulative'):
+        """Текстовая таблица pstats самых затратных функций"""
+        stream = io.StringIO()
+        stats = pstats.Stats(self.profile, stream=stream)
+        stats.strip_dirs().sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+
+# Загрузка приложения так же, как в wsgi.py, но без прогрева
+BOOT_CODE = (
+    'from django.core.wsgi import get_wsgi_application\n'
+    'get_wsgi_application()\n'
+    'from django.urls import get_resolver\n'
+    'get_resolver().url_patterns\n'
+)
+
+_IMPORTTIME_RE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)\s*$')
+
+
+def parse_importtime(text):
+    """
+    Строки вывода -X importtime: [{module, self, cumulative, depth}],
+    время в микросекундах, depth — уровень вложенности импорта (0 — верхний)
+    """
+    imports = []
+    for line in text.splitlines():
+        match = _IMPORTTIME_RE.match(line)
+        if match:
+            imports.append({
+                'module': match.group(4),
+                'self': int(match.group(1)),
+                'cumulative': int(match.group(2)),
+                'depth': len(match.group(3)) // 2 - 1,
+            })
+    return imports
+
+
+def importtime_report(imports, limit=20):
+    """
+    Сводка по импортам: общее время, самые долгие импорты верхнего уровня
+    (с вложенными), самые долгие модули сами по себе и время по пакетам
+    """
+    packages = defaultdict(int)
+    for item in imports:
+        packages[item['module'].split('.')[0]] += item['self']
+    top_level = [item for item in imports if item['depth'] == 0]
+    return {
+        'total_us': sum(item['self'] for item in imports),
+        'modules': len(imports),
+        'top_cumulative': sorted(top_level, key=lambda item: -item['cumulative'])[:limit],
+        'top_self': sorted(imports, key=lambda item: -item['self'])[:limit],
+        'packages': sorted(packages.items(), key=lambda item: -item[1])[:limit],
+    }
+
+
+def measure_imports(code=BOOT_CODE, env=None):
+    """Запускает code в новом интерпретаторе с -X importtime, возвращает parse_importtime"""
+    environment = dict(os.environ, **(env or {}))
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        capture_output=True, text=True, env=environment,
+    )
+    if result.returncode:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'ошибка запуска')
+    return parse_importtime(result.stderr)
@@ -0,0 +1,112 @@
+# pantheon/ranks.py
+from django.db import connection, transaction
+from django.db.models import F, FloatField, Window
+from django.db.models.functions import Cast, CumeDist, Rank
+from django.dispatch import receiver
+
+from . import dimensions
+from .models import HistoricalFigure
+from .signals import figures_changed
+
+# Поле рейтинга -> группа (None — общий рейтинг)
+SCOPES = {
+    'global': None,
+    'continent': 'city__country__continent',
+    'domain': 'occupation__domain',
+}
+
+
+def _ranked_queryset():
+    """Места и доли для всех личностей, посчитанные оконными функциями"""
+    # Порядок по float: OrderByList с DecimalField Django на SQLite
+    # оборачивает в CAST(... AS NUMERIC) и ломает синтаксис OVER
+    order_by = Cast('historical_popularity_index', FloatField()).desc()
+    annotations = {}
+    for scope, group in SCOPES.items():
+        partition_by = [F(group)] if group else None
+        annotations[f'{scope}_rank_value'] = Window(Rank(), partition_by=partition_by, order_by=order_by)
+        annotations[f'{scope}_top_value'] = Window(CumeDist(), partition_by=partition_by, order_by=order_by)
+        if group:
+            annotations[f'{scope}_group'] = F(group)
+    return HistoricalFigure.objects.order_by().annotate(**annotations).values('id', *annotations)
+
+
+def distinct_sql(left, right):
+    """Условие «значения различаются» с NULL как обычным значением"""
+    if connection.vendor == 'postgresql':
+        return f'{left} IS DISTINCT FROM {right}'
+    if connection.vendor == 'mysql':
+        return f'NOT ({left} <=> {right})'
+    return f'{left} IS NOT {right}'
+
+
+def refresh_ranks():
+    """
+    Пересчитывает места всех личностей одним UPDATE ... FROM (SELECT ... OVER ...);
+    переписываются только строки, у которых место или доля изменились.
+
+    Личности без континента или домена получают NULL в соответствующем
+    рейтинге.
+    """
+    quote = connection.ops.quote_name
+    table = quote(HistoricalFigure._meta.db_table)
+    ranked_sql, params = _ranked_queryset().query.sql_with_params()
+
+    assignments, changed = [], []
+    for scope, group in SCOPES.items():
+        rank = f'ranked.{quote(scope + "_rank_value")}'
+        top = f'100.0 * ranked.{quote(scope + "_top_value")}'
+        if group:
+            missing = f'ranked.{quote(scope + "_group")} IS NULL'
+            rank = f'CASE WHEN {missing} THEN NULL ELSE {rank} END'
+            top = f'CASE WHEN {missing} THEN NULL ELSE {top} END'
+        for column, value in ((quote(scope + '_rank'), rank), (quote(scope + '_top_percent'), top)):
+            assignments.append(f'{column} = {value}')
+            changed.append(distinct_sql(f'{table}.{column}', value))
+
+    sql = (
+        f'UPDATE {table} SET {", ".join(assignments)} '
+        f'FROM ({ranked_sql}) ranked WHERE {table}.{quote("id")} = ranked.{quote("id")} '
+        f'AND ({" OR ".join(changed)})'
+    )
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+
+def figure_at_rank(rank, scope='global', group=None):
+    """
+    Личность на месте rank (при равенстве индексов — ближайшее место выше).
+
+    group — континент или домен для соответствующего рейтинга.
+    """
+    rank_field = f'{scope}_rank'
+    figures = HistoricalFigure.objects.filter(**{f'{rank_field}__lte': rank})
+    if SCOPES[scope]:
+        figures = figures.filter(**{SCOPES[scope]: group})
+    return figures.order_by(f'-{rank_field}', 'id').first()
+
+
+def _rank_key(state):
+    """(индекс, континент, домен) — от чего зависят места личности"""
+    city = dimensions.city(state['city_id']) if state['city_id'] else None
+    country = dimensions.country(city['country_id']) if city and city['country_id'] else None
+    occupation = dimensions.occupation(state['occupation_id']) if state['occupation_id'] else None
+    index = HistoricalFigure._meta.get_field('historical_popularity_index')
+    return (
+        index.to_python(state['historical_popularity_index']),
+        country['continent'] if country else None,
+        occupation['domain'] if occupation else None,
+    )
+
+
+@receiver(figures_changed)
+def update_ranks(sender, before, after, full, **kwargs):
+    # Изменение индекса, континента или домена сдвигает места соседей,
+    # поэтому пересчет полный; правки остальных полей места не меняют
+    if not full:
+        previous = {state['id']: _rank_key(state) for state in before}
+        current = {state['id']: _rank_key(state) for state in after}
+        if previous == current:
+            return
+    refresh_ranks()
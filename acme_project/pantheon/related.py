@@ -0,0 +1,147 @@
+# pantheon/related.py
+import bisect
+import heapq
+from collections import defaultdict
+
+from django.db import transaction
+
+from .models import HistoricalFigure, RelatedFigures
+
+DEFAULT_TOP_K = 10
+
+# Сколько ближайших по году рождения / популярности кандидатов брать
+# из каждой группы: ограничивает перебор O(n * window) вместо O(n^2)
+CANDIDATE_WINDOW = 40
+
+WEIGHT_SAME_CITY = 3.0
+WEIGHT_SAME_OCCUPATION = 3.0
+WEIGHT_BIRTH_YEAR = 2.0
+WEIGHT_POPULARITY = 2.0
+BIRTH_YEAR_SCALE = 50.0
+POPULARITY_SCALE = 3.0
+
+
+class _SortedGroup:
+    """Участники группы, отсортированные по ключу, для поиска ближайших"""
+
+    def __init__(self, items):
+        items.sort()
+        self.keys = [key for key, _ in items]
+        self.ids = [figure_id for _, figure_id in items]
+
+    def nearest(self, key, window):
+        if key is None:
+            return self.ids[:window]
+        position = bisect.bisect_left(self.keys, key)
+        start = max(0, position - window // 2)
+        return self.ids[start:start + window]
+
+
+def _similarity(a, b):
+    score = 0.0
+    if a['city_id'] and a['city_id'] == b['city_id']:
+        score += WEIGHT_SAME_CITY
+    if a['occupation_id'] and a['occupation_id'] == b['occupation_id']:
+        score += WEIGHT_SAME_OCCUPATION
+    if a['birth_year'] is not None and b['birth_year'] is not None:
+        distance = abs(a['birth_year'] - b['birth_year'])
+        score += WEIGHT_BIRTH_YEAR * max(0.0, 1.0 - distance / BIRTH_YEAR_SCALE)
+    distance = abs(a['hpi'] - b['hpi'])
+    score += WEIGHT_POPULARITY * max(0.0, 1.0 - distance / POPULARITY_SCALE)
+    return score
+
+
+def compute_neighbors(rows, top_k=DEFAULT_TOP_K, window=CANDIDATE_WINDOW):
+    """
+    Для каждой записи возвращает top_k самых похожих (город, профессия,
+    близкий год рождения, близкая популярность).
+
+    Кандидаты берутся только из ближайших соседей внутри того же города,
+    той же профессии и из глобальных списков по году и популярности.
+    """
+    figures = {row['id']: row for row in rows}
+
+    by_city = defaultdict(list)
+    by_occupation = defaultdict(list)
+    by_year = []
+    by_popularity = []
+    for row in figures.values():
+        year = row['birth_year'] if row['birth_year'] is not None else 0
+        if row['city_id']:
+            by_city[row['city_id']].append((year, row['id']))
+        if row['occupation_id']:
+            by_occupation[row['occupation_id']].append((year, row['id']))
+        if row['birth_year'] is not None:
+            by_year.append((row['birth_year'], row['id']))
+        by_popularity.append((row['hpi'], row['id']))
+
+    by_city = {key: _SortedGroup(items) for key, items in by_city.items()}
+    by_occupation = {key: _SortedGroup(items) for key, items in by_occupation.items()}
+    by_year = _SortedGroup(by_year)
+    by_popularity = _SortedGroup(by_popularity)
+
+    for figure_id, row in figures.items():
+        candidates = set(by_popularity.nearest(row['hpi'], window))
+        if row['birth_year'] is not None:
+            candidates.update(by_year.nearest(row['birth_year'], window))
+        if row['city_id']:
+            candidates.update(by_city[row['city_id']].nearest(row['birth_year'], window))
+        if row['occupation_id']:
+            candidates.update(by_occupation[row['occupation_id']].nearest(row['birth_year'], window))
+        candidates.discard(figure_id)
+
+        best = heapq.nlargest(
+            top_k,
+            candidates,
+            key=lambda other_id: (_similarity(row, figures[other_id]), -other_id),
+        )
+        yield figure_id, best
+
+
+def build_related_index(top_k=DEFAULT_TOP_K, batch_size=2000):
+    """Полная перестройка индекса похожих личностей. Возвращает число записей"""
+    rows = [
+        {
+            'id': figure_id,
+            'city_id': city_id,
+            'occupation_id': occupation_id,
+            'birth_year': birth_year,
+            'hpi': float(hpi),
+        }
+        for figure_id, city_id, occupation_id, birth_year, hpi in
+        HistoricalFigure.objects.values_list(
+            'id', 'city_id', 'occupation_id', 'birth_year', 'historical_popularity_index'
+        ).order_by().iterator(chunk_size=batch_size)
+    ]
+
+    total = 0
+    with transaction.atomic():
+        RelatedFigures.objects.all().delete()
+        batch = []
+        for figure_id, neighbor_ids in compute_neighbors(rows, top_k=top_k):
+            batch.append(RelatedFigures(figure_id=figure_id, neighbor_ids=RelatedFigures.pack(neighbor_ids)))
+            if len(batch) >= batch_size:
+                RelatedFigures.objects.bulk_create(batch)
+                total += len(batch)
+                batch = []
+        RelatedFigures.objects.bulk_create(batch)
+        total += len(batch)
+    return total
+
+
+def related_figures(figure):
+    """
+    Похожие личности из предрассчитанного индекса.
+
+    figure должен быть загружен с select_related('related_index'), тогда
+    к запросу детальной страницы добавляется один запрос по первичным ключам.
+    """
+    try:
+        ids = figure.related_index.ids
+    except RelatedFigures.DoesNotExist:
+        return []
+
+    found = HistoricalFigure.objects.select_related(
+        'city', 'city__country', 'occupation'
+    ).in_bulk(ids)
+    return [found[figure_id] for figure_id in ids if figure_id in found]
@@ -0,0 +1,363 @@
+# pantheon/resolution.py
+"""
+Сопоставление вариантов написания городов и профессий с уже
+существующими записями справочников.
+
+Названия нормализуются (регистр, диакритика, пунктуация), затем
+кандидаты ищутся не перебором всего справочника, а по блокирующим
+ключам: фонетический код (Soundex), начало и конец названия, для
+городов — ячейка координатной сетки. Каждый ключ ведет в небольшой
+блок записей; кандидаты из блоков сравниваются по сходству названий
+(difflib.SequenceMatcher) и (для городов) по расстоянию между координатами.
+Города сопоставляются только внутри своей страны; без координат —
+только при почти совпадающих названиях.
+
+При импорте файл сначала просматривается целиком (DimensionResolver.plan_*):
+варианты сопоставляются в порядке убывания частоты, поэтому каноническим
+становится самое частое написание, а не первое встретившееся.
+"""
+import math
+import re
+import unicodedata
+from collections import defaultdict, namedtuple
+from difflib import SequenceMatcher
+
+from django.db import transaction
+from django.db.models.functions import Length
+
+from .models import City, HistoricalFigure, Occupation
+from .signals import STATE_FIELDS, notify_figures_changed
+
+# Пороги сходства нормализованных названий (0..1)
+CITY_NAME_SIMILARITY = 0.88
+CITY_NEARBY_NAME_SIMILARITY = 0.8
+# Без координат у одной из записей сходство названий почти ничего не
+# доказывает (Lichfield / Lochfield — разные города)
+CITY_UNLOCATED_NAME_SIMILARITY = 0.95
+OCCUPATION_NAME_SIMILARITY = 0.88
+
+# Расстояния для городов, км: похожие названия дальше MAX — разные города,
+# в пределах NEARBY достаточно умеренно похожего названия
+CITY_MAX_DISTANCE_KM = 50
+CITY_NEARBY_DISTANCE_KM = 5
+
+# Профессии различаются одним-двумя словами при близком написании
+# (Baseball Player / Basketball Player), поэтому для них допускается
+# разница в длине названия не больше чем на символ — как у опечатки
+OCCUPATION_MAX_LENGTH_DIFFERENCE = 1
+
+# Разные города с общим корнем: North Shields / South Shields
+_QUALIFIERS = frozenset((
+    'north', 'south', 'east', 'west', 'upper', 'lower', 'new', 'old', 'great', 'little',
+))
+
+# Ячейка сетки координат (градусы); ищется в ней и в соседних
+GRID_STEP = 0.25
+
+_SPACE_RE = re.compile(r'\s+')
+_PUNCTUATION_RE = re.compile(r"[^\w\s]|_")
+_ABBREVIATIONS = {'st': 'saint', 'ste': 'sainte', 'mt': 'mount', 'ft': 'fort'}
+
+_SOUNDEX_CODES = {
+    **dict.fromkeys('bfpv', '1'),
+    **dict.fromkeys('cgjkqsxz', '2'),
+    **dict.fromkeys('dt', '3'),
+    'l': '4',
+    **dict.fromkeys('mn', '5'),
+    'r': '6',
+}
+
+Match = namedtuple('Match', 'pk name score distance')
+
+
+def normalize_name(name):
+    """'Sankt-Peterburg ' -> 'sankt peterburg', 'St. Louis' -> 'saint louis'"""
+    name = unicodedata.normalize('NFKD', name or '')
+    name = ''.join(char for char in name if not unicodedata.combining(char)).casefold()
+    words = _SPACE_RE.split(_PUNCTUATION_RE.sub(' ', name).strip())
+    return ' '.join(_ABBREVIATIONS.get(word, word) for word in words if word)
+
+
+def soundex(name):
+    """Фонетический код (Soundex) нормализованного названия без пробелов"""
+    letters = [char for char in name if 'a' <= char <= 'z']
+    if not letters:
+        return name[:4]
+    code = [letters[0]]
+    previous = _SOUNDEX_CODES.get(letters[0])
+    for char in letters[1:]:
+        digit = _SOUNDEX_CODES.get(char)
+        if digit and digit != previous:
+            code.append(digit)
+            if len(code) == 4:
+                break
+        if char not in 'hw':
+            previous = digit
+    return ''.join(code).ljust(4, '0')
+
+
+def similarity(a, b):
+    """Сходство нормализованных названий: 1.0 — совпадают, 0 — разные по уточнению"""
+    if a == b:
+        return 1.0
+    if _QUALIFIERS.intersection(a.split()) ^ _QUALIFIERS.intersection(b.split()):
+        return 0.0
+    return SequenceMatcher(None, a, b).ratio()
+
+
+def distance_km(a, b):
+    """Расстояние по большому кругу между (широта, долгота) или None"""
+    if None in a or None in b:
+        return None
+    lat1, lon1, lat2, lon2 = map(math.radians, (*map(float, a), *map(float, b)))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371.0 * math.asin(min(1.0, math.sqrt(h)))
+
+
+class _BlockingIndex:
+    """Записи справочника и блоки: ключ -> множество id"""
+
+    def __init__(self):
+        self.records = {}
+        self.blocks = defaultdict(set)
+
+    def __len__(self):
+        return len(self.records)
+
+    def add(self, pk, **record):
+        record['normalized'] = normalize_name(record['name'])
+        self.records[pk] = record
+        for key in self.keys(record):
+            self.blocks[key].add(pk)
+
+    def candidates(self, record):
+        found = set()
+        for key in self.keys(record, query=True):
+            found |= self.blocks.get(key, set())
+        return found
+
+    def match(self, **record):
+        """Лучшая подходящая запись (Match) или None"""
+        record['normalized'] = normalize_name(record['name'])
+        best = None
+        for pk in self.candidates(record):
+            match = self.compare(record, pk)
+            if match and (best is None or match.score > best.score):
+                best = match
+        return best
+
+    def name_keys(self, normalized, scope=None):
+        compact = normalized.replace(' ', '')
+        return [
+            ('soundex', scope, soundex(compact)),
+            ('prefix', scope, compact[:4]),
+            ('suffix', scope, compact[-4:]),
+        ]
+
+
+class CityIndex(_BlockingIndex):
+
+    def keys(self, record, query=False):
+        keys = self.name_keys(record['normalized'], record['country_id'])
+        if record['latitude'] is not None and record['longitude'] is not None:
+            row = math.floor(float(record['latitude']) / GRID_STEP)
+            column = math.floor(float(record['longitude']) / GRID_STEP)
+            # Запись лежит в одной ячейке, поиск идет и по соседним
+            steps = (-1, 0, 1) if query else (0,)
+            keys += [('grid', record['country_id'], row + dr, column + dc) for dr in steps for dc in steps]
+        return keys
+
+    def compare(self, record, pk):
+        other = self.records[pk]
+        if other['country_id'] != record['country_id']:
+            return None
+        score = similarity(record['normalized'], other['normalized'])
+        distance = distance_km(
+            (record['latitude'], record['longitude']), (other['latitude'], other['longitude'])
+        )
+        if distance is None:
+            accepted = score >= CITY_UNLOCATED_NAME_SIMILARITY
+        elif distance <= CITY_NEARBY_DISTANCE_KM:
+            accepted = score >= CITY_NEARBY_NAME_SIMILARITY
+        else:
+            accepted = score >= CITY_NAME_SIMILARITY and distance <= CITY_MAX_DISTANCE_KM
+        return Match(pk, other['name'], score, distance) if accepted else None
+
+
+class OccupationIndex(_BlockingIndex):
+
+    def keys(self, record, query=False):
+        return self.name_keys(record['normalized'])
+
+    def compare(self, record, pk):
+        other = self.records[pk]
+        if abs(len(record['normalized']) - len(other['normalized'])) > OCCUPATION_MAX_LENGTH_DIFFERENCE:
+            return None
+        score = similarity(record['normalized'], other['normalized'])
+        return Match(pk, other['name'], score, None) if score >= OCCUPATION_NAME_SIMILARITY else None
+
+
+def city_index(model=City):
+    index = CityIndex()
+    for row in model.objects.values('id', 'name', 'country_id', 'latitude', 'longitude'):
+        index.add(row.pop('id'), **row)
+    return index
+
+
+def occupation_index(model=Occupation):
+    index = OccupationIndex()
+    for row in model.objects.values('id', 'name'):
+        index.add(row.pop('id'), **row)
+    return index
+
+
+def _frequency_order(name, count):
+    # Чаще встречающиеся варианты раньше, при равенстве — более короткие
+    # (лишняя буква — самая частая опечатка датасета: Tarranto, Greenwhich),
+    # затем по порядку в файле
+    return (-count, len(name))
+
+
+def _planned(match):
+    """Match для плана: pk=None, если каноническая запись еще не создана"""
+    return match._replace(pk=None) if isinstance(match.pk, tuple) else match
+
+
+class DimensionResolver:
+    """
+    Сопоставление при импорте.
+
+    Если импорт заранее передал все варианты названий файла с частотами
+    (plan_cities, plan_occupations), каноническое написание каждого
+    варианта определено заранее: Match с pk=None — каноническая запись еще
+    не создана. Иначе индексы строятся при первом промахе точного поиска,
+    новые записи справочников добавляются в них, чтобы следующие варианты
+    того же названия в файле находили их.
+    """
+
+    def __init__(self, city_model=City, occupation_model=Occupation):
+        self.city_model = city_model
+        self.occupation_model = occupation_model
+        self._cities = None
+        self._occupations = None
+        self.city_plan = None
+        self.occupation_plan = None
+
+    @property
+    def cities(self):
+        if self._cities is None:
+            self._cities = city_index(self.city_model)
+        return self._cities
+
+    @property
+    def occupations(self):
+        if self._occupations is None:
+            self._occupations = occupation_index(self.occupation_model)
+        return self._occupations
+
+    def plan_cities(self, variants):
+        """variants: {(название, название страны): (число строк, широта, долгота)}"""
+        country_model = self.city_model._meta.get_field('country').related_model
+        country_ids = dict(country_model.objects.values_list('name', 'id'))
+        index = city_index(self.city_model)
+        self.city_plan = {}
+        ordered = sorted(variants.items(), key=lambda item: _frequency_order(item[0][0], item[1][0]))
+        for (name, country), (_, latitude, longitude) in ordered:
+            # Городов новой страны в справочнике нет, область — ее название
+            scope = country_ids.get(country, country)
+            record = {'name': name, 'country_id': scope, 'latitude': latitude, 'longitude': longitude}
+            match = index.match(**record)
+            if match is None:
+                # Каноническое написание, которого еще нет в справочнике
+                index.add(('planned', name, scope), **record)
+            self.city_plan[(name, country)] = _planned(match) if match and match.name != name else None
+
+    def plan_occupations(self, variants):
+        """variants: {название: число строк}"""
+        index = occupation_index(self.occupation_model)
+        self.occupation_plan = {}
+        for name, _ in sorted(variants.items(), key=lambda item: _frequency_order(*item)):
+            match = index.match(name=name)
+            if match is None:
+                index.add(('planned', name), name=name)
+            self.occupation_plan[name] = _planned(match) if match and match.name != name else None
+
+    def match_city(self, name, country_id, latitude, longitude, country_name=None):
+        if self.city_plan is not None and (name, country_name) in self.city_plan:
+            return self.city_plan[(name, country_name)]
+        return self.cities.match(name=name, country_id=country_id, latitude=latitude, longitude=longitude)
+
+    def match_occupation(self, name):
+        if self.occupation_plan is not None and name in self.occupation_plan:
+            return self.occupation_plan[name]
+        return self.occupations.match(name=name)
+
+    def add_city(self, city):
+        # Индекс еще не построен — запись попадет в него из БД
+        if self._cities is not None and city.pk not in self._cities.records:
+            self._cities.add(
+                city.pk, name=city.name, country_id=city.country_id,
+                latitude=city.latitude, longitude=city.longitude,
+            )
+
+    def add_occupation(self, occupation):
+        if self._occupations is not None and occupation.pk not in self._occupations.records:
+            self._occupations.add(occupation.pk, name=occupation.name)
+
+
+# Слияние уже существующих дубликатов
+
+DuplicateGroup = namedtuple('DuplicateGroup', 'canonical duplicates')
+
+
+def find_duplicates(model):
+    """
+    Группы дубликатов справочника: [DuplicateGroup(Match канонической
+    записи, [Match дубликатов])]. Каноническая — с наибольшим числом
+    личностей (при равенстве — с более коротким названием, как при
+    импорте, затем с меньшим id); каждая запись сравнивается
+    только с уже принятыми каноническими через блокирующий индекс.
+    """
+    index = CityIndex() if model is City else OccupationIndex()
+    fields = ['id', 'name'] + (['country_id', 'latitude', 'longitude'] if model is City else [])
+    groups = {}
+    for row in model.objects.order_by('-figure_count', Length('name'), 'pk').values(*fields):
+        pk = row.pop('id')
+        match = index.match(**row)
+        if match is None:
+            index.add(pk, **row)
+            continue
+        group = groups.setdefault(match.pk, DuplicateGroup(Match(match.pk, match.name, 1.0, None), []))
+        group.duplicates.append(Match(pk, row['name'], match.score, match.distance))
+    return list(groups.values())
+
+
+def merge_duplicates(model, groups):
+    """
+    Переносит ссылки с дубликатов на канонические записи (по UPDATE на
+    группу и ссылающуюся таблицу) и удаляет дубликаты. Возвращает число
+    перенесенных личностей.
+    """
+    relations = [relation for relation in model._meta.related_objects if relation.one_to_many]
+    moved = 0
+    before, after = [], []
+    with transaction.atomic():
+        for group in groups:
+            canonical = group.canonical.pk
+            duplicate_ids = [duplicate.pk for duplicate in group.duplicates]
+            for relation in relations:
+                attname = relation.field.attname
+                affected = relation.related_model.objects.filter(**{f'{attname}__in': duplicate_ids})
+                if relation.related_model is HistoricalFigure:
+                    # Состояния для figures_changed: агрегаты, места и т.п.
+                    states = list(affected.values(*STATE_FIELDS))
+                    before += states
+                    after += [{**state, attname: canonical} for state in states]
+                    moved += len(states)
+                affected.update(**{attname: canonical})
+        model.objects.filter(
+            pk__in=[duplicate.pk for group in groups for duplicate in group.duplicates]
+        ).delete()
+        if before:
+            notify_figures_changed(before=before, after=after)
+    return moved
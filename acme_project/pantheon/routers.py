@@ -0,0 +1,180 @@
+# pantheon/routers.py
+import random
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PRIMARY_COOKIE_NAME = 'pantheon_primary_until'
+
+# Изменяющий запрос к таблицам pantheon
+_WRITE_SQL = re.compile(r'^\s*(?:INSERT\s+INTO|UPDATE|DELETE\s+FROM)\s+["`]?pantheon_', re.IGNORECASE)
+
+# Состояние текущего запроса/команды: принудительное чтение с основной БД,
+# флаг того, что в рамках запроса уже была запись, и выбранная реплика.
+_routing_state = ContextVar('pantheon_routing_state', default=None)
+
+
+def get_read_replicas():
+    """Список псевдонимов реплик для чтения из настроек"""
+    return [
+        alias for alias in getattr(settings, 'PANTHEON_READ_REPLICAS', [])
+        if alias in settings.DATABASES
+    ]
+
+
+def _state():
+    state = _routing_state.get()
+    if state is None:
+        state = {'pinned': False, 'wrote': False, 'replica': None}
+        _routing_state.set(state)
+    return state
+
+
+def _track_writes(execute, sql, params, many, context):
+    # Флаг записи ставится по фактически выполненному SQL: get_or_create
+    # и select_for_update без изменений клиента к основной БД не привязывают
+    if _WRITE_SQL.match(sql):
+        _state()['wrote'] = True
+    return execute(sql, params, many, context)
+
+
+@contextmanager
+def routing_scope(pinned=False):
+    """
+    Изолированное состояние маршрутизации (один запрос или одна команда).
+    Записи в таблицы pantheon на основной БД внутри блока отмечаются
+    в state['wrote'].
+    """
+    token = _routing_state.set({'pinned': pinned, 'wrote': False, 'replica': None})
+    try:
+        with connections[DEFAULT_DB_ALIAS].execute_wrapper(_track_writes):
+            yield _routing_state.get()
+    finally:
+        _routing_state.reset(token)
+
+
+def _replica(state):
+    """Реплика для чтений в состоянии state (выбирается один раз) или None"""
+    replicas = get_read_replicas()
+    if not replicas:
+        return None
+    if state['replica'] not in replicas:
+        state['replica'] = random.choice(replicas)
+    return state['replica']
+
+
+def in_routing_scope(iterable):
+    """
+    Итератор по iterable, каждый шаг которого выполняется в состоянии
+    маршрутизации, действующем сейчас: потоковый ответ читается уже после
+    выхода из ReplicaPinningMiddleware, а его запросы должны идти в ту же
+    БД, что и запросы представления
+    """
+    state = _state()
+    pinned = state['pinned'] or state['wrote']
+    replica = None if pinned else _replica(state)
+
+    def steps():
+        iterator = iter(iterable)
+        while True:
+            # Состояние — на один шаг: шаги потокового ответа ASGI
+            # выполняются в разных контекстах
+            with routing_scope(pinned=pinned) as scope:
+                scope['replica'] = replica
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    return steps()
+
+
+@contextmanager
+def use_primary():
+    """Все чтения внутри блока выполняются на основной БД"""
+    state = _state()
+    previous = state['pinned']
+    state['pinned'] = True
+    try:
+        yield
+    finally:
+        state['pinned'] = previous
+
+
+def primary_pinned_until(request):
+    """Время (unix), до которого клиент должен читать с основной БД"""
+    try:
+        return float(request.COOKIES.get(PRIMARY_COOKIE_NAME, 0))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def sticky_window():
+    return getattr(settings, 'PANTHEON_REPLICA_STICKY_SECONDS', 10)
+
+
+class ReadReplicaRouter:
+    """
+    Маршрутизатор БД для приложения pantheon.
+
+    Реплика для чтения выбирается случайным образом из
+    PANTHEON_READ_REPLICAS один раз на запрос (routing_scope), чтобы
+    страница не смешивала данные реплик с разным отставанием; записи
+    всегда идут в основную БД. После записи
+    клиент на время PANTHEON_REPLICA_STICKY_SECONDS читает с основной БД,
+    чтобы видеть свои изменения (см. ReplicaPinningMiddleware).
+    """
+
+    app_label = 'pantheon'
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != self.app_label:
+            return None
+
+        # Связанные объекты читаем из той же БД, что и исходный объект
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+
+        state = _state()
+        if state['pinned'] or state['wrote']:
+            return DEFAULT_DB_ALIAS
+
+        return _replica(state)
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label != self.app_label:
+            return None
+        # Сам выбор БД для записи ничего не пишет (get_or_create,
+        # select_for_update): флаг записи ставит _track_writes
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        allowed = {DEFAULT_DB_ALIAS, *get_read_replicas()}
+        if obj1._state.db in allowed and obj2._state.db in allowed:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Реплики получают схему через репликацию основной БД
+        if app_label == self.app_label and db in get_read_replicas():
+            return False
+        return None
+
+
+def pin_primary(response):
+    """Выставляет cookie «читать с основной БД» на время окна после записи"""
+    window = sticky_window()
+    response.set_cookie(
+        PRIMARY_COOKIE_NAME,
+        f'{time.time() + window:.3f}',
+        max_age=window,
+        httponly=True,
+        samesite='Lax',
+    )
+    return response
@@ -0,0 +1,40 @@
+# pantheon/signals.py
+from django.dispatch import Signal
+
+# Отправляется после изменения исторических личностей формами, админкой,
+# импортом и массовыми операциями. Аргументы:
+#   before - состояния записей до изменения (figure_state), пусто для создания
+#   after  - состояния после изменения, пусто для удаления
+#   full   - изменено произвольное множество записей (импорт, массовые
+#            операции), обработчики должны пересчитать всё
+figures_changed = Signal()
+
+STATE_FIELDS = (
+    'id', 'article_id', 'city_id', 'occupation_id', 'birth_year', 'historical_popularity_index',
+)
+
+
+def figure_state(figure):
+    """Снимок полей записи, от которых зависят производные данные"""
+    return {field: getattr(figure, field) for field in STATE_FIELDS}
+
+
+def notify_figures_changed(before=(), after=(), full=False):
+    """
+    Оповещает обработчики об изменении исторических личностей. Изменения
+    по before/after записываются в журнал (pantheon.changes); при full
+    журнал пишет тот, кто изменял записи, — только он знает какие.
+    """
+    from .changes import record_states
+    from .models import DataVersion, HistoricalFigure
+
+    before, after = list(before), list(after)
+    if before or after:
+        record_states(before, after)
+    DataVersion.bump()
+    figures_changed.send(
+        sender=HistoricalFigure,
+        before=before,
+        after=after,
+        full=full,
+    )
@@ -0,0 +1,127 @@
+# pantheon/sitemaps.py
+"""
+Карта сайта для страниц личностей: индекс (sitemap.xml) и части по
+PANTHEON_SITEMAP_CHUNK_SIZE адресов (sitemap-<n>.xml).
+
+Границы частей находятся одним проходом по первичному ключу
+(values_list('pk') через iterator), а каждая часть читается диапазоном
+pk по индексу, без OFFSET. Готовые документы хранятся в кэше сжатыми
+gzip с ключом по версии данных, так что после импорта или правки
+карта строится заново, а до этого отдается из кэша.
+"""
+import zlib
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import reverse
+
+from .models import DataVersion, HistoricalFigure
+
+CACHE_PREFIX = 'pantheon:sitemap'
+
+# Не используется как pk: на его место в адресе подставляется настоящий
+_PK_PLACEHOLDER = 987654321
+
+XML_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
+XMLNS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+
+def data_state():
+    """(версия данных личностей, время последнего импорта или правки)"""
+    row = DataVersion.objects.filter(pk=DataVersion.FIGURES).values_list('version', 'updated_at').first()
+    return row or (0, None)
+
+
+def _cache_key(version, base_url, name):
+    return f'{CACHE_PREFIX}:{version}:{base_url}:{name}'
+
+
+def chunk_bounds(chunk_size=None):
+    """[(первый pk, последний pk)] частей карты в порядке pk"""
+    chunk_size = chunk_size or settings.PANTHEON_SITEMAP_CHUNK_SIZE
+    bounds = []
+    pks = HistoricalFigure.objects.order_by('pk').values_list('pk', flat=True)
+    for position, pk in enumerate(pks.iterator(chunk_size=10_000)):
+        if position % chunk_size == 0:
+            bounds.append([pk, pk])
+        else:
+            bounds[-1][1] = pk
+    return [tuple(bound) for bound in bounds]
+
+
+def _lastmod(updated_at):
+    return f'<lastmod>{updated_at.isoformat(timespec="seconds")}</lastmod>' if updated_at else ''
+
+
+def _gzip_lines(lines):
+    """Сжимает документ по строкам, не собирая его целиком в памяти"""
+    compressor = zlib.compressobj(9, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    parts = [compressor.compress(line.encode()) for line in lines]
+    parts.append(compressor.flush())
+    return b''.join(parts)
+
+
+def render_index(base_url, count, updated_at):
+    lastmod = _lastmod(updated_at)
+
+    def lines():
+        yield XML_HEADER
+        yield f'<sitemapindex xmlns="{XMLNS}">\n'
+        for number in range(1, count + 1):
+            location = escape(base_url + reverse('sitemap_chunk', args=[number]))
+            yield f'<sitemap><loc>{location}</loc>{lastmod}</sitemap>\n'
+        yield '</sitemapindex>\n'
+
+    return _gzip_lines(lines())
+
+
+def render_chunk(base_url, first_pk, last_pk):
+    pattern = escape(base_url + reverse('figure_detail', args=[_PK_PLACEHOLDER]))
+    before, after = pattern.split(str(_PK_PLACEHOLDER))
+    pks = HistoricalFigure.objects.filter(pk__gte=first_pk, pk__lte=last_pk).order_by('pk').values_list(
+        'pk', flat=True
+    )
+
+    def lines():
+        yield XML_HEADER
+        yield f'<urlset xmlns="{XMLNS}">\n'
+        for pk in pks.iterator(chunk_size=10_000):
+            yield f'<url><loc>{before}{pk}{after}</loc></url>\n'
+        yield '</urlset>\n'
+
+    return _gzip_lines(lines())
+
+
+def _bounds(version):
+    key = _cache_key(version, '', 'bounds')
+    bounds = cache.get(key)
+    if bounds is None:
+        bounds = chunk_bounds()
+        cache.set(key, bounds, settings.PANTHEON_SITEMAP_TTL)
+    return bounds
+
+
+def get_index(base_url):
+    """Индекс карты сайта (gzip)"""
+    version, updated_at = data_state()
+    key = _cache_key(version, base_url, 'index')
+    document = cache.get(key)
+    if document is None:
+        document = render_index(base_url, len(_bounds(version)), updated_at)
+        cache.set(key, document, settings.PANTHEON_SITEMAP_TTL)
+    return document
+
+
+def get_chunk(base_url, number):
+    """Часть карты с номером number (с 1) в gzip или None, если такой нет"""
+    version, _ = data_state()
+    key = _cache_key(version, base_url, f'chunk:{number}')
+    document = cache.get(key)
+    if document is None:
+        bounds = _bounds(version)
+        if not 1 <= number <= len(bounds):
+            return None
+        document = render_chunk(base_url, *bounds[number - 1])
+        cache.set(key, document, settings.PANTHEON_SITEMAP_TTL)
+    return document
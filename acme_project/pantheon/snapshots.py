@@ -0,0 +1,130 @@
+# pantheon/snapshots.py
+"""
+Снимки метрик личностей (просмотры, средние просмотры, индекс, языки).
+
+Снимок снимается после каждого импорта и пишет в историю (FigureMetric)
+строки только тех личностей, чьи метрики изменились с их последней
+записи; последние значения хранятся отдельно (LatestFigureMetric), так что
+поиск изменений — один JOIN двух таблиц размером с число личностей,
+без просмотра истории. На PostgreSQL история секционирована по месяцам.
+"""
+import datetime
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import FigureMetric, HistoricalFigure, LatestFigureMetric, MetricSnapshot
+
+METRIC_FIELDS = ('page_views', 'average_views', 'historical_popularity_index', 'article_languages')
+
+
+def _month_bounds(day):
+    start = day.replace(day=1)
+    end = (start + datetime.timedelta(days=32)).replace(day=1)
+    return start, end
+
+
+def ensure_partition(day):
+    """Секция истории на месяц day (только PostgreSQL)"""
+    if connection.vendor != 'postgresql':
+        return None
+    table = FigureMetric._meta.db_table
+    start, end = _month_bounds(day)
+    partition = f'{table}_y{start.year}m{start.month:02d}'
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS {quote(partition)} PARTITION OF {quote(table)} '
+            f'FOR VALUES FROM (%s) TO (%s)',
+            [start, end],
+        )
+    return partition
+
+
+def take_snapshot(source='', day=None):
+    """Записывает изменившиеся метрики всех личностей, возвращает MetricSnapshot"""
+    day = day or datetime.date.today()
+    quote = connection.ops.quote_name
+    figures = quote(HistoricalFigure._meta.db_table)
+    history = quote(FigureMetric._meta.db_table)
+    latest = quote(LatestFigureMetric._meta.db_table)
+    columns = ', '.join(quote(field) for field in METRIC_FIELDS)
+    changed = ' OR '.join(f'l.{quote(field)} <> f.{quote(field)}' for field in METRIC_FIELDS)
+
+    with transaction.atomic():
+        snapshot = MetricSnapshot.objects.create(snapshot_date=day, source=source[:255])
+        ensure_partition(day)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {history} (snapshot_id, snapshot_date, figure_id, {columns}) '
+                f'SELECT %s, %s, f.id, {", ".join(f"f.{quote(field)}" for field in METRIC_FIELDS)} '
+                f'FROM {figures} f LEFT JOIN {latest} l ON l.figure_id = f.id '
+                f'WHERE l.figure_id IS NULL OR {changed}',
+                [snapshot.pk, day],
+            )
+            changed_count = cursor.rowcount
+            # snapshot_date в условии — чтобы PostgreSQL читал одну секцию
+            this_snapshot = f'FROM {history} WHERE snapshot_id = %s AND snapshot_date = %s'
+            cursor.execute(
+                f'DELETE FROM {latest} WHERE figure_id IN (SELECT figure_id {this_snapshot})',
+                [snapshot.pk, day],
+            )
+            cursor.execute(
+                f'INSERT INTO {latest} (figure_id, snapshot_id, {columns}) '
+                f'SELECT figure_id, snapshot_id, {columns} {this_snapshot}',
+                [snapshot.pk, day],
+            )
+        snapshot.figure_count = HistoricalFigure.objects.count()
+        snapshot.changed_count = changed_count
+        snapshot.save(update_fields=['figure_count', 'changed_count'])
+    return snapshot
+
+
+def snapshot_after_import(source):
+    """Снимок после импорта, если он включен PANTHEON_METRIC_SNAPSHOTS"""
+    if getattr(settings, 'PANTHEON_METRIC_SNAPSHOTS', False):
+        return take_snapshot(source)
+    return None
+
+
+def figure_trend(figure_id):
+    """
+    Изменения метрик личности по снимкам: [{snapshot_id, snapshot_date,
+    метрики}] в порядке времени. Между точками значения не менялись.
+    """
+    return list(
+        FigureMetric.objects.filter(figure_id=figure_id)
+        .order_by('snapshot_id')
+        .values('snapshot_id', 'snapshot_date', *METRIC_FIELDS)
+    )
+
+
+def top_movers(field='page_views', since=None, limit=20, descending=True):
+    """
+    Личности с наибольшим изменением field после снимка since (по
+    умолчанию — предпоследнего). Возвращает (since, [LatestFigureMetric
+    с previous и delta]) или (None, []), если снимков меньше двух.
+    """
+    if field not in METRIC_FIELDS:
+        raise ValueError(f'Неизвестная метрика: {field}')
+    if since is None:
+        since = MetricSnapshot.objects.order_by('-pk')[1:2].first()
+        if since is None:
+            return None, []
+
+    previous = FigureMetric.objects.filter(
+        figure_id=OuterRef('figure_id'),
+        snapshot_id__lte=since.pk,
+    ).order_by('-snapshot_id').values(field)[:1]
+    delta = F(field) - Coalesce(Subquery(previous), 0, output_field=LatestFigureMetric._meta.get_field(field))
+    movers = LatestFigureMetric.objects.filter(snapshot_id__gt=since.pk).select_related(
+        'figure'
+    ).only(
+        'figure__id', 'figure__full_name', *METRIC_FIELDS
+    ).annotate(
+        previous=Subquery(previous),
+        delta=delta,
+    ).order_by('-delta' if descending else 'delta')
+    return since, list(movers[:limit])
@@ -0,0 +1,63 @@
+# pantheon/staticfiles.py
+"""
+Сборка статики: collectstatic с этим хранилищем пишет в STATIC_ROOT файлы
+с хешем содержимого в имени (style.3f2a9c1b0d4e.css) и рядом их сжатые
+копии (.gz и, если установлен brotli, .br). Отдает их
+PrecompressedStaticMiddleware с заголовком Cache-Control: immutable —
+при изменении файла меняется имя, так что кэш браузера не устаревает.
+"""
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+from .compression import COMPRESSIBLE_EXTENSIONS, MIN_LENGTH, available_encodings, compress
+
+SUFFIXES = {'gzip': '.gz', 'br': '.br'}
+
+
+class PrecompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """ManifestStaticFilesStorage, дополнительно сжимающий файлы с хешем"""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in sorted(set(self.hashed_files.values())):
+            for path in self.compress_file(name):
+                yield name, path, True
+
+    def compress_file(self, name):
+        """Пишет сжатые копии name, если они заметно меньше; возвращает их имена"""
+        if not name.endswith(COMPRESSIBLE_EXTENSIONS):
+            return []
+        with self.open(name) as original:
+            data = original.read()
+        if len(data) < MIN_LENGTH:
+            return []
+        written = []
+        for encoding in available_encodings():
+            compressed = compress(data, encoding, best=True)
+            if len(compressed) >= len(data) * 0.95:
+                continue
+            path = name + SUFFIXES[encoding]
+            if self.exists(path):
+                self.delete(path)
+            self._save(path, ContentFile(compressed))
+            written.append(path)
+        return written
+
+    def is_hashed(self, name):
+        """Имя содержит хеш содержимого (есть среди значений манифеста)"""
+        if not hasattr(self, '_hashed_names'):
+            self._hashed_names = set(self.hashed_files.values())
+        return name in self._hashed_names
+
+
+def find_file(root, name):
+    """Полный путь к файлу name внутри root или None"""
+    path = os.path.realpath(os.path.join(root, name))
+    root = os.path.realpath(root)
+    if os.path.commonpath([root, path]) != root or not os.path.isfile(path):
+        return None
+    return path
@@ -0,0 +1,82 @@
+# pantheon/streaming.py
+"""
+Потоковый вывод Jinja2-шаблонов: страница отдается по мере рендеринга
+(Template.generate) через StreamingHttpResponse, а записи таблицы читаются
+из БД пачками, так что память не зависит от размера страницы.
+"""
+from django.http import StreamingHttpResponse
+from django.middleware.csrf import get_token
+from django.template import engines
+from django.template.backends.utils import csrf_input_lazy, csrf_token_lazy
+
+from . import dimensions
+from .routers import in_routing_scope
+
+# Размер куска ответа (символов): generate() отдает очень мелкие строки
+CHUNK_SIZE = 16 * 1024
+
+# Сколько записей читать из БД и подписывать справочниками за раз
+ROWS_PER_BATCH = 500
+
+
+def _batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_rows(source, start, stop, batch_size=ROWS_PER_BATCH):
+    """
+    Записи source[start:stop] пачками по batch_size: для QuerySet — через
+    iterator(), для FacetResult — срезами. Справочники каждой пачки
+    загружаются одним набором запросов (dimensions.prefetch).
+    """
+    if hasattr(source, 'iterator'):
+        batches = _batched(source[start:stop].iterator(chunk_size=batch_size), batch_size)
+    else:
+        batches = (source[offset:min(offset + batch_size, stop)] for offset in range(start, stop, batch_size))
+    for batch in batches:
+        dimensions.prefetch(batch)
+        yield from batch
+
+
+def _buffered(parts, size=CHUNK_SIZE):
+    buffer = []
+    length = 0
+    for part in parts:
+        buffer.append(part)
+        length += len(part)
+        if length >= size:
+            yield ''.join(buffer)
+            buffer = []
+            length = 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def stream_template(request, template_name, context, using='jinja2'):
+    """
+    Аналог render() для движка Jinja2, возвращающий StreamingHttpResponse.
+    В context можно передавать генераторы — они читаются по ходу вывода.
+    """
+    backend = engines[using]
+    template = backend.get_template(template_name).template
+    context = dict(context)
+    context['request'] = request
+    context['csrf_input'] = csrf_input_lazy(request)
+    context['csrf_token'] = csrf_token_lazy(request)
+    for context_processor in backend.template_context_processors:
+        context.update(context_processor(request))
+    # Cookie CSRF выставляется до отправки заголовков, а не при выводе формы
+    get_token(request)
+    # Шаблон выводится уже после выхода из представления: его запросы
+    # должны идти в ту же БД, что и запросы самого представления
+    return StreamingHttpResponse(
+        in_routing_scope(_buffered(template.generate(context))),
+        content_type='text/html; charset=utf-8',
+    )
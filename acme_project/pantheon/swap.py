@@ -0,0 +1,412 @@
+# pantheon/swap.py
+"""
+Полная перезагрузка данных без простоя.
+
+Данные грузятся в теневые копии таблиц стран, профессий, городов и личностей,
+индексы строятся после загрузки, затем одной транзакцией живые таблицы
+переименовываются в старые, теневые — в живые, старые удаляются. Читатели
+видят либо прежний набор данных, либо новый целиком.
+
+Таблицы, ссылающиеся на эти четыре, не должны иметь ограничений внешнего
+ключа в БД (db_constraint=False), иначе замена их оборвет.
+"""
+import os
+import secrets
+from collections import defaultdict
+
+from django.apps.registry import Apps
+from django.core.management.color import no_style
+from django.db import connection, models
+from django.db.models import Max
+
+from . import dimensions
+from .changes import record_changes
+from .importer import UPDATE_FIELDS, CsvImporter, import_csv
+from .models import City, Country, HistoricalFigure, Occupation
+from .ranks import distinct_sql
+from .resolution import DimensionResolver
+from .signals import notify_figures_changed
+from .snapshots import snapshot_after_import
+
+# Зависимости по внешним ключам идут раньше зависимых таблиц
+SWAP_MODELS = (Country, Occupation, City, HistoricalFigure)
+
+SHADOW_MARKER = '__sh_'
+OLD_MARKER = '__old_'
+
+DEFAULT_MIN_RATIO = 0.5
+
+
+class SwapError(Exception):
+    pass
+
+
+def _table(model, marker, token):
+    return f'{model._meta.db_table}{marker}{token}'
+
+
+def _shadow_index(index, token):
+    shadow = index.clone()
+    shadow.name = f'{index.name[:22]}_{token}'
+    return shadow
+
+
+def _clone_field(field, shadow_models):
+    """Копия поля без индексов и уникальности: они строятся после загрузки"""
+    name, path, args, kwargs = field.deconstruct()
+    if field.remote_field is not None:
+        kwargs['to'] = shadow_models[field.related_model]
+        kwargs['related_name'] = '+'
+        kwargs['db_index'] = False
+    elif not field.primary_key:
+        kwargs.pop('unique', None)
+        kwargs.pop('db_index', None)
+    return field.__class__(*args, **kwargs)
+
+
+def _mirror_model(model, registry):
+    """Неуправляемая копия модели вне замены (например, словаря строк) для ссылок"""
+    meta = type('Meta', (), {
+        'app_label': model._meta.app_label,
+        'db_table': model._meta.db_table,
+        'managed': False,
+        'apps': registry,
+    })
+    attrs = {'__module__': __name__, 'Meta': meta}
+    for field in model._meta.local_fields:
+        attrs[field.name] = field.clone()
+    return type(f'{model.__name__}Mirror', (models.Model,), attrs)
+
+
+def build_shadow_models(token):
+    """Модели теневых таблиц в отдельном реестре (не видны миграциям)"""
+    registry = Apps(installed_apps=())
+    shadow = {}
+    for model in SWAP_MODELS:
+        for field in model._meta.local_fields:
+            related = field.related_model
+            if related is not None and related not in SWAP_MODELS and related not in shadow:
+                shadow[related] = _mirror_model(related, registry)
+    for model in SWAP_MODELS:
+        meta = type('Meta', (), {
+            'app_label': model._meta.app_label,
+            'db_table': _table(model, SHADOW_MARKER, token),
+            'apps': registry,
+        })
+        attrs = {'__module__': __name__, 'Meta': meta}
+        for field in model._meta.local_fields:
+            attrs[field.name] = _clone_field(field, shadow)
+        shadow[model] = type(f'{model.__name__}Shadow', (models.Model,), attrs)
+    return shadow
+
+
+class ShadowImporter(CsvImporter):
+    """
+    Импорт в пустые теневые таблицы.
+
+    Сохраняет id существующих записей (по названию и article_id), чтобы
+    адреса страниц и ссылки из вспомогательных таблиц не менялись. Поиск
+    существующих строк не нужен: кэш импорта знает все вставленное.
+    """
+
+    def __init__(self, shadow, **options):
+        options.pop('update_existing', None)
+        super().__init__(**options)
+        self.country_model = shadow[Country]
+        self.city_model = shadow[City]
+        self.occupation_model = shadow[Occupation]
+        self.figure_model = shadow[HistoricalFigure]
+        self.live_models = {shadow_model: model for model, shadow_model in shadow.items()}
+        if self.resolver is not None:
+            self.resolver = DimensionResolver(self.city_model, self.occupation_model)
+
+        self.live_ids = {
+            Country: dict(Country.objects.values_list('name', 'id')),
+            Occupation: dict(Occupation.objects.values_list('name', 'id')),
+            City: {
+                (name, country_id): pk
+                for pk, name, country_id in City.objects.values_list('id', 'name', 'country_id')
+            },
+            HistoricalFigure: dict(HistoricalFigure.objects.values_list('article_id', 'id')),
+        }
+        self.next_ids = {
+            model: (model.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+            for model in SWAP_MODELS
+        }
+        self.seen_articles = set()
+
+    def allocate_id(self, model, key):
+        pk = self.live_ids[model].get(key)
+        if pk is None:
+            pk = self.next_ids[model]
+            self.next_ids[model] += 1
+        return pk
+
+    def get_or_create(self, model, key, lookup, defaults):
+        obj = model(pk=self.allocate_id(self.live_models[model], key), **lookup, **defaults)
+        obj.save(force_insert=True)
+        return obj
+
+    def known(self, model, key):
+        # В теневых таблицах только то, что уже есть в кэше импорта
+        return False
+
+    def build_figure(self, row):
+        figure = super().build_figure(row)
+        figure.pk = self.allocate_id(HistoricalFigure, figure.article_id)
+        return figure
+
+    def existing_figures(self, article_ids):
+        # Повторы article_id в файле пропускаются
+        duplicates = {article_id: None for article_id in article_ids if article_id in self.seen_articles}
+        self.seen_articles.update(article_ids)
+        return duplicates
+
+    def record_changes(self, new, changed):
+        # Журнал пишется после замены по сравнению таблиц (diff_shadow)
+        pass
+
+    def finish(self):
+        # Производные данные пересчитываются после замены таблиц
+        pass
+
+
+def drop_stale_tables():
+    """Удаляет теневые и старые таблицы, оставшиеся от прерванных запусков"""
+    tables = connection.introspection.table_names()
+    stale = [
+        table
+        for model in reversed(SWAP_MODELS)
+        for table in tables
+        if table.startswith(model._meta.db_table + SHADOW_MARKER)
+        or table.startswith(model._meta.db_table + OLD_MARKER)
+    ]
+    with connection.schema_editor() as editor:
+        for table in stale:
+            editor.execute(editor.sql_delete_table % {'table': editor.quote_name(table)})
+    return stale
+
+
+def create_shadow_tables(shadow):
+    with connection.schema_editor() as editor:
+        for model in SWAP_MODELS:
+            editor.create_model(shadow[model])
+
+
+def drop_shadow_tables(shadow):
+    with connection.schema_editor() as editor:
+        for model in reversed(SWAP_MODELS):
+            editor.delete_model(shadow[model])
+
+
+def _field_index_names(editor, model, table):
+    """
+    Имена индексов полей и ограничений unique_together модели (кроме
+    Meta.indexes) для таблицы table — те, что дает им Django, в порядке
+    build_shadow_indexes
+    """
+    names = []
+    for field in model._meta.local_fields:
+        if field.primary_key or not (field.unique or field.db_index):
+            continue
+        names.append(editor._create_index_name(table, [field.column], suffix='_uniq' if field.unique else ''))
+        if hasattr(editor, '_create_like_index_sql') and editor._create_like_index_sql(model, field) is not None:
+            names.append(editor._create_index_name(table, [field.column], suffix='_like'))
+    for fields in model._meta.unique_together:
+        columns = [model._meta.get_field(name).column for name in fields]
+        names.append(editor._create_index_name(table, columns, suffix='_uniq'))
+    return names
+
+
+def build_shadow_indexes(shadow, token):
+    """Уникальные ограничения и индексы теневых таблиц — после загрузки"""
+    with connection.schema_editor() as editor:
+        for model in SWAP_MODELS:
+            target = shadow[model]
+            for field in model._meta.local_fields:
+                if field.primary_key:
+                    continue
+                shadow_field = target._meta.get_field(field.name)
+                if field.unique:
+                    editor.execute(editor._create_unique_sql(target, [shadow_field]))
+                elif field.db_index:
+                    editor.execute(editor._create_index_sql(target, fields=[shadow_field]))
+                if (field.unique or field.db_index) and hasattr(editor, '_create_like_index_sql'):
+                    # PostgreSQL: индекс varchar_pattern_ops для LIKE, как у живой таблицы
+                    like_index = editor._create_like_index_sql(target, field)
+                    if like_index is not None:
+                        editor.execute(like_index)
+            for fields in model._meta.unique_together:
+                editor.execute(editor._create_unique_sql(
+                    target, [target._meta.get_field(name) for name in fields]
+                ))
+            for index in model._meta.indexes:
+                editor.add_index(target, _shadow_index(index, token))
+
+
+def _rename_index(editor, model, old_name, new_name):
+    if editor.connection.features.can_rename_index:
+        editor.execute(editor._rename_index_sql(model, old_name, new_name))
+        return
+    # SQLite: индекс пересоздается под новым именем по своему же определению
+    with editor.connection.cursor() as cursor:
+        cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'index' AND name = %s", [old_name])
+        sql, = cursor.fetchone()
+    editor.execute(editor.sql_delete_index % {'name': editor.quote_name(old_name)})
+    editor.execute(sql.replace(editor.quote_name(old_name), editor.quote_name(new_name), 1))
+
+
+def _constraint_names(model):
+    """
+    Имена ограничений таблицы модели: {(вид, колонки, ссылка): имя}.
+    PostgreSQL и Django строят их из имени таблицы, поэтому у теневой
+    таблицы они другие; уникальность поля, созданная миграцией вместе с
+    таблицей, к тому же называется иначе, чем добавленная потом (_key и _uniq)
+    """
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+    names = defaultdict(list)
+    for name, constraint in constraints.items():
+        # Первичный ключ тоже уникален: вид — первый подходящий
+        kind = next(
+            (kind for kind in ('primary_key', 'foreign_key', 'unique', 'check') if constraint[kind]), None
+        )
+        if kind is not None:
+            reference = constraint['foreign_key'] if kind == 'foreign_key' else None
+            names[(kind, tuple(constraint['columns'] or ()), reference)].append(name)
+    # Неоднозначные (например, две проверки одной колонки) не переименовываются
+    return {key: found[0] for key, found in names.items() if len(found) == 1}
+
+
+def _rename_constraints(editor, model, live_names):
+    if editor.connection.vendor != 'postgresql':
+        # SQLite эти ограничения не именует: они часть определения таблицы
+        return
+    table = editor.quote_name(model._meta.db_table)
+    for key, name in _constraint_names(model).items():
+        live_name = live_names.get(key)
+        if live_name and live_name != name:
+            editor.execute(
+                f'ALTER TABLE {table} RENAME CONSTRAINT {editor.quote_name(name)} '
+                f'TO {editor.quote_name(live_name)}'
+            )
+
+
+def validate_shadow(shadow, stats, min_ratio=DEFAULT_MIN_RATIO):
+    """Проверка количества строк перед заменой"""
+    loaded = shadow[HistoricalFigure].objects.count()
+    if loaded != stats['created']:
+        raise SwapError(f'В теневой таблице {loaded} записей, импорт сообщил о {stats["created"]}')
+    if not loaded:
+        raise SwapError('Файл не содержит ни одной записи')
+
+    live = HistoricalFigure.objects.count()
+    if live and loaded < live * min_ratio:
+        raise SwapError(
+            f'Новый набор ({loaded}) меньше {min_ratio:.0%} текущего ({live}), '
+            f'замена отменена'
+        )
+    return loaded
+
+
+def diff_shadow(shadow):
+    """
+    Изменения личностей новой загрузки относительно живой таблицы для
+    журнала (pantheon.changes): (добавленные, измененные, удаленные) —
+    списки (id, article_id). ShadowImporter сохраняет id по article_id,
+    поэтому строки сопоставляются по id. Вызывается в транзакции замены
+    (swap_in), чтобы между сравнением и заменой в живую таблицу ничего
+    не записали.
+    """
+    quote = connection.ops.quote_name
+    live = quote(HistoricalFigure._meta.db_table)
+    new = quote(shadow[HistoricalFigure]._meta.db_table)
+    pk, article_id = quote('id'), quote('article_id')
+    differs = ' OR '.join(
+        distinct_sql(f'l.{quote(column)}', f'n.{quote(column)}')
+        for column in (HistoricalFigure._meta.get_field(name).column for name in UPDATE_FIELDS)
+    )
+    queries = (
+        f'SELECT n.{pk}, n.{article_id} FROM {new} n LEFT JOIN {live} l ON l.{pk} = n.{pk} '
+        f'WHERE l.{pk} IS NULL',
+        f'SELECT n.{pk}, n.{article_id} FROM {new} n JOIN {live} l ON l.{pk} = n.{pk} WHERE {differs}',
+        f'SELECT l.{pk}, l.{article_id} FROM {live} l LEFT JOIN {new} n ON n.{pk} = l.{pk} '
+        f'WHERE n.{pk} IS NULL',
+    )
+    changes = []
+    with connection.cursor() as cursor:
+        for sql in queries:
+            cursor.execute(sql)
+            changes.append(cursor.fetchall())
+    return tuple(changes)
+
+
+def _lock_live_tables(editor):
+    """
+    PostgreSQL: запрещает запись в живые таблицы до конца транзакции,
+    чтение продолжается. SQLite блокировку на запись берет сам: транзакция,
+    читавшая таблицы, не зафиксирует замену поверх чужой записи, а
+    завершится ошибкой «database is locked».
+    """
+    if editor.connection.vendor != 'postgresql':
+        return
+    tables = ', '.join(editor.quote_name(model._meta.db_table) for model in SWAP_MODELS)
+    editor.execute(f'LOCK TABLE {tables} IN EXCLUSIVE MODE')
+
+
+def swap_in(shadow, token):
+    """
+    Атомарная замена живых таблиц теневыми (одна короткая транзакция).
+    Возвращает изменения для журнала (diff_shadow), посчитанные под той же
+    блокировкой: правка, сохраненная во время загрузки, в журнал попадет,
+    а после сравнения ее уже не сохранить.
+    """
+    with connection.schema_editor(atomic=True) as editor:
+        _lock_live_tables(editor)
+        changes = diff_shadow(shadow)
+        live_names = {model: _constraint_names(model) for model in SWAP_MODELS}
+        for model in SWAP_MODELS:
+            table = model._meta.db_table
+            editor.alter_db_table(model, table, _table(model, OLD_MARKER, token))
+            editor.alter_db_table(shadow[model], shadow[model]._meta.db_table, table)
+        for model in reversed(SWAP_MODELS):
+            old_table = editor.quote_name(_table(model, OLD_MARKER, token))
+            editor.execute(editor.sql_delete_table % {'table': old_table})
+        # Индексы и ограничения получают имена живых таблиц, под которыми
+        # их ищут последующие миграции
+        for model in SWAP_MODELS:
+            for index in model._meta.indexes:
+                editor.rename_index(model, _shadow_index(index, token), index)
+            for old_name, new_name in zip(
+                _field_index_names(editor, model, shadow[model]._meta.db_table),
+                _field_index_names(editor, model, model._meta.db_table),
+            ):
+                _rename_index(editor, model, old_name, new_name)
+            _rename_constraints(editor, model, live_names[model])
+
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), SWAP_MODELS):
+            cursor.execute(sql)
+    return changes
+
+
+def import_with_swap(path, min_ratio=DEFAULT_MIN_RATIO, **options):
+    """Загрузка CSV в теневые таблицы и атомарная замена. Возвращает статистику"""
+    drop_stale_tables()
+    token = secrets.token_hex(3)
+    shadow = build_shadow_models(token)
+    create_shadow_tables(shadow)
+    try:
+        stats = import_csv(path, importer_class=ShadowImporter, shadow=shadow, **options)
+        build_shadow_indexes(shadow, token)
+        validate_shadow(shadow, stats, min_ratio)
+        changes = swap_in(shadow, token)
+    except BaseException:
+        drop_shadow_tables(shadow)
+        raise
+
+    dimensions.invalidate()
+    record_changes(*changes)
+    notify_figures_changed(full=True)
+    snapshot_after_import(os.path.basename(path))
+    return stats
@@ -1,3 +1,1696 @@
-from django.test import TestCase
+# pantheon/tests.py
+import datetime
+import gzip
+import io
+import json
+import os
+import re
+import tempfile
+import time
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, IntegrityError, connection, connections, transaction
+from django.db.models import Avg, Count, F, Max, Q, Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from . import compression, dimensions, facets
+from .aggregates import refresh_aggregates
+from .api import DEFAULT_FIELDS, get_figures
+from .bulk import (
+    build_changes, bulk_delete_figures, bulk_update_figures, filter_figures, preview_count,
+)
+from .changes import DELETE, RESET, UPSERT, iter_feed, latest_sequence, needs_reset, prune_changes
+from .compression import compress
+from .cube import Pivot, refresh_cube
+from .facets import FacetIndex, FacetResult
+from .forms import HistoricalFigureForm
+from .hpi import (
+    calibrate_hpi, hpi_base, hpi_base_expression, load_columns, numpy_available, recompute_hpi, write_back,
+)
+from .importer import CsvImporter
+from .jobs import claim_next_job, enqueue_upload, fail_stale_jobs, run_job
+from .models import (
+    City, Country, CubeCell, FigureChange, FigureMetric, HistoricalFigure, ImportJob, InternedString,
+    LatestFigureMetric, MetricSnapshot, Occupation, RequestProfile, TimelineBucket,
+)
+from .ranks import refresh_ranks
+from .related import _similarity, build_related_index, compute_neighbors, related_figures
+from .resolution import CityIndex, OccupationIndex, find_duplicates, merge_duplicates, normalize_name
+from .routers import PRIMARY_COOKIE_NAME, ReadReplicaRouter, routing_scope, use_primary
+from .signals import figure_state, notify_figures_changed
+from .sitemaps import chunk_bounds
+from .snapshots import figure_trend, take_snapshot, top_movers
+from .swap import OLD_MARKER, SHADOW_MARKER, SWAP_MODELS, SwapError, build_shadow_indexes, import_with_swap
+from .timeline import refresh_timeline
+from .views import _statistics_totals
+
+CSV_HEADER = (
+    'article_id,full_name,sex,birth_year,city,state,country,continent,latitude,longitude,'
+    'occupation,industry,domain,article_languages,page_views,average_views,'
+    'historical_popularity_index\n'
+)
+
+# Небольшой набор: два континента, три домена, город с несколькими личностями
+FIGURES_CSV = CSV_HEADER + (
+    '308,Aristotle,Male,-384,Stageira,,Greece,Europe,40.33333,23.5,'
+    'Philosopher,Philosophy,Humanities,152,56355172,370758,31.9938\n'
+    '22954,Plato,Male,-427,Athens,,Greece,Europe,37.96667,23.71667,'
+    'Philosopher,Philosophy,Humanities,142,46812003,329662,31.9888\n'
+    '26825,Socrates,Male,-469,Athens,,Greece,Europe,37.96667,23.71667,'
+    'Philosopher,Philosophy,Humanities,137,42001224,306578,31.6\n'
+    '9418,Euclid,Male,-325,Alexandria,,Egypt,Africa,31.2,29.91667,'
+    'Mathematician,Math,Science,96,12180337,126878,28.1\n'
+    '14343,Hypatia,Female,370,Alexandria,,Egypt,Africa,31.2,29.91667,'
+    'Mathematician,Math,Science,72,7604025,105611,25.4\n'
+    '6385,Cleopatra,Female,-69,Alexandria,,Egypt,Africa,31.2,29.91667,'
+    'Politician,Government,Institutions,120,33214765,276789,27.5\n'
+    '1844,Archimedes,Male,-287,Syracuse,,Italy,Europe,37.08333,15.28333,'
+    'Mathematician,Math,Science,110,20345674,184961,29.4\n'
+    '24403,Pericles,Male,-495,Athens,,Greece,Europe,37.96667,23.71667,'
+    'Politician,Government,Institutions,77,6432155,83534,26.7\n'
+)
+
+
+def import_text(text, **options):
+    """Импорт CSV из строки, возвращает статистику"""
+    return CsvImporter(**options).run(io.StringIO(text))
+
+
+def reset_process_caches():
+    # Кэши процесса переживают откат транзакции теста
+    with InternedString._lock:
+        InternedString._values.clear()
+        InternedString._ids.clear()
+        InternedString._loaded_up_to = 0
+    dimensions.invalidate()
+    # Версии данных откатываются вместе с тестом и повторяются
+    facets._index = None
+
+
+class PantheonTestCase(TestCase):
+    """Тест на наборе FIGURES_CSV"""
+
+    def setUp(self):
+        reset_process_caches()
+        # Как после фиксации пачек импорта: сброс кэша справочников и т.п.
+        with self.captureOnCommitCallbacks(execute=True):
+            import_text(FIGURES_CSV)
+
+    def figure(self, name):
+        return HistoricalFigure.objects.get(full_name=name)
+
+    def assertAggregatesMatch(self):
+        """Денормализованные агрегаты равны посчитанным по личностям"""
+        for model, key in ((City, 'city'), (Occupation, 'occupation'), (Country, 'city__country')):
+            expected = {
+                row[key]: (row['count'], row['total'], row['best'])
+                for row in HistoricalFigure.objects.values(key).annotate(
+                    count=Count('pk'),
+                    total=Sum('historical_popularity_index'),
+                    best=Max('historical_popularity_index'),
+                )
+            }
+            for obj in model.objects.all():
+                count, total, best = expected.get(obj.pk, (0, 0, 0))
+                self.assertEqual(
+                    (obj.figure_count, obj.popularity_sum, obj.max_popularity),
+                    (count, Decimal(total), Decimal(best)),
+                    obj,
+                )
+
+    def edit(self, figure, **changes):
+        """Правка личности через форму редактирования"""
+        data = {
+            field: value
+            for field, value in {**HistoricalFigureForm(instance=figure).initial, **changes}.items()
+            if value is not None
+        }
+        response = self.client.post(f'/figures/{figure.pk}/edit/', data)
+        self.assertEqual(response.status_code, 302)
+        figure.refresh_from_db()
+        return figure
+
+
+class ReplicaTestMixin:
+    """
+    Реплики из REPLICAS — псевдонимы соединения default (как TEST MIRROR):
+    данные те же, а маршрутизатор работает как с настоящими репликами.
+    Выбранные им БД для чтения таблиц pantheon собираются в self.reads.
+    """
+
+    REPLICAS = ['replica1']
+
+    def setUp(self):
+        super().setUp()
+        databases = {alias: settings.DATABASES[DEFAULT_DB_ALIAS] for alias in self.REPLICAS}
+        patcher = mock.patch.dict(settings.DATABASES, databases)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        replicas = override_settings(PANTHEON_READ_REPLICAS=self.REPLICAS)
+        replicas.enable()
+        self.addCleanup(replicas.disable)
+        for alias in self.REPLICAS:
+            connections[alias] = connections[DEFAULT_DB_ALIAS]
+            self.addCleanup(connections.__delitem__, alias)
+
+        self.reads = []
+        db_for_read = ReadReplicaRouter.db_for_read
+
+        def record(router, model, **hints):
+            alias = db_for_read(router, model, **hints)
+            if alias is not None:
+                self.reads.append(alias)
+            return alias
+
+        patcher = mock.patch.object(ReadReplicaRouter, 'db_for_read', record)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def pin_client(self):
+        """Cookie клиента, недавно писавшего в БД"""
+        self.client.cookies[PRIMARY_COOKIE_NAME] = f'{time.time() + 60:.3f}'
+
+
+class InternedStringTests(TestCase):
+    def setUp(self):
+        reset_process_caches()
+
+    def intern_rolled_back(self, value):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    pk = InternedString.id_for(value)
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        return pk
+
+    def test_rollback_not_cached(self):
+        pk = self.intern_rolled_back('Stageira')
+        self.assertNotIn('Stageira', InternedString._ids)
+        self.assertNotIn(pk, InternedString._values)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            figure = HistoricalFigure.objects.create(article_id=308, full_name='Aristotle')
+            figure.original_city_name = 'Stageira'
+            figure.save()
+        self.assertTrue(InternedString.objects.filter(pk=figure.original_city_id, value='Stageira').exists())
+        self.assertEqual(HistoricalFigure.objects.get(pk=figure.pk).original_city_name, 'Stageira')
+
+    def test_assignment_interned_on_save(self):
+        figure = HistoricalFigure(article_id=308, full_name='Aristotle')
+        with self.assertNumQueries(0):
+            figure.original_city_name = 'Stageira'
+            figure.original_country_name = ''
+            self.assertEqual(figure.original_city_name, 'Stageira')
+        self.assertFalse(InternedString.objects.filter(value='Stageira').exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            figure.save()
+        self.assertEqual(InternedString.objects.get(pk=figure.original_city_id).value, 'Stageira')
+        self.assertIsNone(figure.original_country_id)
+        self.assertEqual(HistoricalFigure.objects.get(pk=figure.pk).original_city_name, 'Stageira')
+
+    def test_intern_names_batched(self):
+        figures = [
+            HistoricalFigure(article_id=308, full_name='Aristotle'),
+            HistoricalFigure(article_id=22954, full_name='Plato'),
+        ]
+        figures[0].original_city_name = 'Stageira'
+        figures[1].original_city_name = 'Athens'
+        figures[1].original_country_name = 'Greece'
+        with mock.patch.object(InternedString, 'intern', wraps=InternedString.intern) as intern:
+            HistoricalFigure.intern_names(figures)
+        self.assertEqual(intern.call_count, 1)
+        HistoricalFigure.objects.bulk_create(figures)
+        names = {
+            figure.full_name: (figure.original_city_name, figure.original_country_name)
+            for figure in HistoricalFigure.objects.all()
+        }
+        self.assertEqual(names, {'Aristotle': ('Stageira', ''), 'Plato': ('Athens', 'Greece')})
+
+    def test_text_of_rolled_back_id(self):
+        pk = self.intern_rolled_back('Stageira')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(InternedString.text(pk), '')
+        self.assertEqual(InternedString._loaded_up_to, 0)
+
+    def test_committed_strings_cached(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ids = InternedString.intern(['Athens', 'Greece', ''])
+        self.assertEqual(set(ids), {'Athens', 'Greece'})
+        with self.assertNumQueries(0):
+            self.assertEqual(InternedString.intern(['Athens']), {'Athens': ids['Athens']})
+            self.assertEqual(InternedString.text(ids['Greece']), 'Greece')
+            self.assertEqual(InternedString.text(None), '')
+
+    def test_text_loads_tail(self):
+        first, second = InternedString.objects.bulk_create(
+            [InternedString(value='Athens'), InternedString(value='Greece')]
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(InternedString.text(first.pk), 'Athens')
+        with self.assertNumQueries(0):
+            self.assertEqual(InternedString.text(second.pk), 'Greece')
+
+
+class DimensionCacheTests(PantheonTestCase):
+    def test_prefetch_serves_labels(self):
+        reset_process_caches()
+        figures = list(HistoricalFigure.objects.all())
+        dimensions.prefetch(figures)
+        with self.assertNumQueries(0):
+            labels = {
+                figure.full_name: (
+                    dimensions.city_label(figure.city_id), dimensions.occupation_name(figure.occupation_id)
+                )
+                for figure in figures
+            }
+        self.assertEqual(labels['Plato'], ('Athens, Greece', 'Philosopher'))
+        self.assertEqual(labels['Cleopatra'], ('Alexandria, Egypt', 'Politician'))
+        self.assertEqual(dimensions.city_label(None), '')
+
+    def test_lookup_by_key(self):
+        greece = Country.objects.get(name='Greece')
+        athens = City.objects.get(name='Athens')
+        dimensions.preload()
+        with self.assertNumQueries(0):
+            self.assertEqual(dimensions.lookup_id(Country, 'Greece'), greece.pk)
+            self.assertEqual(dimensions.lookup_id(City, ('Athens', greece.pk)), athens.pk)
+            self.assertIsNone(dimensions.lookup_id(City, ('Athens', greece.pk + 100)))
+            self.assertIsNone(dimensions.lookup_id(Occupation, 'Astronomer'))
+
+    def test_choices_sorted_by_label(self):
+        labels = [label for _, label in dimensions.choices(City)]
+        self.assertEqual(labels, sorted(labels))
+        self.assertIn('Syracuse, Italy', labels)
+
+
+# Сброс кэша справочников — после настоящей фиксации транзакции
+class DimensionInvalidationTests(TransactionTestCase):
+    def setUp(self):
+        reset_process_caches()
+        import_text(FIGURES_CSV)
+
+    def test_changes_visible_after_commit(self):
+        greece = Country.objects.get(name='Greece')
+        dimensions.preload()
+        with transaction.atomic():
+            city = City.objects.create(name='Delphi', country=greece)
+            greece.name = 'Hellas'
+            greece.save()
+            HistoricalFigure.objects.filter(full_name='Aristotle').delete()
+            City.objects.get(name='Stageira').delete()
+        self.assertEqual(dimensions.lookup_id(City, ('Delphi', greece.pk)), city.pk)
+        self.assertEqual(dimensions.city_label(city.pk), 'Delphi, Hellas')
+        self.assertIsNone(dimensions.lookup_id(City, ('Stageira', greece.pk)))
+
+
+class AggregatesTests(PantheonTestCase):
+    def test_import_fills_aggregates(self):
+        self.assertAggregatesMatch()
+        athens = City.objects.get(name='Athens')
+        self.assertEqual(athens.figure_count, 3)
+        self.assertEqual(athens.avg_popularity, Decimal('30.0963'))
+
+    def test_edit_moves_figure_between_cities(self):
+        plato = self.figure('Plato')
+        before = figure_state(plato)
+        plato.city = City.objects.get(name='Syracuse')
+        plato.save()
+        notify_figures_changed(before=[before], after=[figure_state(plato)])
+        self.assertAggregatesMatch()
+        self.assertEqual(City.objects.get(name='Athens').figure_count, 2)
+
+    def test_delete_empties_occupation(self):
+        figures = HistoricalFigure.objects.filter(occupation__name='Politician')
+        before = [figure_state(figure) for figure in figures]
+        figures.delete()
+        notify_figures_changed(before=before)
+        self.assertAggregatesMatch()
+        self.assertEqual(Occupation.objects.get(name='Politician').figure_count, 0)
+
+    def test_partial_refresh_leaves_other_records(self):
+        City.objects.update(figure_count=0)
+        refresh_aggregates(city_ids=[City.objects.get(name='Athens').pk], occupation_ids=[])
+        self.assertEqual(City.objects.get(name='Athens').figure_count, 3)
+        self.assertEqual(City.objects.get(name='Alexandria').figure_count, 0)
+
+
+class RelatedTests(PantheonTestCase):
+    def related(self, name):
+        figure = HistoricalFigure.objects.select_related('related_index').get(full_name=name)
+        return [other.full_name for other in related_figures(figure)]
+
+    def test_index_covers_all_figures(self):
+        self.assertEqual(build_related_index(top_k=3), 8)
+        for figure in HistoricalFigure.objects.select_related('related_index'):
+            ids = figure.related_index.ids
+            self.assertEqual(len(ids), 3)
+            self.assertNotIn(figure.pk, ids)
+
+    def test_same_city_and_occupation_first(self):
+        build_related_index(top_k=3)
+        self.assertEqual(self.related('Plato')[:2], ['Socrates', 'Aristotle'])
+
+    def test_deleted_neighbors_skipped(self):
+        build_related_index(top_k=3)
+        self.figure('Socrates').delete()
+        self.assertNotIn('Socrates', self.related('Plato'))
+        self.assertEqual(len(self.related('Plato')), 2)
+
+    def test_without_index(self):
+        self.assertEqual(self.related('Plato'), [])
+
+    def test_full_window_matches_full_search(self):
+        rows = [
+            {
+                'id': figure.pk, 'city_id': figure.city_id, 'occupation_id': figure.occupation_id,
+                'birth_year': figure.birth_year, 'hpi': float(figure.historical_popularity_index),
+            }
+            for figure in HistoricalFigure.objects.all()
+        ]
+        figures = {row['id']: row for row in rows}
+        for figure_id, neighbors in compute_neighbors(rows, top_k=4, window=len(rows)):
+            expected = sorted(
+                (other for other in figures if other != figure_id),
+                key=lambda other: (-_similarity(figures[figure_id], figures[other]), other),
+            )
+            self.assertEqual(neighbors, expected[:4])
+
+
+class ImportJobTests(TestCase):
+    def setUp(self):
+        reset_process_caches()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(PANTHEON_IMPORT_DIR=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def upload(self, text, name='figures.csv', **options):
+        return enqueue_upload(SimpleUploadedFile(name, text.encode('utf-8')), **options)
+
+    def test_upload_saved_to_import_dir(self):
+        job = self.upload(FIGURES_CSV, name='../figures.csv')
+        self.assertEqual(job.status, ImportJob.STATUS_PENDING)
+        self.assertEqual(job.original_name, 'figures.csv')
+        self.assertEqual(job.file_size, len(FIGURES_CSV.encode('utf-8')))
+        with open(job.file_path, encoding='utf-8') as file:
+            self.assertEqual(file.read(), FIGURES_CSV)
+
+    def test_claim_oldest_once(self):
+        first = self.upload(FIGURES_CSV)
+        second = self.upload(FIGURES_CSV)
+        ImportJob.objects.filter(pk=second.pk).update(created_at=F('created_at') + datetime.timedelta(seconds=1))
+        self.assertEqual(claim_next_job().pk, first.pk)
+        self.assertEqual(claim_next_job().pk, second.pk)
+        self.assertIsNone(claim_next_job())
+        first.refresh_from_db()
+        self.assertEqual(first.status, ImportJob.STATUS_RUNNING)
+        self.assertIsNotNone(first.started_at)
+
+    def test_run_records_counts(self):
+        self.upload(FIGURES_CSV)
+        job = run_job(claim_next_job())
+        self.assertEqual(job.status, ImportJob.STATUS_DONE)
+        self.assertEqual((job.rows_processed, job.created_count, job.error_count), (8, 8, 0))
+
+        broken = FIGURES_CSV + ',No article id,Male,1900,,,,,,,,,,1,1,1,1\n'
+        self.upload(broken, update_existing=True)
+        job = run_job(claim_next_job())
+        self.assertEqual((job.created_count, job.updated_count, job.error_count), (0, 0, 1))
+        self.assertIn('article_id', job.errors)
+        self.assertEqual(HistoricalFigure.objects.count(), 8)
+
+    def test_finished_job_removes_upload(self):
+        job = self.upload(FIGURES_CSV)
+        run_job(claim_next_job())
+        self.assertFalse(os.path.exists(job.file_path))
+
+        job = self.upload(FIGURES_CSV)
+        with mock.patch('pantheon.jobs.import_csv', side_effect=ValueError('boom')):
+            with self.assertRaises(ValueError):
+                run_job(claim_next_job())
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImportJob.STATUS_FAILED)
+        self.assertFalse(os.path.exists(job.file_path))
+
+    @override_settings(PANTHEON_IMPORT_JOB_TIMEOUT=60)
+    def test_stale_job_failed(self):
+        stale = self.upload(FIGURES_CSV)
+        self.assertEqual(claim_next_job().pk, stale.pk)
+        fresh = self.upload(FIGURES_CSV)
+        ImportJob.objects.filter(pk=stale.pk).update(
+            heartbeat_at=F('heartbeat_at') - datetime.timedelta(seconds=61)
+        )
+
+        self.assertEqual(claim_next_job().pk, fresh.pk)
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, ImportJob.STATUS_FAILED)
+        self.assertIsNotNone(stale.finished_at)
+        self.assertFalse(os.path.exists(stale.file_path))
+
+        # Задача с недавним откликом остается за своим воркером
+        self.assertEqual(fail_stale_jobs(), [])
+        fresh.refresh_from_db()
+        self.assertEqual(fresh.status, ImportJob.STATUS_RUNNING)
+
+    def test_failed_job(self):
+        job = self.upload(FIGURES_CSV)
+        os.remove(job.file_path)
+        with self.assertRaises(FileNotFoundError):
+            run_job(claim_next_job())
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImportJob.STATUS_FAILED)
+        self.assertIn('FileNotFoundError', job.errors)
+        self.assertIsNotNone(job.finished_at)
+
+
+class RankTests(PantheonTestCase):
+    def assertRanksMatch(self):
+        """Места совпадают с посчитанными по отсортированным личностям"""
+        figures = list(HistoricalFigure.objects.select_related('city__country', 'occupation'))
+        groups = {
+            'global': lambda figure: None,
+            'continent': lambda figure: figure.city.country.continent,
+            'domain': lambda figure: figure.occupation.domain,
+        }
+        for scope, group in groups.items():
+            for figure in figures:
+                members = [other for other in figures if group(other) == group(figure)]
+                above = sum(
+                    other.historical_popularity_index > figure.historical_popularity_index for other in members
+                )
+                not_below = sum(
+                    other.historical_popularity_index >= figure.historical_popularity_index for other in members
+                )
+                self.assertEqual(getattr(figure, f'{scope}_rank'), above + 1, (scope, figure))
+                self.assertAlmostEqual(
+                    getattr(figure, f'{scope}_top_percent'), 100.0 * not_below / len(members), 6
+                )
+
+    def test_import_fills_ranks(self):
+        self.assertRanksMatch()
+        hypatia = self.figure('Hypatia')
+        self.assertEqual(
+            (hypatia.global_rank, hypatia.continent_rank, hypatia.domain_rank), (8, 3, 3)
+        )
+        self.assertEqual(self.figure('Aristotle').global_top_percent, 12.5)
+
+    def test_hpi_edit_moves_neighbors(self):
+        self.edit(self.figure('Hypatia'), historical_popularity_index='32')
+        self.assertRanksMatch()
+        self.assertEqual(self.figure('Hypatia').global_rank, 1)
+        self.assertEqual(self.figure('Aristotle').global_rank, 2)
+
+    def test_equal_hpi_share_rank(self):
+        self.edit(self.figure('Pericles'), historical_popularity_index='27.5')
+        self.assertEqual(self.figure('Pericles').global_rank, self.figure('Cleopatra').global_rank)
+        self.assertRanksMatch()
+
+    def test_continent_change_refreshes(self):
+        self.edit(self.figure('Pericles'), city=City.objects.get(name='Alexandria').pk)
+        self.assertEqual(self.figure('Pericles').continent_rank, 3)
+        self.assertRanksMatch()
+
+    def test_name_edit_skips_refresh(self):
+        with mock.patch('pantheon.ranks.refresh_ranks') as refresh:
+            self.edit(self.figure('Plato'), full_name='Platon', birth_year='-428')
+        refresh.assert_not_called()
+        with mock.patch('pantheon.ranks.refresh_ranks') as refresh:
+            self.edit(self.figure('Platon'), occupation=Occupation.objects.get(name='Mathematician').pk)
+        refresh.assert_called_once()
+
+    def test_refresh_rewrites_changed_rows_only(self):
+        self.assertEqual(refresh_ranks(), 0)
+        HistoricalFigure.objects.filter(full_name='Plato').update(global_rank=None)
+        self.assertEqual(refresh_ranks(), 1)
+        self.assertRanksMatch()
+
+
+@skipUnless(numpy_available(), 'пересчет индекса требует NumPy')
+class HpiTests(PantheonTestCase):
+    def test_import_calibrates(self):
+        self.assertFalse(HistoricalFigure.objects.filter(hpi_adjustment=None).exists())
+        stats = recompute_hpi(dry_run=True)
+        self.assertEqual((stats['total'], stats['calibrated'], stats['changed']), (8, 0, 0))
+
+    def test_sql_base_matches_numpy(self):
+        # Оба слагаемых возраста и неизвестный год рождения
+        HistoricalFigure.objects.filter(full_name='Hypatia').update(birth_year=None)
+        HistoricalFigure.objects.filter(full_name='Euclid').update(birth_year=1990)
+        columns = load_columns()
+        base = hpi_base(
+            columns['languages'], columns['views'], columns['average_views'], columns['birth_year']
+        )
+        expected = dict(zip(columns['id'].astype(int).tolist(), base.tolist()))
+        for pk, value in HistoricalFigure.objects.annotate(base=hpi_base_expression()).values_list('pk', 'base'):
+            self.assertAlmostEqual(value, expected[pk], 9)
+
+    def test_write_back_error(self):
+        columns = load_columns()
+        # Повтор id: ошибка первичного ключа временной таблицы
+        twice = [0, 0]
+        with self.assertRaises(IntegrityError):
+            write_back(columns['id'][twice], columns['hpi'][twice], columns['adjustment'][twice])
+        # Временная таблица исчезла вместе с откатом: повтор проходит
+        once = [0]
+        hpi = columns['hpi'][once] + 1
+        self.assertEqual(write_back(columns['id'][once], hpi, columns['adjustment'][once]), 1)
+        figure = HistoricalFigure.objects.get(pk=int(columns['id'][0]))
+        self.assertAlmostEqual(float(figure.historical_popularity_index), hpi[0], 4)
+
+    def test_recompute_after_edit(self):
+        hypatia = self.edit(self.figure('Hypatia'), article_languages=288)
+        sequence = FigureChange.objects.order_by('-pk').values_list('pk', flat=True).first()
+
+        stats = recompute_hpi()
+        self.assertEqual(stats['changed'], 1)
+        hypatia.refresh_from_db()
+        # Языков вчетверо больше: индекс растет на ln 4
+        self.assertEqual(hypatia.historical_popularity_index, Decimal('26.7863'))
+        self.assertEqual(hypatia.global_rank, 7)
+        self.assertEqual(
+            list(FigureChange.objects.filter(pk__gt=sequence).values_list('figure_id', 'operation')),
+            [(hypatia.pk, FigureChange.UPDATE)],
+        )
+        self.assertEqual(recompute_hpi(dry_run=True)['changed'], 0)
+
+    def test_manual_hpi_recalibrated(self):
+        hypatia = self.edit(self.figure('Hypatia'), historical_popularity_index='30')
+        self.assertEqual(recompute_hpi(dry_run=True)['changed'], 0)
+        recompute_hpi()
+        hypatia.refresh_from_db()
+        self.assertEqual(hypatia.historical_popularity_index, Decimal('30'))
+
+    def test_calibrate_missing_adjustments(self):
+        HistoricalFigure.objects.filter(full_name__in=['Plato', 'Euclid']).update(hpi_adjustment=None)
+        self.assertEqual(recompute_hpi(dry_run=True)['calibrated'], 2)
+        self.assertEqual(calibrate_hpi(ids=[self.figure('Plato').pk]), 1)
+        self.assertEqual(calibrate_hpi(), 1)
+        stats = recompute_hpi(dry_run=True)
+        self.assertEqual((stats['calibrated'], stats['changed']), (0, 0))
+
+
+class FacetTests(PantheonTestCase):
+    # Фасет -> поле ORM (век считается по году рождения)
+    FIELDS = {
+        'continent': 'city__country__continent',
+        'country': 'city__country_id',
+        'domain': 'occupation__domain',
+        'industry': 'occupation__industry',
+    }
+
+    def setUp(self):
+        super().setUp()
+        self.index = FacetIndex.build(version=None)
+        self.countries = dict(Country.objects.values_list('name', 'id'))
+
+    def filtered(self, params, exclude=None):
+        """Личности под фильтрами params запросом ORM"""
+        figures = HistoricalFigure.objects.all()
+        for name, values in params.items():
+            if name == exclude:
+                continue
+            if name == 'century':
+                condition = Q()
+                for value in values:
+                    start = int(value) * 100
+                    condition |= Q(birth_year__gte=start, birth_year__lt=start + 100)
+                figures = figures.filter(condition)
+            else:
+                figures = figures.filter(**{f'{self.FIELDS[name]}__in': [
+                    int(value) if name == 'country' else value for value in values
+                ]})
+        return figures
+
+    def expected_counts(self, params, name):
+        figures = self.filtered(params, exclude=name)
+        if name == 'century':
+            counts = {}
+            for year in figures.exclude(birth_year=None).values_list('birth_year', flat=True):
+                counts[year // 100] = counts.get(year // 100, 0) + 1
+            return counts
+        field = self.FIELDS[name]
+        return dict(figures.exclude(**{field: None}).values_list(field).annotate(count=Count('pk')))
+
+    def assertCountsMatch(self, params):
+        filters = self.index.parse_filters(params)
+        counts = self.index.counts(filters)
+        for name in facets.FACETS:
+            actual = {item['value']: item['count'] for item in counts[name] if item['count']}
+            self.assertEqual(actual, self.expected_counts(params, name), (params, name))
+        result = FacetResult(self.index, self.index.match(filters), HistoricalFigure.objects.all())
+        expected = self.filtered(params).order_by('-historical_popularity_index', 'id')
+        self.assertEqual(result.count(), expected.count())
+        self.assertEqual(list(result[1:4]), list(expected[1:4]))
+
+    def test_counts_match_orm(self):
+        for params in (
+            {},
+            {'continent': ['Europe']},
+            {'continent': ['Europe'], 'domain': ['Science']},
+            {'century': ['-4']},
+            {'century': ['-5', '3'], 'industry': ['Philosophy', 'Math']},
+            {'country': [str(self.countries['Greece']), str(self.countries['Egypt'])], 'domain': ['Institutions']},
+        ):
+            with self.subTest(params=params):
+                self.assertCountsMatch(params)
+
+    def test_selected_value_kept_without_matches(self):
+        filters = self.index.parse_filters({'continent': ['Africa'], 'domain': ['Humanities']})
+        domains = {item['value']: item for item in self.index.counts(filters)['domain']}
+        self.assertEqual(domains['Humanities']['count'], 0)
+        self.assertTrue(domains['Humanities']['selected'])
+        self.assertEqual(self.index.match(filters), 0)
+
+    def test_unknown_values_ignored(self):
+        self.assertEqual(self.index.parse_filters({'continent': ['Atlantis'], 'country': ['x']}), {})
+
+    def test_century_labels(self):
+        labels = {item['value']: item['label'] for item in self.index.counts({})['century']}
+        self.assertEqual(labels[-4], '301–400 до н. э.')
+        self.assertEqual(labels[3], '300–399')
+
+
+class ChangeFeedTests(PantheonTestCase):
+    def setUp(self):
+        super().setUp()
+        self.head = latest_sequence()
+
+    def feed(self, since, **options):
+        """Записи ленты и завершающая {'next', 'more'}"""
+        records = list(iter_feed(since, **options))
+        return records[:-1], records[-1]
+
+    def delete(self, figure):
+        response = self.client.post(f'/figures/{figure.pk}/delete/', {'confirm': 'on'})
+        self.assertEqual(response.status_code, 302)
+
+    def test_import_journaled(self):
+        ids = HistoricalFigure.objects.values_list('pk', flat=True)
+        self.assertEqual(
+            sorted(FigureChange.objects.values_list('figure_id', 'operation')),
+            sorted((pk, FigureChange.INSERT) for pk in ids),
+        )
+        self.assertEqual(self.head, max(FigureChange.objects.values_list('pk', flat=True)))
+
+    def test_snapshot_without_cursor(self):
+        records, end = self.feed(None)
+        self.assertEqual(records[0], {'seq': self.head, 'op': RESET})
+        ids = [record['id'] for record in records[1:]]
+        self.assertEqual(ids, sorted(HistoricalFigure.objects.values_list('pk', flat=True)))
+        self.assertTrue(all(record['op'] == UPSERT and record['seq'] == self.head for record in records[1:]))
+        self.assertEqual(end, {'next': self.head, 'more': False})
+
+    def test_changes_after_cursor(self):
+        plato, pericles = self.figure('Plato'), self.figure('Pericles')
+        self.edit(plato, full_name='Platon')
+        self.delete(pericles)
+
+        records, end = self.feed(self.head)
+        self.assertEqual(
+            [(record['op'], record['id']) for record in records],
+            [(UPSERT, plato.pk), (DELETE, pericles.pk)],
+        )
+        self.assertEqual(records[0]['full_name'], 'Platon')
+        self.assertEqual(records[1]['article_id'], 24403)
+        self.assertEqual(end, {'next': latest_sequence(), 'more': False})
+        self.assertEqual(self.feed(end['next']), ([], end))
+
+    def test_latest_change_per_figure(self):
+        plato, socrates = self.figure('Plato'), self.figure('Socrates')
+        self.edit(plato, full_name='Platon')
+        self.edit(socrates, birth_year=-470)
+        self.edit(plato, full_name='Plato of Athens')
+        self.delete(socrates)
+
+        records, _ = self.feed(self.head)
+        self.assertEqual(
+            [(record['seq'], record['op'], record['id']) for record in records],
+            [(self.head + 3, UPSERT, plato.pk), (self.head + 4, DELETE, socrates.pk)],
+        )
+        self.assertEqual(records[0]['full_name'], 'Plato of Athens')
+
+    def test_limit(self):
+        for name in ('Plato', 'Socrates', 'Euclid'):
+            self.edit(self.figure(name), article_languages=200)
+
+        records, end = self.feed(self.head, limit=2)
+        self.assertEqual([record['seq'] for record in records], [self.head + 1, self.head + 2])
+        self.assertEqual(end, {'next': self.head + 2, 'more': True})
+        records, end = self.feed(end['next'], limit=2, batch_size=1)
+        self.assertEqual([record['id'] for record in records], [self.figure('Euclid').pk])
+        self.assertEqual(end, {'next': self.head + 3, 'more': False})
+
+    def test_pruned_cursor_reset(self):
+        FigureChange.objects.update(changed_at=F('changed_at') - datetime.timedelta(days=31))
+        self.edit(self.figure('Plato'), full_name='Platon')
+        self.assertEqual(prune_changes(days=30), 8)
+        self.assertFalse(needs_reset(self.head))
+        self.assertTrue(needs_reset(self.head - 1))
+        records, end = self.feed(self.head - 1)
+        self.assertEqual(records[0], {'seq': self.head + 1, 'op': RESET})
+        self.assertEqual(len(records), 9)
+        self.assertEqual(end['next'], self.head + 1)
+
+    def test_prune_keeps_latest(self):
+        FigureChange.objects.update(changed_at=F('changed_at') - datetime.timedelta(days=31))
+        self.assertEqual(prune_changes(days=30), 7)
+        self.assertEqual(latest_sequence(), self.head)
+        self.assertFalse(needs_reset(self.head))
+
+    def test_api(self):
+        self.edit(self.figure('Plato'), full_name='Platon')
+        response = self.client.get('/api/changes/', {'since': self.head, 'fields': ['full_name']})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(lines, [
+            {'seq': self.head + 1, 'op': UPSERT, 'article_id': 22954, 'full_name': 'Platon'},
+            {'next': self.head + 1, 'more': False},
+        ])
+        self.assertEqual(self.client.get('/api/changes/', {'since': '-1'}).status_code, 400)
+
+    def test_failed_journal_rolls_back_edit(self):
+        plato = self.figure('Plato')
+        with mock.patch('pantheon.changes.record_states', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                self.edit(plato, full_name='Platon')
+        self.assertEqual(HistoricalFigure.objects.get(pk=plato.pk).full_name, 'Plato')
+        self.assertEqual(latest_sequence(), self.head)
+
+
+def figure_row(article_id, city, country, latitude='', longitude='', occupation='Philosopher'):
+    """Строка CSV с заданными городом и профессией"""
+    return (
+        f'{article_id},Figure {article_id},Male,1500,{city},,{country},Europe,{latitude},{longitude},'
+        f'{occupation},Philosophy,Humanities,10,1000,100,20\n'
+    )
+
+
+class ResolutionTests(TestCase):
+    def setUp(self):
+        reset_process_caches()
+
+    def city_match(self, index, name, latitude=None, longitude=None, country_id=1):
+        return index.match(name=name, country_id=country_id, latitude=latitude, longitude=longitude)
+
+    def test_normalize(self):
+        self.assertEqual(normalize_name(' St. Étienne-du-Rouvray'), 'saint etienne du rouvray')
+
+    def test_city_matches(self):
+        index = CityIndex()
+        index.add(1, name='Taranto', country_id=1, latitude=Decimal('40.47'), longitude=Decimal('17.24'))
+        index.add(2, name='Saint Petersburg', country_id=1, latitude=Decimal('59.95'), longitude=Decimal('30.3'))
+        index.add(3, name='Lichfield', country_id=1, latitude=None, longitude=None)
+        index.add(4, name='North Shields', country_id=1, latitude=Decimal('55.01'), longitude=Decimal('-1.45'))
+
+        self.assertEqual(self.city_match(index, 'Tarranto', Decimal('40.47'), Decimal('17.24')).pk, 1)
+        self.assertEqual(self.city_match(index, 'St. Petersburg', Decimal('59.93'), Decimal('30.33')).pk, 2)
+        self.assertEqual(self.city_match(index, 'lichfield').pk, 3)
+        # Одна буква при неизвестных координатах — другой город
+        self.assertIsNone(self.city_match(index, 'Lochfield'))
+        self.assertIsNone(self.city_match(index, 'South Shields', Decimal('55.0'), Decimal('-1.43')))
+        # Дальше CITY_MAX_DISTANCE_KM и в другой стране — разные города
+        self.assertIsNone(self.city_match(index, 'Tarranto', Decimal('41.5'), Decimal('17.24')))
+        self.assertIsNone(self.city_match(index, 'Taranto', Decimal('40.47'), Decimal('17.24'), country_id=2))
+
+    def test_occupation_matches(self):
+        index = OccupationIndex()
+        index.add(1, name='Philosopher')
+        index.add(2, name='Baseball Player')
+        self.assertEqual(index.match(name='Philosophers').pk, 1)
+        self.assertIsNone(index.match(name='Basketball Player'))
+        self.assertIsNone(index.match(name='Philosophy Teacher'))
+
+    def test_import_uses_most_frequent_spelling(self):
+        stats = import_text(
+            CSV_HEADER
+            + figure_row(1, 'Tarranto', 'Italy', '40.47', '17.24', occupation='Philosophers')
+            + figure_row(2, 'Taranto', 'Italy', '40.47', '17.24')
+            + figure_row(3, 'Taranto', 'Italy', '40.47', '17.24')
+            + figure_row(4, 'Lichfield', 'United Kingdom')
+            + figure_row(5, 'Lochfield', 'United Kingdom'),
+            resolve=True,
+        )
+        self.assertEqual(stats['resolved'], 2)
+        self.assertEqual(
+            sorted(City.objects.values_list('name', flat=True)), ['Lichfield', 'Lochfield', 'Taranto']
+        )
+        self.assertEqual(list(Occupation.objects.values_list('name', flat=True)), ['Philosopher'])
+        taranto = City.objects.get(name='Taranto')
+        self.assertEqual(taranto.figure_count, 3)
+        figure = HistoricalFigure.objects.get(article_id=1)
+        self.assertEqual((figure.city, figure.original_city_name), (taranto, 'Tarranto'))
+
+    def test_import_without_resolve(self):
+        import_text(
+            CSV_HEADER + figure_row(1, 'Tarranto', 'Italy', '40.47', '17.24')
+            + figure_row(2, 'Taranto', 'Italy', '40.47', '17.24'),
+            resolve=False,
+        )
+        self.assertEqual(City.objects.count(), 2)
+
+    def test_merge_duplicates(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            import_text(
+                CSV_HEADER + figure_row(1, 'Tarranto', 'Italy', '40.47', '17.24')
+                + figure_row(2, 'Taranto', 'Italy', '40.47', '17.24')
+                + figure_row(3, 'Lochfield', 'United Kingdom')
+                + figure_row(4, 'Lichfield', 'United Kingdom'),
+            )
+        groups = find_duplicates(City)
+        self.assertEqual(
+            [(group.canonical.name, [duplicate.name for duplicate in group.duplicates]) for group in groups],
+            [('Taranto', ['Tarranto'])],
+        )
+        self.assertEqual(merge_duplicates(City, groups), 1)
+        self.assertFalse(City.objects.filter(name='Tarranto').exists())
+        self.assertEqual(City.objects.get(name='Taranto').figure_count, 2)
+
+
+# Замена таблиц меняет схему: на SQLite это невозможно внутри транзакции теста
+class SwapTests(TransactionTestCase):
+    def setUp(self):
+        reset_process_caches()
+        import_text(FIGURES_CSV)
+        self.ids = dict(HistoricalFigure.objects.values_list('article_id', 'id'))
+        self.city_ids = dict(City.objects.values_list('name', 'id'))
+        self.sequence = FigureChange.objects.order_by('-pk').values_list('pk', flat=True).first()
+
+    def swap(self, text, **options):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', encoding='utf-8', delete=False) as file:
+            file.write(text)
+        self.addCleanup(os.remove, file.name)
+        return import_with_swap(file.name, **options)
+
+    def test_ids_preserved(self):
+        lines = FIGURES_CSV.splitlines(keepends=True)
+        text = ''.join(
+            line.replace(',31.9888', ',30.5') for line in lines if not line.startswith('24403,')
+        ) + '1941,Thales,Male,-624,Miletus,,Turkey,Asia,37.53,27.28,Philosopher,Philosophy,Humanities,84,4390612,33254,27.4\n'
+        stats = self.swap(text)
+
+        self.assertEqual(stats['created'], 8)
+        current = dict(HistoricalFigure.objects.values_list('article_id', 'id'))
+        self.assertNotIn(24403, current)
+        for article_id, pk in current.items():
+            if article_id != 1941:
+                self.assertEqual(pk, self.ids[article_id])
+        self.assertGreater(current[1941], max(self.ids.values()))
+        for name, pk in City.objects.values_list('name', 'id'):
+            if name != 'Miletus':
+                self.assertEqual(pk, self.city_ids[name])
+        self.assertEqual(
+            HistoricalFigure.objects.get(article_id=22954).historical_popularity_index, Decimal('30.5')
+        )
+
+        changes = set(FigureChange.objects.filter(pk__gt=self.sequence).values_list('operation', 'article_id'))
+        self.assertEqual(changes, {
+            (FigureChange.INSERT, 1941), (FigureChange.UPDATE, 22954), (FigureChange.DELETE, 24403),
+        })
+        # Производные данные пересчитаны по новой таблице
+        self.assertEqual(City.objects.get(name='Athens').figure_count, 2)
+        self.assertEqual(HistoricalFigure.objects.get(article_id=22954).global_rank, 3)
+
+    def constraint_names(self):
+        with connection.cursor() as cursor:
+            return {
+                model: set(connection.introspection.get_constraints(cursor, model._meta.db_table))
+                for model in SWAP_MODELS
+            }
+
+    def test_live_names_after_swap(self):
+        # Индексы и ограничения — под теми же именами, что создали миграции
+        names = self.constraint_names()
+        self.swap(FIGURES_CSV)
+        self.assertEqual(self.constraint_names(), names)
+        tables = connection.introspection.table_names()
+        self.assertFalse([table for table in tables if SHADOW_MARKER in table or OLD_MARKER in table])
+        # Новые личности получают следующие id
+        figure = HistoricalFigure.objects.create(article_id=1, full_name='New')
+        self.assertGreater(figure.pk, max(self.ids.values()))
+
+    def test_small_file_rejected(self):
+        with self.assertRaises(SwapError):
+            self.swap(CSV_HEADER + FIGURES_CSV.splitlines(keepends=True)[1], min_ratio=0.5)
+        self.assertEqual(dict(HistoricalFigure.objects.values_list('article_id', 'id')), self.ids)
+        tables = connection.introspection.table_names()
+        self.assertFalse([table for table in tables if SHADOW_MARKER in table])
+
+    def test_edit_during_load_journaled(self):
+        # Правка живой таблицы во время загрузки видна сравнению под блокировкой
+        def edit_then_build(shadow, token):
+            HistoricalFigure.objects.filter(article_id=22954).update(historical_popularity_index=Decimal('30.5'))
+            build_shadow_indexes(shadow, token)
+
+        with mock.patch('pantheon.swap.build_shadow_indexes', edit_then_build):
+            with CaptureQueriesContext(connection) as queries:
+                self.swap(FIGURES_CSV)
+
+        changes = set(FigureChange.objects.filter(pk__gt=self.sequence).values_list('operation', 'article_id'))
+        self.assertIn((FigureChange.UPDATE, 22954), changes)
+        self.assertEqual(
+            HistoricalFigure.objects.get(article_id=22954).historical_popularity_index, Decimal('31.9888')
+        )
+        if connection.vendor == 'postgresql':
+            locks = [query['sql'] for query in queries if query['sql'].startswith('LOCK TABLE')]
+            self.assertEqual(len(locks), 1)
+            self.assertIn('EXCLUSIVE MODE', locks[0])
+
+
+class StreamingTests(ReplicaTestMixin, PantheonTestCase):
+    def streamed_reads(self):
+        """БД, из которых читались записи при выводе потоковой страницы"""
+        response = self.client.get('/figures/', {'stream': '1'})
+        self.assertTrue(response.streaming)
+        viewed = len(self.reads)
+        content = b''.join(response.streaming_content).decode()
+        self.assertIn('Aristotle', content)
+        return self.reads[viewed:]
+
+    def test_rows_from_replica(self):
+        reads = self.streamed_reads()
+        self.assertTrue(reads)
+        self.assertEqual(set(reads), {'replica1'})
+
+    def test_pinned_client_rows_from_primary(self):
+        self.pin_client()
+        reads = self.streamed_reads()
+        self.assertTrue(reads)
+        self.assertEqual(set(reads), {DEFAULT_DB_ALIAS})
+
+
+@override_settings(PANTHEON_PROFILE_SAMPLE_RATE=1.0)
+class ProfilingTests(PantheonTestCase):
+    def test_profile_saved(self):
+        response = self.client.get('/figures/')
+        self.assertEqual(response.status_code, 200)
+        profile = RequestProfile.objects.get()
+        self.assertEqual(profile.view_name, 'figure_list')
+        self.assertEqual(profile.method, 'GET')
+
+    def test_profile_does_not_pin(self):
+        response = self.client.get('/figures/')
+        self.assertTrue(RequestProfile.objects.exists())
+        self.assertNotIn(PRIMARY_COOKIE_NAME, response.cookies)
+
+
+class StatisticsTests(PantheonTestCase):
+    def setUp(self):
+        super().setUp()
+        # Версии данных откатываются с тестом: ключи кэша повторяются
+        cache.clear()
+
+    def expected_average(self):
+        return HistoricalFigure.objects.aggregate(avg=Avg('historical_popularity_index'))['avg']
+
+    def test_totals(self):
+        stats = _statistics_totals()
+        self.assertEqual(stats['total_figures'], 8)
+        self.assertEqual(stats['total_countries'], Country.objects.count())
+        self.assertEqual(stats['avg_popularity'], self.expected_average())
+        self.assertEqual(self.client.get('/statistics/').status_code, 200)
+
+    def test_cached_until_figures_change(self):
+        before = _statistics_totals()
+        # Повторно — только чтение версий данных
+        with self.assertNumQueries(1):
+            self.assertEqual(_statistics_totals(), before)
+
+        self.edit(self.figure('Hypatia'), historical_popularity_index='32')
+        after = _statistics_totals()
+        self.assertEqual(after['avg_popularity'], self.expected_average())
+        self.assertGreater(after['avg_popularity'], before['avg_popularity'])
+
+
+class CompressionTests(PantheonTestCase):
+    def get(self, path, encoding='gzip'):
+        return self.client.get(path, HTTP_ACCEPT_ENCODING=encoding)
+
+    def test_gzip(self):
+        plain = self.client.get('/statistics/')
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        response = self.get('/statistics/')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+    def test_not_accepted(self):
+        response = self.get('/statistics/', encoding='identity')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_random_length(self):
+        # Против BREACH длина сжатого ответа каждый раз своя
+        lengths = {len(self.get('/statistics/').content) for _ in range(10)}
+        self.assertGreater(len(lengths), 1)
+
+    def test_streaming(self):
+        lengths = set()
+        for _ in range(10):
+            response = self.get('/figures/?stream=1')
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertFalse(response.has_header('Content-Length'))
+            content = b''.join(response.streaming_content)
+            self.assertIn('Aristotle', gzip.decompress(content).decode())
+            lengths.add(len(content))
+        self.assertGreater(len(lengths), 1)
+
+    @skipUnless(compression.brotli, 'brotli не установлен')
+    def test_brotli(self):
+        plain = self.client.get('/statistics/')
+        response = self.get('/statistics/', encoding='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(compression.brotli.decompress(response.content), plain.content)
+
+    @skipUnless(compression.brotli, 'brotli не установлен')
+    def test_brotli_padding(self):
+        data = b'<p>Aristotle</p>\n' * 100
+        compressed = {compression.compress(data, 'br', max_random_bytes=100) for _ in range(10)}
+        self.assertGreater(len({len(item) for item in compressed}), 1)
+        for item in compressed:
+            self.assertEqual(compression.brotli.decompress(item), data)
+        chunks = compression.compress_stream([data[:500], data[500:]], 'br', max_random_bytes=100)
+        self.assertEqual(compression.brotli.decompress(b''.join(chunks)), data)
+
+
+class PrecompressedStaticTests(TestCase):
+    HASHED = 'css/site.0123456789ab.css'
+    CSS = b'body { margin: 0; }\n' * 50
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = os.path.join(directory.name, 'static')
+        os.makedirs(os.path.join(self.root, 'css'))
+        self.write(self.HASHED, self.CSS)
+        self.write(self.HASHED + '.gz', compress(self.CSS, 'gzip', best=True))
+        self.write('robots.txt', b'User-agent: *\n')
+        self.write('staticfiles.json', json.dumps({
+            'version': '1.1', 'paths': {'css/site.css': self.HASHED},
+        }).encode())
+        with open(os.path.join(directory.name, 'secret.txt'), 'w') as secret:
+            secret.write('secret')
+        static = override_settings(STATIC_ROOT=self.root, STATIC_URL='/static/')
+        static.enable()
+        self.addCleanup(static.disable)
+
+    def write(self, name, data):
+        with open(os.path.join(self.root, name), 'wb') as output:
+            output.write(data)
+
+    def get(self, name, encoding='gzip'):
+        response = self.client.get('/static/' + name, HTTP_ACCEPT_ENCODING=encoding)
+        if response.streaming:
+            response.body = b''.join(response.streaming_content)
+        return response
+
+    def test_precompressed_variant(self):
+        response = self.get(self.HASHED)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css; charset=utf-8')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(gzip.decompress(response.body), self.CSS)
+
+    def test_original_when_not_accepted(self):
+        response = self.get(self.HASHED, encoding='identity')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response.body, self.CSS)
+
+    def test_file_without_hash(self):
+        response = self.get('robots.txt', encoding='identity')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=60')
+        self.assertEqual(response.body, b'User-agent: *\n')
+
+    def test_missing_file_passed_on(self):
+        self.assertEqual(self.get('css/missing.css').status_code, 404)
+        self.assertEqual(self.get('%2e%2e/secret.txt').status_code, 404)
+
+
+class BulkTests(PantheonTestCase):
+    def setUp(self):
+        super().setUp()
+        self.head = latest_sequence()
+        self.athens = City.objects.get(name='Athens')
+
+    def entries(self, figures, operation):
+        return {(pk, article_id, operation) for pk, article_id in figures.values_list('pk', 'article_id')}
+
+    def journal(self):
+        """Записи журнала после импорта: {(id, article_id, операция)}"""
+        return set(
+            FigureChange.objects.filter(pk__gt=self.head).values_list('figure_id', 'article_id', 'operation')
+        )
+
+    def test_filters(self):
+        self.assertEqual(preview_count(filter_figures(city=self.athens.pk)), 3)
+        self.assertEqual(preview_count(filter_figures(continent='Europe', domain='Science')), 1)
+        self.assertEqual(preview_count(filter_figures(birth_year_from=-400, birth_year_to=0)), 4)
+        # Пустые значения не фильтруют
+        self.assertEqual(preview_count(filter_figures(city='', name_contains=None)), 8)
+        with self.assertRaises(ValidationError):
+            filter_figures(town=self.athens.pk)
+
+    def test_build_changes(self):
+        self.assertEqual(build_changes(), {})
+        changes = build_changes(city=self.athens.pk, hpi_value=20)
+        self.assertEqual(changes['city'], self.athens)
+        self.assertIsNone(changes['hpi_adjustment'])
+        with self.assertRaises(ValidationError):
+            build_changes(hpi_delta=1, hpi_value=20)
+
+    def test_update_moves_figures(self):
+        syracuse = City.objects.get(name='Syracuse')
+        figures = filter_figures(city=self.athens.pk)
+        expected = self.entries(figures, FigureChange.UPDATE)
+        with self.captureOnCommitCallbacks(execute=True):
+            updated = bulk_update_figures(figures, **build_changes(city=syracuse))
+        self.assertEqual(updated, 3)
+        self.assertEqual(HistoricalFigure.objects.filter(city=syracuse).count(), 4)
+        self.assertEqual(self.journal(), expected)
+        self.assertAggregatesMatch()
+        self.assertEqual(City.objects.get(pk=self.athens.pk).figure_count, 0)
+
+    def test_update_popularity(self):
+        figures = filter_figures(domain='Science')
+        with self.captureOnCommitCallbacks(execute=True):
+            updated = bulk_update_figures(figures, **build_changes(hpi_delta=Decimal('10')))
+        self.assertEqual(updated, 3)
+        self.assertEqual(self.figure('Euclid').historical_popularity_index, Decimal('38.1'))
+        self.assertAggregatesMatch()
+        # Места пересчитаны: Archimedes (39.4) теперь первый
+        self.assertEqual(self.figure('Archimedes').global_rank, 1)
+
+    def test_update_condition_on_changed_field(self):
+        # Условие по изменяемому полю: в журнал попадает набор до изменения
+        figures = filter_figures(hpi_from=30)
+        expected = self.entries(figures, FigureChange.UPDATE)
+        bulk_update_figures(figures, **build_changes(hpi_value=10))
+        self.assertEqual(len(expected), 3)
+        self.assertEqual(self.journal(), expected)
+
+    def test_nothing_to_update(self):
+        nobody = filter_figures(name_contains='Nobody')
+        self.assertEqual(bulk_update_figures(nobody, **build_changes(hpi_value=10)), 0)
+        self.assertEqual(bulk_update_figures(filter_figures()), 0)
+        self.assertEqual(self.journal(), set())
+
+    def test_delete(self):
+        figures = filter_figures(occupation=Occupation.objects.get(name='Politician').pk)
+        expected = self.entries(figures, FigureChange.DELETE)
+        with self.captureOnCommitCallbacks(execute=True):
+            deleted = bulk_delete_figures(figures)
+        self.assertEqual(deleted, 2)
+        self.assertFalse(HistoricalFigure.objects.filter(full_name__in=['Cleopatra', 'Pericles']).exists())
+        self.assertEqual(self.journal(), expected)
+        self.assertAggregatesMatch()
+        self.assertEqual(Occupation.objects.get(name='Politician').figure_count, 0)
+
+
+class ApiFiguresTests(PantheonTestCase):
+    def setUp(self):
+        super().setUp()
+        # Версии данных откатываются с тестом: ключи кэша повторяются
+        cache.clear()
+
+    def get(self, **params):
+        return self.client.get('/api/figures/', params)
+
+    def figure_reads(self, article_ids):
+        """Сколько запросов к таблице личностей делает get_figures"""
+        with CaptureQueriesContext(connection) as queries:
+            get_figures(article_ids)
+        return sum('pantheon_historicalfigure' in query['sql'] for query in queries)
+
+    def test_default_fields(self):
+        response = self.get(ids='308')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['missing'], [])
+        self.assertEqual(set(data['figures'][0]), {'article_id', *DEFAULT_FIELDS})
+        self.assertEqual(data['figures'][0]['full_name'], 'Aristotle')
+        self.assertEqual(data['figures'][0]['city'], 'Stageira')
+        self.assertEqual(data['figures'][0]['country'], 'Greece')
+
+    def test_order_and_missing(self):
+        response = self.get(ids='22954, 1,308,22954', fields='full_name,continent,article_id')
+        data = response.json()
+        self.assertEqual(data['figures'], [
+            {'article_id': 22954, 'full_name': 'Plato', 'continent': 'Europe'},
+            {'article_id': 308, 'full_name': 'Aristotle', 'continent': 'Europe'},
+        ])
+        self.assertEqual(data['missing'], [1])
+
+    def test_post(self):
+        response = self.client.post(
+            '/api/figures/', {'ids': [9418, 14343], 'fields': ['domain']}, content_type='application/json',
+        )
+        self.assertEqual(response.json()['figures'], [
+            {'article_id': 9418, 'domain': 'Science'},
+            {'article_id': 14343, 'domain': 'Science'},
+        ])
+        response = self.client.post('/api/figures/', '[308]', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_bad_requests(self):
+        for params in ({}, {'ids': ''}, {'ids': '308,abc'}, {'ids': '308', 'fields': 'full_name,secret'}):
+            response = self.get(**params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn('error', response.json())
+
+    @override_settings(PANTHEON_API_MAX_IDS=3)
+    def test_max_ids(self):
+        self.assertEqual(self.get(ids='1,2,3').status_code, 200)
+        # Повторы не считаются
+        self.assertEqual(self.get(ids='1,2,3,3,1').status_code, 200)
+        self.assertEqual(self.get(ids='1,2,3,4').status_code, 400)
+
+    def test_records_cached(self):
+        self.assertEqual(self.figure_reads([308, 22954]), 1)
+        self.assertEqual(self.figure_reads([308, 22954]), 0)
+        # Из БД читаются только промахи
+        with CaptureQueriesContext(connection) as queries:
+            figures, missing = get_figures([308, 9418])
+        self.assertEqual([figure['full_name'] for figure in figures], ['Aristotle', 'Euclid'])
+        [sql] = [query['sql'] for query in queries if 'pantheon_historicalfigure' in query['sql']]
+        self.assertIn('9418', sql)
+        self.assertNotIn('308', sql)
+
+    def test_cache_invalidated_by_edit(self):
+        self.assertEqual(self.get(ids='308').json()['figures'][0]['historical_popularity_index'], 31.9938)
+        self.edit(self.figure('Aristotle'), historical_popularity_index='33.5')
+        self.assertEqual(self.get(ids='308').json()['figures'][0]['historical_popularity_index'], 33.5)
+        self.assertEqual(self.figure_reads([308]), 0)
+
+
+class CubeTests(PantheonTestCase):
+    # Измерение куба -> поле личности
+    FIGURE_FIELDS = {
+        'continent': 'city__country__continent',
+        'country': 'city__country',
+        'domain': 'occupation__domain',
+        'industry': 'occupation__industry',
+        'century': 'birth_year',
+    }
+
+    def cube_value(self, name, value):
+        if name == 'century':
+            return None if value is None else value // 100 * 100
+        if name in ('continent', 'domain', 'industry'):
+            return value or ''
+        return value
+
+    def assertPivotMatches(self, rows, columns=()):
+        """Ячейки и итоги сводной таблицы равны GROUP BY по личностям"""
+        names = [*rows, *columns]
+        expected = {}
+        groups = HistoricalFigure.objects.order_by().values(
+            *dict.fromkeys(self.FIGURE_FIELDS[name] for name in names)
+        ).annotate(
+            count=Count('pk'),
+            views=Sum('page_views'),
+            total=Sum('historical_popularity_index'),
+            best=Max('historical_popularity_index'),
+        )
+        for group in groups:
+            key = tuple(self.cube_value(name, group[self.FIGURE_FIELDS[name]]) for name in names)
+            count, views, total, best = expected.get(key, (0, 0, Decimal(0), None))
+            expected[key] = (
+                count + group['count'], views + group['views'], total + group['total'],
+                group['best'] if best is None else max(best, group['best']),
+            )
+
+        pivot = Pivot(rows, columns)
+        cells = {
+            row_key + column_key: (
+                values['count'], values['page_views'], values['popularity_sum'], values['max_popularity'],
+            )
+            for (row_key, column_key), values in pivot.cells.items()
+        }
+        self.assertEqual(cells, expected)
+        figures = HistoricalFigure.objects.aggregate(
+            count=Count('pk'), views=Sum('page_views'), total=Sum('historical_popularity_index'),
+        )
+        self.assertEqual(
+            (pivot.total['count'], pivot.total['page_views'], pivot.total['popularity_sum']),
+            (figures['count'], figures['views'], figures['total']),
+        )
+        return pivot
+
+    def assertCubeMatches(self):
+        self.assertPivotMatches(['continent', 'country'], ['century'])
+        self.assertPivotMatches(['domain', 'industry'])
+        self.assertPivotMatches(['century'], ['domain'])
+
+    def test_import_builds_cube(self):
+        self.assertCubeMatches()
+        pivot = self.assertPivotMatches(['century'])
+        # Века до н. э.: -427 -> -500, -384 -> -400, -69 -> -100
+        self.assertEqual(pivot.row_keys, [(-500,), (-400,), (-300,), (-100,), (300,)])
+        self.assertEqual(pivot.row_totals[(-500,)]['count'], 3)
+        self.assertEqual(pivot.row_totals[(-400,)]['count'], 2)
+
+    def test_edit_moves_between_centuries(self):
+        self.edit(self.figure('Hypatia'), birth_year=-150)
+        self.assertCubeMatches()
+        pivot = self.assertPivotMatches(['century'])
+        self.assertNotIn((300,), pivot.row_totals)
+        self.assertEqual(pivot.row_totals[(-200,)]['count'], 1)
+
+    def test_edit_clears_birth_year(self):
+        self.edit(self.figure('Aristotle'), birth_year=None, historical_popularity_index='35.5')
+        self.assertIsNone(self.figure('Aristotle').birth_year)
+        self.assertCubeMatches()
+        pivot = Pivot(['domain'], filters={'century': None})
+        self.assertEqual(pivot.total['count'], 1)
+        self.assertEqual(pivot.total['max_popularity'], Decimal('35.5'))
+
+        self.edit(self.figure('Aristotle'), birth_year=-384)
+        self.assertCubeMatches()
+        self.assertFalse(CubeCell.objects.filter(century__isnull=True).exists())
+
+    def test_edit_moves_between_countries(self):
+        self.edit(self.figure('Euclid'), city=City.objects.get(name='Athens').pk)
+        self.assertCubeMatches()
+
+    def test_delete(self):
+        for name in ('Hypatia', 'Socrates'):
+            response = self.client.post(f'/figures/{self.figure(name).pk}/delete/', {'confirm': 'on'})
+            self.assertEqual(response.status_code, 302)
+        self.assertCubeMatches()
+        self.assertFalse(CubeCell.objects.filter(century=300).exists())
+
+    def test_partial_refresh(self):
+        CubeCell.objects.filter(century=-400).update(figure_count=0)
+        refresh_cube(centuries={-500})
+        self.assertEqual(Pivot(filters={'century': -400}).total['count'], 0)
+        refresh_cube(centuries={-400, None})
+        self.assertCubeMatches()
+
+
+class TimelineTests(PantheonTestCase):
+    def buckets(self):
+        """{(интервал, начало): (количество, просмотры, самая популярная личность)}"""
+        return {
+            (size, start): (count, views, top)
+            for size, start, count, views, top in TimelineBucket.objects.values_list(
+                'size', 'start_year', 'figure_count', 'page_views_sum', 'top_figure__full_name',
+            )
+        }
+
+    def count_and_top(self, bucket):
+        count, _, top = bucket
+        return count, top
+
+    def assertMatchesFullRefresh(self):
+        """Интервалы после частичного пересчета равны полному пересчету"""
+        buckets = self.buckets()
+        refresh_timeline()
+        self.assertEqual(buckets, self.buckets())
+        return buckets
+
+    def test_import_builds_timeline(self):
+        buckets = self.assertMatchesFullRefresh()
+        # Годы до н. э.: -427 -> век -500, десятилетие -430
+        self.assertEqual(buckets[100, -500], (3, 42001224 + 46812003 + 6432155, 'Plato'))
+        self.assertEqual(buckets[10, -430], (1, 46812003, 'Plato'))
+        self.assertEqual(buckets[100, -400][2], 'Aristotle')
+        self.assertEqual(sorted(start for size, start in buckets if size == 100), [-500, -400, -300, -100, 300])
+
+    def test_edit_moves_between_centuries(self):
+        self.edit(self.figure('Plato'), birth_year=375)
+        buckets = self.assertMatchesFullRefresh()
+        self.assertEqual(self.count_and_top(buckets[100, -500]), (2, 'Socrates'))
+        self.assertEqual(self.count_and_top(buckets[100, 300]), (2, 'Plato'))
+        self.assertEqual(buckets[10, 370][0], 2)
+        self.assertNotIn((10, -430), buckets)
+
+    def test_edit_changes_top_figure(self):
+        self.edit(self.figure('Euclid'), historical_popularity_index='35')
+        buckets = self.assertMatchesFullRefresh()
+        self.assertEqual(buckets[100, -400][2], 'Euclid')
+        self.assertEqual(buckets[10, -390][2], 'Aristotle')
+
+    def test_edit_clears_birth_year(self):
+        self.edit(self.figure('Hypatia'), birth_year=None)
+        buckets = self.assertMatchesFullRefresh()
+        self.assertNotIn((100, 300), buckets)
+
+    def test_delete_top_figure(self):
+        response = self.client.post(f'/figures/{self.figure("Aristotle").pk}/delete/', {'confirm': 'on'})
+        self.assertEqual(response.status_code, 302)
+        buckets = self.assertMatchesFullRefresh()
+        self.assertEqual(self.count_and_top(buckets[100, -400]), (1, 'Euclid'))
+        self.assertNotIn((10, -390), buckets)
+
+    def test_partial_refresh(self):
+        TimelineBucket.objects.filter(start_year__lt=0).update(figure_count=0)
+        refresh_timeline(years={-427})
+        buckets = self.buckets()
+        self.assertEqual(buckets[100, -500][0], 3)
+        self.assertEqual(buckets[100, -400][0], 0)
+
+
+class SnapshotTests(PantheonTestCase):
+    def setUp(self):
+        super().setUp()
+        # Первый снимок снят импортом (PANTHEON_METRIC_SNAPSHOTS)
+        self.first = MetricSnapshot.objects.get()
+
+    def add_views(self, **views):
+        for name, delta in views.items():
+            HistoricalFigure.objects.filter(full_name=name).update(page_views=F('page_views') + delta)
+
+    def recorded(self, snapshot):
+        """Имена личностей, попавших в историю снимка"""
+        ids = FigureMetric.objects.filter(snapshot=snapshot).values_list('figure_id', flat=True)
+        return set(HistoricalFigure.objects.filter(pk__in=ids).values_list('full_name', flat=True))
+
+    def deltas(self, movers):
+        return [(mover.figure.full_name, mover.delta) for mover in movers]
+
+    def test_import_snapshot(self):
+        self.assertEqual((self.first.figure_count, self.first.changed_count), (8, 8))
+        self.assertEqual(FigureMetric.objects.filter(snapshot=self.first).count(), 8)
+        self.assertEqual(LatestFigureMetric.objects.filter(snapshot=self.first).count(), 8)
+
+    def test_unchanged_not_recorded(self):
+        snapshot = take_snapshot('again')
+        self.assertEqual((snapshot.figure_count, snapshot.changed_count), (8, 0))
+        self.assertEqual(FigureMetric.objects.count(), 8)
+        self.assertFalse(LatestFigureMetric.objects.filter(snapshot=snapshot).exists())
+
+    def test_changed_only(self):
+        self.add_views(Plato=1000)
+        HistoricalFigure.objects.filter(full_name='Euclid').update(article_languages=97)
+        snapshot = take_snapshot()
+        self.assertEqual(snapshot.changed_count, 2)
+        self.assertEqual(self.recorded(snapshot), {'Plato', 'Euclid'})
+
+        plato = self.figure('Plato')
+        latest = LatestFigureMetric.objects.get(figure=plato)
+        self.assertEqual((latest.snapshot_id, latest.page_views), (snapshot.pk, 46813003))
+        self.assertEqual(LatestFigureMetric.objects.count(), 8)
+        self.assertEqual(LatestFigureMetric.objects.get(figure=self.figure('Aristotle')).snapshot_id, self.first.pk)
+        self.assertEqual(
+            [(point['snapshot_id'], point['page_views']) for point in figure_trend(plato.pk)],
+            [(self.first.pk, 46812003), (snapshot.pk, 46813003)],
+        )
+
+    def test_new_figure_recorded(self):
+        import_text(CSV_HEADER + figure_row(1, 'Athens', 'Greece', occupation='Politician'))
+        snapshot = MetricSnapshot.objects.order_by('-pk').first()
+        self.assertEqual((snapshot.figure_count, snapshot.changed_count), (9, 1))
+        self.assertEqual(LatestFigureMetric.objects.count(), 9)
+
+    def test_top_movers(self):
+        self.assertEqual(top_movers(), (None, []))
+        self.add_views(Euclid=5000, Plato=1000, Hypatia=-300)
+        take_snapshot()
+        since, movers = top_movers()
+        self.assertEqual(since, self.first)
+        self.assertEqual(
+            self.deltas(movers),
+            [('Euclid', 5000), ('Plato', 1000), ('Hypatia', -300)],
+        )
+        self.assertEqual(movers[0].previous, 12180337)
+        _, fallers = top_movers(descending=False, limit=1)
+        self.assertEqual([mover.figure.full_name for mover in fallers], ['Hypatia'])
+
+    def test_movers_since_snapshot(self):
+        self.add_views(Euclid=5000)
+        second = take_snapshot()
+        self.add_views(Plato=1000, Euclid=10)
+        take_snapshot()
+        # По умолчанию — изменения после предпоследнего снимка
+        since, movers = top_movers()
+        self.assertEqual(since, second)
+        self.assertEqual(self.deltas(movers), [('Plato', 1000), ('Euclid', 10)])
+        _, movers = top_movers(since=self.first)
+        self.assertEqual(self.deltas(movers), [('Euclid', 5010), ('Plato', 1000)])
+
+    def test_movers_by_popularity(self):
+        HistoricalFigure.objects.filter(full_name='Hypatia').update(historical_popularity_index=Decimal('26.9'))
+        take_snapshot()
+        _, movers = top_movers('historical_popularity_index')
+        self.assertEqual(self.deltas(movers), [('Hypatia', Decimal('1.5'))])
+        with self.assertRaises(ValueError):
+            top_movers('full_name')
+
+
+@override_settings(PANTHEON_SITEMAP_CHUNK_SIZE=3)
+class SitemapTests(PantheonTestCase):
+    def setUp(self):
+        super().setUp()
+        # Версии данных откатываются с тестом: ключи кэша повторяются
+        cache.clear()
+        self.pks = list(HistoricalFigure.objects.order_by('pk').values_list('pk', flat=True))
+
+    def get(self, path, encoding='gzip'):
+        """(ответ, XML-документ)"""
+        response = self.client.get(path, HTTP_ACCEPT_ENCODING=encoding)
+        if response.status_code != 200:
+            return response, None
+        content = response.content
+        if response.get('Content-Encoding') == 'gzip':
+            content = gzip.decompress(content)
+        return response, content.decode()
+
+    def locations(self, document):
+        return re.findall(r'<loc>http://testserver(.*?)</loc>', document)
+
+    def test_chunk_bounds(self):
+        pks = self.pks
+        self.assertEqual(chunk_bounds(), [(pks[0], pks[2]), (pks[3], pks[5]), (pks[6], pks[7])])
+        self.assertEqual(chunk_bounds(8), [(pks[0], pks[7])])
+
+    def test_index(self):
+        response, document = self.get('/sitemap.xml')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(self.locations(document), ['/sitemap-1.xml', '/sitemap-2.xml', '/sitemap-3.xml'])
+        self.assertIn('<lastmod>', document)
+
+    def test_uncompressed_for_old_clients(self):
+        _, compressed = self.get('/sitemap.xml')
+        response, document = self.get('/sitemap.xml', encoding='identity')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response['Content-Type'], 'application/xml; charset=utf-8')
+        self.assertEqual(document, compressed)
+
+    def test_chunks(self):
+        locations = []
+        for number in (1, 2, 3):
+            response, document = self.get(f'/sitemap-{number}.xml')
+            self.assertEqual(response.status_code, 200)
+            locations += self.locations(document)
+        self.assertEqual(locations, [f'/figures/{pk}/' for pk in self.pks])
+
+    def test_out_of_range(self):
+        for number in (0, 4):
+            response, _ = self.get(f'/sitemap-{number}.xml')
+            self.assertEqual(response.status_code, 404)
+
+    def test_invalidated_by_data_version(self):
+        self.get('/sitemap-3.xml')
+        last = HistoricalFigure.objects.get(pk=self.pks[-1])
+        before = figure_state(last)
+        last.delete()
+        # Без смены версии данных отдается документ из кэша
+        _, document = self.get('/sitemap-3.xml')
+        self.assertIn(f'/figures/{self.pks[-1]}/', self.locations(document))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            notify_figures_changed(before=[before])
+        _, document = self.get('/sitemap-3.xml')
+        self.assertEqual(self.locations(document), [f'/figures/{self.pks[6]}/'])
+
+    def test_new_chunk_after_import(self):
+        import_text(CSV_HEADER + figure_row(1, 'Athens', 'Greece') + figure_row(2, 'Athens', 'Greece'))
+        _, document = self.get('/sitemap.xml')
+        self.assertEqual(self.locations(document)[-1], '/sitemap-4.xml')
+        response, document = self.get('/sitemap-4.xml')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.locations(document)), 1)
+
+
+class RouterTests(ReplicaTestMixin, PantheonTestCase):
+    def request(self, method, path, data=None):
+        """(ответ, БД чтений таблиц pantheon за запрос)"""
+        self.reads.clear()
+        response = getattr(self.client, method)(path, data)
+        return response, set(self.reads)
+
+    def test_reads_from_replica(self):
+        response, reads = self.request('get', '/figures/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(reads, {'replica1'})
+        self.assertNotIn(PRIMARY_COOKIE_NAME, response.cookies)
+
+    def test_write_pins_client(self):
+        plato = self.edit(self.figure('Plato'), full_name='Platon')
+        # Клиент с cookie читает с основной БД, пока окно не истекло
+        _, reads = self.request('get', f'/figures/{plato.pk}/')
+        self.assertEqual(reads, {DEFAULT_DB_ALIAS})
+        self.client.cookies[PRIMARY_COOKIE_NAME] = f'{time.time() - 1:.3f}'
+        _, reads = self.request('get', f'/figures/{plato.pk}/')
+        self.assertEqual(reads, {'replica1'})
+
+    def test_post_response_sets_cookie(self):
+        plato = self.figure('Plato')
+        data = {**HistoricalFigureForm(instance=plato).initial, 'full_name': 'Platon'}
+        data = {field: value for field, value in data.items() if value is not None}
+        response, reads = self.request('post', f'/figures/{plato.pk}/edit/', data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(reads, {DEFAULT_DB_ALIAS})
+        self.assertIn(PRIMARY_COOKIE_NAME, response.cookies)
+
+    def test_post_without_write_does_not_pin(self):
+        plato = self.figure('Plato')
+        response, reads = self.request('post', f'/figures/{plato.pk}/edit/', {'full_name': ''})
+        self.assertEqual(response.status_code, 200)
+        # Изменяющий запрос читает с основной БД, но cookie — только после записи
+        self.assertEqual(reads, {DEFAULT_DB_ALIAS})
+        self.assertNotIn(PRIMARY_COOKIE_NAME, response.cookies)
+
+    def test_other_tables_do_not_pin(self):
+        # Вход пишет в auth_user (last_login), но не в таблицы pantheon
+        User.objects.create_superuser('admin', 'admin@example.com', 'secret')
+        response, _ = self.request('post', '/admin/login/', {'username': 'admin', 'password': 'secret'})
+        self.assertEqual(response.status_code, 302)
+        self.assertNotIn(PRIMARY_COOKIE_NAME, response.cookies)
+
+    def test_use_primary(self):
+        with routing_scope():
+            HistoricalFigure.objects.count()
+            with use_primary():
+                HistoricalFigure.objects.count()
+        self.assertEqual(self.reads, ['replica1', DEFAULT_DB_ALIAS])
+
+
+class MultipleReplicaTests(ReplicaTestMixin, PantheonTestCase):
+    REPLICAS = ['replica1', 'replica2']
+
+    def test_one_replica_per_request(self):
+        used = set()
+        for number in range(10):
+            self.reads.clear()
+            # Потоковый ответ читает строки уже после выхода из представления
+            response = self.client.get('/figures/', {'stream': number % 2})
+            if response.streaming:
+                b''.join(response.streaming_content)
+            self.assertEqual(len(set(self.reads)), 1, self.reads)
+            used.update(self.reads)
+        self.assertLessEqual(used, set(self.REPLICAS))
@@ -0,0 +1,135 @@
+# pantheon/timeline.py
+"""
+Временная шкала годов рождения: предрассчитанные интервалы
+(десятилетия и века) в таблице TimelineBucket.
+
+Счетчики собираются одним GROUP BY birth_year по индексу года и
+сворачиваются в интервалы в Python. Самая популярная личность интервала —
+с наименьшим global_rank (см. pantheon.ranks), поэтому обработчик
+подключается после обработчика мест (порядок импорта в PantheonConfig.ready).
+"""
+from django.db import transaction
+from django.db.models import Count, Min, Q, Sum
+from django.dispatch import receiver
+
+from .models import HistoricalFigure, TimelineBucket
+from .signals import figures_changed
+
+SIZES = (TimelineBucket.DECADE, TimelineBucket.CENTURY)
+
+# Интервал выбирается по ширине запрошенного диапазона
+DECADE_SPAN_LIMIT = 300
+
+
+def bucket_start(year, size):
+    """Начало интервала для года (в том числе до н. э.: -350 -> -400 для века)"""
+    return year // size * size
+
+
+def _in_centuries(field, centuries):
+    """Условие «field попадает в один из веков centuries»"""
+    q = Q()
+    for start in centuries:
+        q |= Q(**{f'{field}__gte': start, f'{field}__lt': start + TimelineBucket.CENTURY})
+    return q
+
+
+def _collect(year_filter):
+    """{(size, start): [количество, просмотры, лучшее место]} по личностям из year_filter"""
+    years = HistoricalFigure.objects.filter(year_filter, birth_year__isnull=False).order_by().values(
+        'birth_year'
+    ).annotate(count=Count('id'), views=Sum('page_views'), best_rank=Min('global_rank'))
+
+    buckets = {}
+    for row in years:
+        for size in SIZES:
+            bucket = buckets.setdefault((size, bucket_start(row['birth_year'], size)), [0, 0, None])
+            bucket[0] += row['count']
+            bucket[1] += row['views'] or 0
+            if row['best_rank'] is not None and (bucket[2] is None or row['best_rank'] < bucket[2]):
+                bucket[2] = row['best_rank']
+    return buckets
+
+
+def _top_figures(buckets):
+    """{(size, start): id личности} по лучшим местам интервалов, одним запросом"""
+    ranks = {bucket[2] for bucket in buckets.values() if bucket[2] is not None}
+    by_rank = {}
+    for figure in HistoricalFigure.objects.filter(global_rank__in=ranks).values('id', 'global_rank', 'birth_year'):
+        by_rank.setdefault(figure['global_rank'], []).append(figure)
+
+    tops = {}
+    for (size, start), bucket in buckets.items():
+        for figure in by_rank.get(bucket[2], ()):
+            # Равные места: первая личность, родившаяся в этом интервале
+            if figure['birth_year'] is not None and bucket_start(figure['birth_year'], size) == start:
+                tops[size, start] = figure['id']
+                break
+    return tops
+
+
+def refresh_timeline(years=None):
+    """
+    Пересчитывает интервалы, в которые попадают годы years (None — все).
+
+    Пересчитываются целые века вместе с их десятилетиями.
+    """
+    if years is None:
+        year_filter = Q()
+        stale = TimelineBucket.objects.all()
+    else:
+        centuries = {bucket_start(year, TimelineBucket.CENTURY) for year in years if year is not None}
+        if not centuries:
+            return 0
+        year_filter = _in_centuries('birth_year', centuries)
+        stale = TimelineBucket.objects.filter(_in_centuries('start_year', centuries))
+
+    buckets = _collect(year_filter)
+    tops = _top_figures(buckets)
+    with transaction.atomic():
+        stale.delete()
+        TimelineBucket.objects.bulk_create([
+            TimelineBucket(
+                size=size,
+                start_year=start,
+                figure_count=count,
+                page_views_sum=views,
+                top_figure_id=tops.get((size, start)),
+            )
+            for (size, start), (count, views, _) in sorted(buckets.items())
+        ], batch_size=1000)
+    return len(buckets)
+
+
+def granularity_for(start, end):
+    """Десятилетия для узкого диапазона, века — для широкого"""
+    if start is not None and end is not None and end - start <= DECADE_SPAN_LIMIT:
+        return TimelineBucket.DECADE
+    return TimelineBucket.CENTURY
+
+
+def get_timeline(start=None, end=None, size=None):
+    """
+    Интервалы, пересекающие годы [start, end] (границы необязательны),
+    в порядке времени. size — TimelineBucket.DECADE / CENTURY, по
+    умолчанию выбирается по ширине диапазона.
+    """
+    size = size or granularity_for(start, end)
+    buckets = TimelineBucket.objects.filter(size=size).select_related('top_figure').only(
+        'size', 'start_year', 'figure_count', 'page_views_sum',
+        'top_figure__id', 'top_figure__full_name', 'top_figure__birth_year',
+        'top_figure__historical_popularity_index',
+    )
+    if start is not None:
+        buckets = buckets.filter(start_year__gt=start - size)
+    if end is not None:
+        buckets = buckets.filter(start_year__lte=end)
+    return size, list(buckets)
+
+
+@receiver(figures_changed)
+def update_timeline(sender, before, after, full, **kwargs):
+    if full:
+        refresh_timeline()
+        return
+    refresh_timeline(years={state['birth_year'] for state in [*before, *after]})
@@ -4,10 +4,28 @@ from . import views
 
 urlpatterns = [
     path('', views.HomeView.as_view(), name='home'),
+    path('home/stats/', views.home_fragment_stats, name='home_fragment_stats'),
+    path('home/recent/', views.home_fragment_recent, name='home_fragment_recent'),
+    path('home/metrics/', views.home_fragment_metrics, name='home_fragment_metrics'),
     path('figures/', views.figure_list, name='figure_list'),
+    path('figures/facets/', views.figure_facets, name='figure_facets'),
+    path('figures/rank/', views.figure_by_rank, name='figure_by_rank'),
+    path('figures/movers/', views.figure_movers, name='figure_movers'),
     path('figures/create/', views.figure_create, name='figure_create'),
     path('figures/<int:pk>/', views.figure_detail, name='figure_detail'),
+    path('figures/<int:pk>/trend/', views.figure_metric_trend, name='figure_metric_trend'),
     path('figures/<int:pk>/edit/', views.figure_update, name='figure_update'),
     path('figures/<int:pk>/delete/', views.figure_delete, name='figure_delete'),
     path('statistics/', views.statistics_view, name='statistics'),
+    path('timeline/', views.timeline_view, name='timeline'),
+    path('timeline/data/', views.timeline_data, name='timeline_data'),
+    path('statistics/pivot/', views.pivot_view, name='pivot'),
+    path('imports/', views.import_upload, name='import_upload'),
+    path('imports/<int:pk>/', views.import_status, name='import_status'),
+    path('imports/<int:pk>/status/', views.import_status_json, name='import_status_json'),
+    path('api/figures/', views.api_figures, name='api_figures'),
+    path('api/pivot/', views.api_pivot, name='api_pivot'),
+    path('api/changes/', views.api_changes, name='api_changes'),
+    path('sitemap.xml', views.sitemap_index, name='sitemap_index'),
+    path('sitemap-<int:number>.xml', views.sitemap_chunk, name='sitemap_chunk'),
 ]
@@ -1,108 +1,248 @@
 # pantheon/views.py (только необходимые функции)
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import Http404, HttpResponse, JsonResponse, QueryDict, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
+from django.views.decorators.cache import cache_page
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
 from django.views.generic import TemplateView
 from django.contrib import messages
+from django.core.cache import cache
 import datetime
-from .models import HistoricalFigure, Country, City, Occupation
-from django.db.models import Count, Avg, Sum, Max
+import gzip
+import json
+from decimal import Decimal
+from .models import (
+    HistoricalFigure, Country, City, Occupation, DataVersion, ImportJob, MetricSnapshot, TimelineBucket,
+)
+from django.db.models import Avg, Sum, Max
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-from .forms import HistoricalFigureForm, HistoricalFigureDeleteForm
+from django.db import transaction
+from .forms import HistoricalFigureForm, HistoricalFigureDeleteForm, BulkImportForm
+from . import dimensions, sitemaps
+from .api import ApiError, get_figures, parse_fields, parse_ids
+from .changes import iter_feed
+from .compression import negotiate
+from .cube import (
+    DIMENSION_LABELS, DIMENSIONS, DRILL_DOWN, MEASURES, ROLL_UP, Pivot, PivotError, filter_value,
+    parse_dimensions, parse_filters, parse_measure, value_label,
+)
+from .facets import FACETS, FacetResult, get_facet_index
+from .jobs import enqueue_upload
+from .ranks import SCOPES, figure_at_rank
+from .related import related_figures
+from .routers import in_routing_scope
+from .signals import figure_state, notify_figures_changed
+from .snapshots import METRIC_FIELDS, figure_trend, top_movers
+from .streaming import iter_rows, stream_template
+from .timeline import get_timeline
 
 
 class HomeView(TemplateView):
+    """Оболочка главной страницы: тяжелые секции подгружаются фрагментами"""
     template_name = 'jinja2/home.html'
     
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        
-        context['recent_figures'] = HistoricalFigure.objects.select_related(
-            'city', 'city__country', 'occupation'
-        ).order_by('-id')[:10]
-        
-        context['stats'] = {
-            'total_figures': HistoricalFigure.objects.count(),
-            'total_countries': Country.objects.count(),
-            'total_cities': City.objects.count(),
-            'total_occupations': Occupation.objects.count(),
-            'avg_popularity': HistoricalFigure.objects.aggregate(
-                avg=Avg('historical_popularity_index')
-            )['avg'] or 0,
-            'max_popularity': HistoricalFigure.objects.aggregate(
-                max=Max('historical_popularity_index')
-            )['max'] or 0,
-            'avg_languages': HistoricalFigure.objects.aggregate(
-                avg=Avg('article_languages')
-            )['avg'] or 0,
-            'avg_views': HistoricalFigure.objects.aggregate(
-                avg=Avg('average_views')
-            )['avg'] or 0,
-            'total_views': HistoricalFigure.objects.aggregate(
-                total=Sum('page_views')
-            )['total'] or 0,
-        }
-        
-        context['last_update'] = datetime.datetime.now()
-        
-        return context
-    
     def render_to_response(self, context, **response_kwargs):
         return render(self.request, self.template_name, context, using='jinja2')
 
 
-def figure_list(request):
-    all_figures = HistoricalFigure.objects.select_related(
+# Фрагменты главной страницы. Каждый кэшируется со своим временем жизни
+# (PANTHEON_HOME_FRAGMENT_TTL), браузер запрашивает их параллельно.
+
+@cache_page(settings.PANTHEON_HOME_FRAGMENT_TTL['stats'])
+def home_fragment_stats(request):
+    """Количество записей в основных таблицах"""
+    stats = {
+        'total_figures': HistoricalFigure.objects.count(),
+        'total_countries': Country.objects.count(),
+        'total_cities': City.objects.count(),
+        'total_occupations': Occupation.objects.count(),
+    }
+    return render(request, 'jinja2/fragments/home_stats.html', {'stats': stats}, using='jinja2')
+
+
+@cache_page(settings.PANTHEON_HOME_FRAGMENT_TTL['recent'])
+def home_fragment_recent(request):
+    """Последние добавленные исторические личности"""
+    recent_figures = list(HistoricalFigure.objects.select_related(
         'city', 'city__country', 'occupation'
-    ).order_by('-historical_popularity_index')
+    ).order_by('-id')[:10])
     
-    page_size = 100
-    paginator = Paginator(all_figures, page_size)
+    return render(request, 'jinja2/fragments/home_recent.html', {
+        'recent_figures': recent_figures,
+        'total_figures': HistoricalFigure.objects.count(),
+    }, using='jinja2')
+
+
+@cache_page(settings.PANTHEON_HOME_FRAGMENT_TTL['metrics'])
+def home_fragment_metrics(request):
+    """Показатели популярности и просмотров одним агрегирующим запросом"""
+    stats = HistoricalFigure.objects.aggregate(
+        avg_popularity=Avg('historical_popularity_index'),
+        max_popularity=Max('historical_popularity_index'),
+        avg_languages=Avg('article_languages'),
+        avg_views=Avg('average_views'),
+        total_views=Sum('page_views'),
+        max_views=Max('page_views'),
+    )
+    stats = {key: value or 0 for key, value in stats.items()}
+    return render(request, 'jinja2/fragments/home_metrics.html', {'stats': stats}, using='jinja2')
+
+
+def _facet_query(params, name=None, value=None):
+    """Строка запроса без номера страницы; name/value переключают значение фасета"""
+    query = params.copy()
+    query.pop('page', None)
+    if name is not None:
+        values = query.getlist(name)
+        value = str(value)
+        if value in values:
+            values.remove(value)
+        else:
+            values.append(value)
+        query.setlist(name, values)
+    return query.urlencode()
+
+
+def _facet_blocks(params, counts):
+    return [
+        {
+            'name': name,
+            'title': title,
+            'values': [
+                dict(item, query=_facet_query(params, name, item['value']))
+                for item in counts[name]
+            ],
+        }
+        for name, title in FACETS.items()
+    ]
+
+
+def _stream_page_size(params):
+    """Размер страницы потокового списка из ?page_size, в пределах настроек"""
+    try:
+        page_size = int(params.get('page_size', settings.PANTHEON_STREAM_PAGE_SIZE))
+    except ValueError:
+        page_size = settings.PANTHEON_STREAM_PAGE_SIZE
+    return max(1, min(page_size, settings.PANTHEON_STREAM_MAX_PAGE_SIZE))
+
+
+def _stream_toggle_query(params, stream):
+    """Строка запроса для переключения между обычным и потоковым списком"""
+    query = params.copy()
+    for name in ('page', 'stream', 'page_size'):
+        query.pop(name, None)
+    if not stream:
+        query['stream'] = '1'
+    return query.urlencode()
+
+
+def figure_list(request):
+    # Город, страна и профессия подписываются из кэша справочников, без JOIN
+    all_figures = HistoricalFigure.objects.order_by('-historical_popularity_index')
     
-    page_number = request.GET.get('page', 1)
+    # Фильтры и счетчики фасетов считаются по индексу в памяти,
+    # из БД загружаются только записи текущей страницы
+    index = get_facet_index()
+    filters = index.parse_filters(request.GET)
+    if filters:
+        all_figures = FacetResult(index, index.match(filters), all_figures)
+    
+    # ?stream=1 — страница отдается потоково и может быть большой (page_size)
+    stream = request.GET.get('stream') == '1'
+    page_size = _stream_page_size(request.GET) if stream else 100
+    paginator = Paginator(all_figures, page_size)
     
     try:
-        page_obj = paginator.page(page_number)
+        page_number = paginator.validate_number(request.GET.get('page', 1))
     except PageNotAnInteger:
-        page_obj = paginator.page(1)
+        page_number = 1
     except EmptyPage:
-        page_obj = paginator.page(paginator.num_pages)
+        page_number = paginator.num_pages
+    offset = (page_number - 1) * page_size
+    page_count = max(min(page_size, paginator.count - offset), 0)
+    
+    if stream:
+        figures = iter_rows(all_figures, offset, offset + page_count)
+    else:
+        figures = list(all_figures[offset:offset + page_count])
+        dimensions.prefetch(figures)
     
-    return render(request, 'jinja2/figures.html', {
-        'figures': page_obj.object_list,
+    context = {
+        'figures': figures,
+        'page_count': page_count,
         'total_figures': paginator.count,
         'page_size': page_size,
-        'current_page': page_obj.number,
+        'stream': stream,
+        'current_page': page_number,
         'total_pages': paginator.num_pages,
-        'has_next': page_obj.has_next(),
-        'has_previous': page_obj.has_previous(),
+        'has_next': page_number < paginator.num_pages,
+        'has_previous': page_number > 1,
+        'facets': _facet_blocks(request.GET, index.counts(filters)),
+        'has_filters': bool(filters),
+        'filter_query': _facet_query(request.GET),
+        'stream_toggle_query': _stream_toggle_query(request.GET, stream),
         'title': 'Исторические личности'
-    }, using='jinja2')
+    }
+    if stream:
+        return stream_template(request, 'jinja2/figures.html', context)
+    return render(request, 'jinja2/figures.html', context, using='jinja2')
+
+
+def figure_facets(request):
+    """Счетчики фасетов для текущих фильтров (JSON)"""
+    index = get_facet_index()
+    filters = index.parse_filters(request.GET)
+    return JsonResponse({
+        'version': index.version,
+        'total': index.match(filters).bit_count(),
+        'facets': index.counts(filters),
+    })
+
+
+STATISTICS_CACHE_PREFIX = 'pantheon:statistics'
+
+
+def _statistics_totals():
+    """
+    Итоговые числа страницы статистики. Число личностей и средний индекс —
+    проход по всей таблице личностей (агрегаты стран его не заменят: в них
+    нет личностей без города), поэтому результат кэшируется с версиями
+    личностей и справочников в ключе и считается заново только после
+    изменения данных.
+    """
+    key = '%s:%d:%d' % (
+        STATISTICS_CACHE_PREFIX, *DataVersion.versions(DataVersion.FIGURES, DataVersion.DIMENSIONS)
+    )
+    stats = cache.get(key)
+    if stats is None:
+        stats = {
+            'total_countries': Country.objects.count(),
+            'total_cities': City.objects.count(),
+            'total_figures': HistoricalFigure.objects.count(),
+            'avg_popularity': HistoricalFigure.objects.aggregate(
+                avg=Avg('historical_popularity_index')
+            )['avg'] or 0,
+        }
+        cache.set(key, stats, settings.PANTHEON_STATISTICS_TTL)
+    return stats
 
 
 def statistics_view(request):
-    from .models import City, Country, HistoricalFigure
-    
-    cities_stats = City.objects.annotate(
-        figure_count=Count('historical_figures'),
-        avg_popularity=Avg('historical_figures__historical_popularity_index')
-    ).filter(
+    # Агрегаты городов и стран хранятся в самих таблицах (pantheon.aggregates):
+    # списки — чтение по индексу с ORDER BY ... LIMIT
+    cities_stats = City.objects.filter(
         figure_count__gt=0
     ).select_related('country').order_by('-avg_popularity')[:100]
     
-    countries_stats = Country.objects.annotate(
-        figure_count=Count('cities__historical_figures')
-    ).filter(
+    countries_stats = Country.objects.filter(
         figure_count__gt=0
     ).order_by('-figure_count')[:100]
     
-    total_figures = HistoricalFigure.objects.count()
-    stats = {
-        'total_countries': Country.objects.count(),
-        'total_cities': City.objects.count(),
-        'total_figures': total_figures,
-        'avg_popularity': HistoricalFigure.objects.aggregate(
-            avg=Avg('historical_popularity_index')
-        )['avg'] or 0,
-    }
+    stats = _statistics_totals()
+    total_figures = stats['total_figures']
     
     return render(request, 'jinja2/statistic.html', {
         'cities_stats': cities_stats,
@@ -121,7 +261,10 @@ def figure_create(request):
     if request.method == 'POST':
         form = HistoricalFigureForm(request.POST)
         if form.is_valid():
-            figure = form.save()
+            # Запись и журнал изменений (pantheon.changes) — одной транзакцией
+            with transaction.atomic():
+                figure = form.save()
+                notify_figures_changed(after=[figure_state(figure)])
             messages.success(request, f'Историческая личность "{figure.full_name}" успешно создана!')
             return redirect('figure_detail', pk=figure.pk)
     else:
@@ -137,11 +280,14 @@ def figure_create(request):
 def figure_update(request, pk):
     """Редактирование существующей исторической личности"""
     figure = get_object_or_404(HistoricalFigure, pk=pk)
+    before = figure_state(figure)
     
     if request.method == 'POST':
         form = HistoricalFigureForm(request.POST, instance=figure)
         if form.is_valid():
-            figure = form.save()
+            with transaction.atomic():
+                figure = form.save()
+                notify_figures_changed(before=[before], after=[figure_state(figure)])
             messages.success(request, f'Историческая личность "{figure.full_name}" успешно обновлена!')
             return redirect('figure_detail', pk=figure.pk)
     else:
@@ -163,7 +309,10 @@ def figure_delete(request, pk):
         form = HistoricalFigureDeleteForm(request.POST)
         if form.is_valid():
             figure_name = figure.full_name
-            figure.delete()
+            before = figure_state(figure)
+            with transaction.atomic():
+                figure.delete()
+                notify_figures_changed(before=[before])
             messages.success(request, f'Историческая личность "{figure_name}" успешно удалена!')
             return redirect('figure_list')
     else:
@@ -179,11 +328,416 @@ def figure_delete(request, pk):
 def figure_detail(request, pk):
     """Детальная информация об исторической личности"""
     figure = get_object_or_404(
-        HistoricalFigure.objects.select_related('city', 'city__country', 'occupation'),
+        HistoricalFigure.objects.select_related('city', 'city__country', 'occupation', 'related_index'),
         pk=pk
     )
     
     return render(request, 'jinja2/figure_detail.html', {
         'figure': figure,
+        'related_figures': related_figures(figure),
+        'metric_trend': figure_trend(figure.pk),
         'title': figure.full_name,
     }, using='jinja2')
+
+
+def _metric_point(values):
+    """Decimal в JSON — числами, а не строками"""
+    return {
+        name: float(value) if isinstance(value, Decimal) else value
+        for name, value in values.items()
+    }
+
+
+def figure_metric_trend(request, pk):
+    """История метрик личности по снимкам (JSON)"""
+    figure = get_object_or_404(HistoricalFigure.objects.only('pk'), pk=pk)
+    return JsonResponse({'figure': figure.pk, 'points': [
+        _metric_point(point) for point in figure_trend(figure.pk)
+    ]})
+
+
+def figure_movers(request):
+    """
+    Личности с наибольшим изменением метрики с прошлого снимка (JSON):
+    ?field=page_views&order=down&since=<id снимка>&limit=20
+    """
+    field = request.GET.get('field', 'page_views')
+    if field not in METRIC_FIELDS:
+        return JsonResponse({'error': f'Неизвестная метрика: {field}'}, status=400)
+    try:
+        limit = min(max(int(request.GET.get('limit', 20)), 1), 200)
+        since_id = int(request.GET['since']) if request.GET.get('since') else None
+    except ValueError:
+        return JsonResponse({'error': 'limit и since должны быть числами'}, status=400)
+    since = None
+    if since_id is not None:
+        since = MetricSnapshot.objects.filter(pk=since_id).first()
+        if since is None:
+            return JsonResponse({'error': f'Снимок {since_id} не найден'}, status=404)
+    
+    since, movers = top_movers(field, since, limit, descending=request.GET.get('order') != 'down')
+    return JsonResponse({
+        'field': field,
+        'since': since.pk if since else None,
+        'movers': [
+            {
+                'id': mover.figure.pk,
+                'full_name': mover.figure.full_name,
+                'url': reverse('figure_detail', args=[mover.figure.pk]),
+                **_metric_point({
+                    'current': getattr(mover, field),
+                    'previous': mover.previous,
+                    'delta': mover.delta,
+                }),
+            }
+            for mover in movers
+        ],
+    })
+
+
+def figure_by_rank(request):
+    """
+    Переход к личности по месту в рейтинге: ?rank=N, для рейтинга
+    континента или домена — &scope=continent|domain&group=<название>
+    """
+    try:
+        rank = int(request.GET.get('rank', ''))
+    except ValueError:
+        rank = 0
+    scope = request.GET.get('scope', 'global')
+    if scope not in SCOPES:
+        scope = 'global'
+    
+    figure = figure_at_rank(rank, scope, request.GET.get('group')) if rank > 0 else None
+    if figure is None:
+        messages.warning(request, f'Место {request.GET.get("rank", "")} в рейтинге не найдено')
+        return redirect('figure_list')
+    return redirect('figure_detail', pk=figure.pk)
+
+
+# Временная шкала годов рождения
+
+TIMELINE_SIZES = {'decade': TimelineBucket.DECADE, 'century': TimelineBucket.CENTURY}
+
+
+def _timeline_params(params):
+    """(начало, конец, интервал) из ?start=&end=&size=decade|century"""
+    years = []
+    for name in ('start', 'end'):
+        try:
+            years.append(int(params.get(name, '')))
+        except ValueError:
+            years.append(None)
+    return years[0], years[1], TIMELINE_SIZES.get(params.get('size'))
+
+
+def timeline_view(request):
+    """Распределение личностей по годам рождения с приближением к эпохе"""
+    start, end, size = _timeline_params(request.GET)
+    size, buckets = get_timeline(start, end, size)
+    return render(request, 'jinja2/timeline.html', {
+        'buckets': buckets,
+        'size': size,
+        'start': start,
+        'end': end,
+        'max_count': max((bucket.figure_count for bucket in buckets), default=0),
+        'title': 'Временная шкала',
+    }, using='jinja2')
+
+
+def timeline_data(request):
+    """Интервалы временной шкалы для графиков (JSON)"""
+    start, end, size = _timeline_params(request.GET)
+    size, buckets = get_timeline(start, end, size)
+    return JsonResponse({
+        'size': size,
+        'buckets': [
+            {
+                'start': bucket.start_year,
+                'end': bucket.end_year,
+                'count': bucket.figure_count,
+                'page_views': bucket.page_views_sum,
+                'top_figure': {
+                    'id': bucket.top_figure.pk,
+                    'full_name': bucket.top_figure.full_name,
+                    'birth_year': bucket.top_figure.birth_year,
+                    'url': reverse('figure_detail', args=[bucket.top_figure.pk]),
+                } if bucket.top_figure else None,
+            }
+            for bucket in buckets
+        ],
+    })
+
+
+# Сводные таблицы по кубу (pantheon.cube)
+
+DEFAULT_PIVOT_ROWS = ['continent']
+DEFAULT_PIVOT_COLUMNS = ['domain']
+
+
+def _pivot_params(params):
+    """(строки, столбцы, фильтры, мера) из ?rows=&columns=&measure=&<измерение>="""
+    rows = parse_dimensions(params.getlist('rows'))
+    columns = parse_dimensions(params.getlist('columns'))
+    if 'rows' not in params and 'columns' not in params:
+        rows, columns = DEFAULT_PIVOT_ROWS, DEFAULT_PIVOT_COLUMNS
+    return rows, columns, parse_filters(params), parse_measure(params.get('measure'))
+
+
+def _pivot_query(rows, columns, filters, measure):
+    """Строка запроса сводной таблицы"""
+    query = QueryDict(mutable=True)
+    query['rows'] = ','.join(rows)
+    query['columns'] = ','.join(columns)
+    query['measure'] = measure
+    for name, value in filters.items():
+        query[name] = filter_value(value)
+    return query.urlencode()
+
+
+def _replace(names, old, new):
+    return [new if name == old else name for name in names]
+
+
+def _drill_links(keys, names, rows, columns, filters, measure):
+    """
+    Ссылки детализации для заголовков оси names (rows или columns):
+    {(ключ, позиция измерения): строка запроса} — значение становится
+    фильтром, измерение заменяется более подробным (континент -> страны)
+    """
+    links = {}
+    for key in keys:
+        for position, (name, value) in enumerate(zip(names, key)):
+            child = DRILL_DOWN.get(name)
+            if child is None or child in rows or child in columns:
+                continue
+            links[key, position] = _pivot_query(
+                _replace(rows, name, child), _replace(columns, name, child),
+                {**filters, name: value}, measure,
+            )
+    return links
+
+
+def pivot_view(request):
+    """Сводная таблица с детализацией и сверткой измерений"""
+    error = None
+    try:
+        rows, columns, filters, measure = _pivot_params(request.GET)
+        pivot = Pivot(rows, columns, filters)
+    except PivotError as exc:
+        error = str(exc)
+        rows, columns, filters, measure = DEFAULT_PIVOT_ROWS, DEFAULT_PIVOT_COLUMNS, {}, 'count'
+        pivot = Pivot(rows, columns, filters)
+    
+    # Свертка: подробное измерение заменяется общим, фильтр по общему снимается
+    roll_up = []
+    for name in [*rows, *columns]:
+        parent = ROLL_UP.get(name)
+        if parent and parent not in rows and parent not in columns:
+            roll_up.append((
+                DIMENSION_LABELS[name], DIMENSION_LABELS[parent],
+                _pivot_query(
+                    _replace(rows, name, parent), _replace(columns, name, parent),
+                    {key: value for key, value in filters.items() if key != parent}, measure,
+                ),
+            ))
+    
+    active_filters = [
+        (
+            DIMENSION_LABELS[name],
+            value_label(name, value),
+            _pivot_query(
+                rows, columns, {key: other for key, other in filters.items() if key != name}, measure,
+            ),
+        )
+        for name, value in filters.items()
+    ]
+    
+    return render(request, 'jinja2/pivot.html', {
+        'pivot': pivot,
+        'rows': rows,
+        'columns': columns,
+        'measure': measure,
+        'measures': MEASURES,
+        'dimension_labels': DIMENSION_LABELS,
+        'dimensions': list(DIMENSIONS),
+        'filters': filters,
+        'active_filters': active_filters,
+        'row_links': _drill_links(pivot.row_keys, rows, rows, columns, filters, measure),
+        'column_links': _drill_links(pivot.column_keys, columns, rows, columns, filters, measure),
+        'roll_up': roll_up,
+        'query': _pivot_query(rows, columns, filters, measure),
+        'error': error,
+        'title': 'Сводная таблица',
+    }, using='jinja2')
+
+
+def api_pivot(request):
+    """
+    Сводная таблица в JSON: ?rows=continent&columns=domain,century
+    &continent=Europe — все меры в каждой ячейке, итоги по строкам и
+    столбцам. Значение фильтра none — «не указано».
+    """
+    try:
+        rows, columns, filters, _ = _pivot_params(request.GET)
+        pivot = Pivot(rows, columns, filters)
+    except PivotError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    return JsonResponse(pivot.as_dict())
+
+
+# Фоновая загрузка CSV (обрабатывается командой import_worker)
+
+@staff_member_required
+def import_upload(request):
+    """Загрузка CSV файла и постановка импорта в очередь"""
+    if request.method == 'POST':
+        form = BulkImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            job = enqueue_upload(
+                form.cleaned_data['file'],
+                update_existing=form.cleaned_data['update_existing'],
+            )
+            messages.success(request, f'Файл "{job.original_name}" поставлен в очередь импорта')
+            return redirect('import_status', pk=job.pk)
+    else:
+        form = BulkImportForm()
+    
+    return render(request, 'jinja2/import_form.html', {
+        'form': form,
+        'jobs': ImportJob.objects.all()[:20],
+        'title': 'Импорт CSV',
+    }, using='jinja2')
+
+
+def _job_status(job):
+    return {
+        'id': job.pk,
+        'file': job.original_name,
+        'file_size': job.file_size,
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'finished': job.is_finished,
+        'rows_processed': job.rows_processed,
+        'created': job.created_count,
+        'updated': job.updated_count,
+        'error_count': job.error_count,
+        'errors': job.errors.splitlines(),
+        'rows_per_second': round(job.rows_per_second, 1),
+        'created_at': job.created_at.isoformat(),
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+@staff_member_required
+def import_status(request, pk):
+    """Страница прогресса импорта"""
+    job = get_object_or_404(ImportJob, pk=pk)
+    return render(request, 'jinja2/import_status.html', {
+        'job': job,
+        'title': f'Импорт #{job.pk}',
+    }, using='jinja2')
+
+
+@staff_member_required
+def import_status_json(request, pk):
+    """Прогресс импорта: обработано строк, скорость, ошибки"""
+    job = get_object_or_404(ImportJob, pk=pk)
+    return JsonResponse(_job_status(job))
+
+
+# JSON API для внешних сервисов
+
+@csrf_exempt
+@require_http_methods(['GET', 'POST'])
+def api_figures(request):
+    """
+    Личности по списку article_id.
+
+    GET ?ids=1,2,3&fields=full_name,birth_year или POST с JSON
+    {"ids": [...], "fields": [...]} для длинных списков. Ответ — найденные
+    личности в порядке запроса и список ненайденных article_id.
+    """
+    if request.method == 'POST':
+        try:
+            payload = json.loads(request.body or b'{}')
+        except ValueError:
+            return JsonResponse({'error': 'Тело запроса должно быть JSON'}, status=400)
+        if not isinstance(payload, dict):
+            return JsonResponse({'error': 'Ожидается JSON-объект'}, status=400)
+        ids, fields = payload.get('ids') or [], payload.get('fields') or []
+    else:
+        ids, fields = request.GET.getlist('ids'), request.GET.getlist('fields')
+    
+    try:
+        figures, missing = get_figures(parse_ids(ids), parse_fields(fields))
+    except ApiError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    return JsonResponse({'figures': figures, 'missing': missing})
+
+
+def _changes_params(params):
+    """(курсор или None, лимит, поля) из ?since=&limit=&fields="""
+    values = {}
+    for name in ('since', 'limit'):
+        value = params.get(name)
+        if value in (None, ''):
+            values[name] = None
+            continue
+        try:
+            values[name] = int(value)
+        except ValueError:
+            raise ApiError(f'{name}: ожидается целое число')
+        if values[name] < 0:
+            raise ApiError(f'{name}: ожидается неотрицательное число')
+    limit = min(values['limit'] or settings.PANTHEON_CHANGES_MAX_LIMIT, settings.PANTHEON_CHANGES_MAX_LIMIT)
+    return values['since'], limit, parse_fields(params.getlist('fields'))
+
+
+def api_changes(request):
+    """
+    Лента изменений личностей после номера ?since=N (pantheon.changes):
+    NDJSON, по записи в строке, читается пачками по мере отправки. Без
+    since — сброс и снимок всех личностей. Последняя строка — {"next":
+    курсор, "more": ...}: следующий запрос делается с since=next.
+    ?limit= — записей журнала за ответ, ?fields= — поля личностей, как
+    у api/figures/.
+    """
+    try:
+        since, limit, fields = _changes_params(request.GET)
+    except ApiError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    
+    lines = (
+        json.dumps(record, ensure_ascii=False) + '\n'
+        for record in iter_feed(since, limit, fields)
+    )
+    # Лента читается при отправке, после выхода из ReplicaPinningMiddleware
+    return StreamingHttpResponse(
+        in_routing_scope(lines), content_type='application/x-ndjson; charset=utf-8'
+    )
+
+
+def _sitemap_response(request, document):
+    """Карта сайта из кэша: как есть в gzip или распакованная для старых клиентов"""
+    if negotiate(request.headers.get('Accept-Encoding'), ['gzip']):
+        response = HttpResponse(document, content_type='application/xml; charset=utf-8')
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = HttpResponse(gzip.decompress(document), content_type='application/xml; charset=utf-8')
+    response['Vary'] = 'Accept-Encoding'
+    return response
+
+
+def sitemap_index(request):
+    """Индекс карты сайта: ссылки на части по PANTHEON_SITEMAP_CHUNK_SIZE адресов"""
+    base_url = request.build_absolute_uri('/').rstrip('/')
+    return _sitemap_response(request, sitemaps.get_index(base_url))
+
+
+def sitemap_chunk(request, number):
+    document = sitemaps.get_chunk(request.build_absolute_uri('/').rstrip('/'), number)
+    if document is None:
+        raise Http404('Нет такой части карты сайта')
+    return _sitemap_response(request, document)
@@ -0,0 +1,169 @@
+# pantheon/warmup.py
+"""
+Прогрев процесса и кэшей, чтобы первые запросы после выкладки не
+платили за ленивую инициализацию.
+
+Шаги:
+    urls        — разбор URLconf (импорт всех представлений и админки)
+    templates   — компиляция всех шаблонов Jinja2 и основных шаблонов админки
+    dimensions  — загрузка справочников в кэш процесса (pantheon.dimensions)
+    facets      — построение индекса фасетов (pantheon.facets)
+    pages       — запросы к кэшируемым страницам (фрагменты главной,
+                  карта сайта), заполняющие общий кэш (cache_page и т.п.)
+
+Первые четыре шага заполняют память процесса, поэтому выполняются при
+старте воркера (PANTHEON_WARMUP_ON_STARTUP в wsgi.py / asgi.py);
+pages имеет смысл для общего кэша и выполняется командой warmup.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.template import TemplateDoesNotExist, TemplateSyntaxError, engines
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+
+logger = logging.getLogger(__name__)
+
+ADMIN_TEMPLATES = (
+    'admin/base_site.html',
+    'admin/index.html',
+    'admin/change_list.html',
+    'admin/change_form.html',
+    'admin/delete_confirmation.html',
+)
+
+PAGE_URLS = (
+    'home_fragment_stats',
+    'home_fragment_recent',
+    'home_fragment_metrics',
+    'sitemap_index',
+)
+
+
+def _walk(patterns):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from _walk(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern):
+            yield pattern
+
+
+def warm_urls():
+    resolver = get_resolver()
+    # reverse_dict заполняет таблицы reverse() для всех вложенных URLconf
+    resolver.reverse_dict
+    views = {pattern.lookup_str for pattern in _walk(resolver.url_patterns)}
+    return f'маршрутов: {len(views)}'
+
+
+def warm_templates():
+    compiled = failed = 0
+    for engine in engines.all():
+        if engine.name == 'jinja2':
+            env = engine.env
+            for name in env.list_templates(extensions=('html', 'xml', 'txt')):
+                try:
+                    env.get_template(name)
+                    compiled += 1
+                except Exception as error:
+                    # Такой шаблон упадет и при первом запросе к нему
+                    failed += 1
+                    logger.warning('Шаблон %s не компилируется: %s', name, error)
+        else:
+            for name in ADMIN_TEMPLATES:
+                try:
+                    engine.get_template(name)
+                    compiled += 1
+                except (TemplateDoesNotExist, TemplateSyntaxError):
+                    failed += 1
+    return f'шаблонов: {compiled}, с ошибками: {failed}'
+
+
+def warm_dimensions():
+    from . import dimensions
+    from .models import City, Country, Occupation
+
+    complete = dimensions.preload()
+    counts = ', '.join(
+        f'{model._meta.verbose_name_plural.lower()}: {len(dimensions.choices(model) or ())}'
+        for model in (Country, City, Occupation)
+    )
+    return counts if complete else f'{counts} (не помещаются в кэш целиком)'
+
+
+def warm_facets():
+    from .facets import get_facet_index
+
+    index = get_facet_index()
+    return f'версия {index.version}, записей: {len(index.ids)}'
+
+
+def _hosts():
+    hosts = getattr(settings, 'PANTHEON_WARMUP_HOSTS', None)
+    if hosts:
+        return list(hosts)
+    hosts = [host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*']
+    return hosts or ['localhost']
+
+
+def warm_pages():
+    # django.test тянет много модулей, воркеру при старте он не нужен
+    from django.test import Client
+
+    client = Client()
+    statuses = []
+    for host in _hosts():
+        for name in PAGE_URLS:
+            response = client.get(reverse(name), HTTP_HOST=host)
+            statuses.append(response.status_code)
+    ok = sum(1 for status in statuses if status == 200)
+    return f'страниц: {ok} из {len(statuses)}'
+
+
+STEPS = {
+    'urls': warm_urls,
+    'templates': warm_templates,
+    'dimensions': warm_dimensions,
+    'facets': warm_facets,
+    'pages': warm_pages,
+}
+
+
+def warm_up(steps=None):
+    """
+    Выполняет шаги прогрева (по умолчанию все), возвращает
+    [(шаг, секунды, результат)]. Ошибка шага записывается в результат
+    и не прерывает остальные.
+    """
+    results = []
+    for name in steps or STEPS:
+        started = time.perf_counter()
+        try:
+            detail = STEPS[name]()
+        except Exception as error:
+            logger.exception('Прогрев: шаг %s завершился ошибкой', name)
+            detail = f'ошибка: {error}'
+        results.append((name, time.perf_counter() - started, detail))
+    return results
+
+
+def warm_up_on_startup():
+    """
+    Прогрев при загрузке wsgi/asgi приложения: шаги
+    PANTHEON_WARMUP_ON_STARTUP (пустой — выключен). Соединения с БД
+    закрываются, чтобы не достаться по наследству дочерним процессам
+    (gunicorn --preload).
+    """
+    steps = getattr(settings, 'PANTHEON_WARMUP_ON_STARTUP', ())
+    if not steps:
+        return []
+    try:
+        results = warm_up(steps)
+    finally:
+        connections.close_all()
+    logger.info(
+        'Прогрев воркера: %s',
+        ', '.join(f'{name} {seconds * 1000:.0f} мс' for name, seconds, _ in results),
+    )
+    return results